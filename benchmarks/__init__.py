@@ -0,0 +1,11 @@
+"""合成 PLATEAU CityGML データによるベンチマーク
+
+合成データを生成して、パーサー・ジオメトリ変換・プロセッシングアルゴリズムの所要時間を計測し、
+結果を JSON に保存する。保存した結果どうしを比べて、性能の低下を検出できる。
+
+    python -m benchmarks run --scale 1000 --output result.json
+    python -m benchmarks compare baseline.json result.json --threshold 0.1
+    python -m benchmarks generate path/to/dataset --scale 1000
+
+QGIS の Python バインディングがない環境では、パーサーのベンチマークだけを実行する。
+"""
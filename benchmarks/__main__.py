@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+from .suite import BENCHMARKS, BenchmarkReport, compare_reports, run_benchmarks
+from .synthetic import write_dataset
+
+
+def _run(args: argparse.Namespace) -> int:
+    names = args.only.split(",") if args.only else None
+
+    def progress(name: str) -> None:
+        print(f"running {name}...", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = write_dataset(Path(args.data or tmpdir), args.scale, seed=args.seed)
+        report = run_benchmarks(files, args.scale, args.repeat, names, progress)
+
+    for result in report.results:
+        print(
+            f"{result.name:32s} best {result.best:8.4f}s  "
+            f"median {result.median:8.4f}s  ({result.items} items)"
+        )
+    for name in report.skipped:
+        print(f"{name:32s} skipped (requires QGIS)")
+    if args.output:
+        report.save(args.output)
+        print(f"saved: {args.output}", file=sys.stderr)
+    return 0
+
+
+def _compare(args: argparse.Namespace) -> int:
+    baseline = BenchmarkReport.load(args.baseline)
+    current = BenchmarkReport.load(args.current)
+    regressed = False
+    for c in compare_reports(baseline, current):
+        mark = ""
+        if c.ratio > 1 + args.threshold:
+            mark = "  REGRESSION"
+            regressed = True
+        print(
+            f"{c.name:32s} {c.baseline:8.4f}s -> {c.current:8.4f}s "
+            f"({c.ratio:6.2f}x){mark}"
+        )
+    return 1 if regressed else 0
+
+
+def _generate(args: argparse.Namespace) -> int:
+    files = write_dataset(args.root, args.scale, seed=args.seed)
+    for path in files.values():
+        print(path)
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="合成 PLATEAU CityGML データによるベンチマーク",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="ベンチマークを実行する")
+    run.add_argument("--scale", type=int, default=1000, help="建物・道路の数")
+    run.add_argument("--repeat", type=int, default=5, help="計測の回数")
+    run.add_argument("--seed", type=int, default=0, help="合成データの乱数の種")
+    run.add_argument(
+        "--only",
+        help="実行するベンチマーク (カンマ区切り): "
+        + ", ".join(b.name for b in BENCHMARKS),
+    )
+    run.add_argument(
+        "--data", type=Path, help="合成データを書き出すフォルダ (省略時は一時フォルダ)"
+    )
+    run.add_argument("--output", type=Path, help="結果を保存する JSON ファイル")
+    run.set_defaults(func=_run)
+
+    compare = sub.add_parser("compare", help="保存した結果を比較する")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("current", type=Path)
+    compare.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="性能の低下とみなす所要時間の増加の割合",
+    )
+    compare.set_defaults(func=_compare)
+
+    generate = sub.add_parser("generate", help="合成データを書き出す")
+    generate.add_argument("root", type=Path)
+    generate.add_argument("--scale", type=int, default=1000)
+    generate.add_argument("--seed", type=int, default=0)
+    generate.set_defaults(func=_generate)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+"""ベンチマークの定義と実行、結果の JSON の保存と比較"""
+
+from __future__ import annotations
+
+import gc
+import importlib.util
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+HAS_QGIS = importlib.util.find_spec("qgis") is not None
+"""QGIS の Python バインディングが使えるかどうか (使えない場合、QGIS を使うベンチマークは飛ばす)"""
+
+_FORMAT_VERSION = 1
+
+
+def _plateau_parse():
+    """plateau.parse モジュールを返す (plateau_plugin.plateau は QGIS なしでも import できる)"""
+    return importlib.import_module("plateau_plugin.plateau.parse")
+
+
+@dataclass
+class Benchmark:
+    name: str
+    feature_type: str
+    """対象にする合成データの種類 (bldg, tran, urf, dem)"""
+
+    prepare: Callable[[Path], Callable[[], int]]
+    """対象のファイルを受け取り、計測する関数を返す (計測する関数は処理した要素の数を返す)"""
+
+    requires_qgis: bool = False
+
+    requires_processing: bool = False
+    """プロセッシングのフレームワークの初期化が必要かどうか"""
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    times: list[float]
+    """各回の所要時間 (秒)"""
+
+    items: int
+    """1回で処理した要素 (都市オブジェクト、ジオメトリ、三角形など) の数"""
+
+    @property
+    def best(self) -> float:
+        return min(self.times)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.times)
+
+
+@dataclass
+class BenchmarkReport:
+    scale: int
+    results: list[BenchmarkResult]
+    skipped: list[str] = field(default_factory=list)
+    environment: dict[str, str] = field(default_factory=dict)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "version": _FORMAT_VERSION,
+            "scale": self.scale,
+            "environment": self.environment,
+            "skipped": self.skipped,
+            "results": [
+                {**asdict(r), "best": r.best, "median": r.median} for r in self.results
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> BenchmarkReport:
+        if data.get("version") != _FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported benchmark result version: {data.get('version')}"
+            )
+        return cls(
+            scale=data["scale"],
+            results=[
+                BenchmarkResult(name=r["name"], times=r["times"], items=r["items"])
+                for r in data["results"]
+            ],
+            skipped=data.get("skipped", []),
+            environment=data.get("environment", {}),
+        )
+
+    def save(self, path: Path) -> None:
+        path.write_text(
+            json.dumps(self.to_json(), ensure_ascii=False, indent=2) + "\n",
+            encoding="utf-8",
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> BenchmarkReport:
+        return cls.from_json(json.loads(path.read_text(encoding="utf-8")))
+
+
+def _parse(**settings: Any) -> Callable[[Path], Callable[[], int]]:
+    """PlateauCityGmlParser.iter_cityobjs で全ての都市オブジェクトを読む"""
+
+    def prepare(path: Path) -> Callable[[], int]:
+        parse = _plateau_parse()
+        parser_settings = parse.ParserSettings(**settings)
+
+        def run() -> int:
+            parser = parse.PlateauCityGmlParser(str(path), parser_settings)
+            return sum(1 for _ in parser.iter_cityobjs())
+
+        return run
+
+    return prepare
+
+
+def _to_qgis_geometry(path: Path) -> Callable[[], int]:
+    """パース済みのジオメトリを to_qgis_geometry で QgsGeometry にする"""
+    from plateau_plugin.geometry import to_qgis_geometry
+
+    parse = _plateau_parse()
+    parser = parse.PlateauCityGmlParser(
+        str(path), parse.ParserSettings(load_semantic_parts=True)
+    )
+    geometries = [
+        cityobj.geometry
+        for _, cityobj in parser.iter_cityobjs()
+        if cityobj.geometry is not None
+    ]
+
+    def run() -> int:
+        for geometry in geometries:
+            to_qgis_geometry(geometry, as2d=False)
+        return len(geometries)
+
+    return run
+
+
+def _relief_to_ply(path: Path) -> Callable[[], int]:
+    """地形モデルを convert_citygml_relief_to_ply で PLY に変換する"""
+    from plateau_plugin.ply import convert_citygml_relief_to_ply
+
+    def run() -> int:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dst = Path(tmpdir) / "relief.ply"
+            convert_citygml_relief_to_ply(str(path), str(dst))
+            return dst.stat().st_size
+
+    return run
+
+
+def _load_as_vector(path: Path) -> Callable[[], int]:
+    """プロセッシングアルゴリズム load_as_vector 全体を実行する"""
+    import processing
+    from qgis.core import QgsProcessingContext, QgsProcessingFeedback, QgsProject
+
+    def run() -> int:
+        context = QgsProcessingContext()
+        context.setProject(QgsProject.instance())
+        processing.run(
+            "plateau_plugin:load_as_vector",
+            {"INPUT": str(path)},
+            context=context,
+            feedback=QgsProcessingFeedback(),
+        )
+        layers = context.temporaryLayerStore().mapLayers().values()
+        count = sum(layer.featureCount() for layer in layers)
+        context.temporaryLayerStore().removeAllMapLayers()
+        return count
+
+    return run
+
+
+BENCHMARKS: list[Benchmark] = [
+    Benchmark("parse_bldg", "bldg", _parse()),
+    Benchmark(
+        "parse_bldg_appearance",
+        "bldg",
+        _parse(load_semantic_parts=True, load_apperance=True),
+    ),
+    Benchmark(
+        "parse_bldg_lowest_lod",
+        "bldg",
+        _parse(only_first_found_lod=True, lowest_lod_first=True),
+    ),
+    Benchmark("parse_bldg_attributes_only", "bldg", _parse(attributes_only=True)),
+    Benchmark("parse_tran_semantic_parts", "tran", _parse(load_semantic_parts=True)),
+    Benchmark("parse_urf", "urf", _parse()),
+    Benchmark("parse_dem", "dem", _parse()),
+    Benchmark("to_qgis_geometry_bldg", "bldg", _to_qgis_geometry, requires_qgis=True),
+    Benchmark("to_qgis_geometry_tran", "tran", _to_qgis_geometry, requires_qgis=True),
+    Benchmark("convert_relief_to_ply", "dem", _relief_to_ply),
+    Benchmark("load_as_vector_bldg", "bldg", _load_as_vector, requires_processing=True),
+    Benchmark("load_as_vector_tran", "tran", _load_as_vector, requires_processing=True),
+]
+
+
+@contextmanager
+def _processing_session() -> Iterator[None]:
+    """プロセッシングのフレームワークとこのプラグインのプロバイダを使える状態にする
+
+    既に QgsApplication がある場合 (QGIS 内や pytest から実行した場合) はそれを使う。
+    """
+    from qgis.core import QgsApplication
+
+    app = None
+    if QgsApplication.instance() is None:
+        app = QgsApplication([], False)
+        app.initQgis()
+    sys.path.append(str(Path(QgsApplication.pkgDataPath()) / "python" / "plugins"))
+    from processing.core.Processing import Processing
+
+    from plateau_plugin.provider import PlateauProcessingProvider
+
+    Processing.initialize()
+    registry = QgsApplication.processingRegistry()
+    provider = None
+    if registry.providerById("plateau_plugin") is None:
+        provider = PlateauProcessingProvider()
+        registry.addProvider(provider)
+    try:
+        yield
+    finally:
+        if provider is not None:
+            registry.removeProvider(provider)
+        if app is not None:
+            app.exitQgis()
+
+
+def _environment() -> dict[str, str]:
+    import lxml.etree
+    import numpy
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": numpy.__version__,
+        "lxml": ".".join(str(v) for v in lxml.etree.LXML_VERSION),
+        "qgis": "yes" if HAS_QGIS else "no",
+    }
+
+
+def _measure(run: Callable[[], int], repeat: int) -> tuple[list[float], int]:
+    run()  # ウォームアップ (コードリストの読み込み、ファイルのページキャッシュなど)
+    times = []
+    items = 0
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        items = run()
+        times.append(time.perf_counter() - start)
+    return (times, items)
+
+
+def run_benchmarks(
+    files: dict[str, Path],
+    scale: int,
+    repeat: int = 5,
+    names: list[str] | None = None,
+    progress: Callable[[str], None] | None = None,
+) -> BenchmarkReport:
+    """合成データ (write_dataset の戻り値) に対してベンチマークを実行する
+
+    names を指定すると、その名前のベンチマークだけを実行する。
+    QGIS が使えない環境では、QGIS を使うベンチマークを飛ばして skipped に記録する。
+    """
+    selected = [b for b in BENCHMARKS if names is None or b.name in names]
+    if names is not None and (unknown := set(names) - {b.name for b in selected}):
+        raise KeyError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = BenchmarkReport(scale=scale, results=[], environment=_environment())
+    runnable = []
+    for benchmark in selected:
+        if (benchmark.requires_qgis or benchmark.requires_processing) and not HAS_QGIS:
+            report.skipped.append(benchmark.name)
+        else:
+            runnable.append(benchmark)
+
+    def run_all() -> None:
+        for benchmark in runnable:
+            if progress is not None:
+                progress(benchmark.name)
+            run = benchmark.prepare(files[benchmark.feature_type])
+            times, items = _measure(run, repeat)
+            report.results.append(BenchmarkResult(benchmark.name, times, items))
+
+    if any(b.requires_processing for b in runnable):
+        with _processing_session():
+            run_all()
+    else:
+        run_all()
+    return report
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        """current / baseline (1より大きければ遅くなった)"""
+        return self.current / self.baseline if self.baseline > 0 else float("inf")
+
+
+def compare_reports(
+    baseline: BenchmarkReport, current: BenchmarkReport
+) -> list[Comparison]:
+    """両方に含まれるベンチマークの最良の所要時間を比べる"""
+    if baseline.scale != current.scale:
+        raise ValueError(
+            f"Scale mismatch: baseline={baseline.scale}, current={current.scale}"
+        )
+    base = {r.name: r for r in baseline.results}
+    return [
+        Comparison(r.name, base[r.name].best, r.best)
+        for r in current.results
+        if r.name in base
+    ]
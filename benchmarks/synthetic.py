@@ -0,0 +1,428 @@
+"""ベンチマーク用の合成 PLATEAU CityGML データの生成
+
+3次メッシュ 53394611 (東京駅付近) の範囲に、指定した規模の次のデータを作る。
+
+- bldg: LOD0/LOD1/LOD2 の建物 (災害リスク属性、住所、汎用属性、テクスチャとマテリアルのアピアランス付き)
+- tran: LOD1 の道路と、LOD2 の交通領域 (TrafficArea) の意味的な部分
+- urf: 用途地域
+- dem: TIN の地形モデル
+
+乱数の種を固定しているので、同じ引数からは常に同じデータができる。
+"""
+
+from __future__ import annotations
+
+import random
+from pathlib import Path
+
+_IUR_NS = {
+    "3.0": (
+        "https://www.geospatial.jp/iur/uro/3.0",
+        "https://www.geospatial.jp/iur/urf/3.0",
+    ),
+    "2.0": (
+        "https://www.geospatial.jp/iur/uro/2.0",
+        "https://www.geospatial.jp/iur/urf/2.0",
+    ),
+}
+
+_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<core:CityModel xmlns:gml="http://www.opengis.net/gml" xmlns:core="http://www.opengis.net/citygml/2.0" xmlns:app="http://www.opengis.net/citygml/appearance/2.0" xmlns:bldg="http://www.opengis.net/citygml/building/2.0" xmlns:tran="http://www.opengis.net/citygml/transportation/2.0" xmlns:dem="http://www.opengis.net/citygml/relief/2.0" xmlns:gen="http://www.opengis.net/citygml/generics/2.0" xmlns:xAL="urn:oasis:names:tc:ciq:xsdschema:xAL:2.0" xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:uro="{uro}" xmlns:urf="{urf}">
+<gml:boundedBy><gml:Envelope srsName="http://www.opengis.net/def/crs/EPSG/0/6697" srsDimension="3"><gml:lowerCorner>{lower}</gml:lowerCorner><gml:upperCorner>{upper}</gml:upperCorner></gml:Envelope></gml:boundedBy>
+"""
+
+_FOOTER = "</core:CityModel>\n"
+
+# 53394611 (東京駅付近) の3次メッシュ
+_ORIGIN_LAT = 35.675
+_ORIGIN_LON = 139.7625
+_MESH_DLAT = 1 / 120
+_MESH_DLON = 1 / 80
+
+
+def _poslist(points) -> str:
+    return " ".join(f"{lat:.9f} {lon:.9f} {h:.3f}" for lat, lon, h in points)
+
+
+def _polygon(points, poly_id: str | None = None, ring_id: str | None = None) -> str:
+    pid = f' gml:id="{poly_id}"' if poly_id else ""
+    rid = f' gml:id="{ring_id}"' if ring_id else ""
+    return (
+        f"<gml:Polygon{pid}><gml:exterior><gml:LinearRing{rid}><gml:posList>"
+        f"{_poslist(points)}</gml:posList></gml:LinearRing></gml:exterior></gml:Polygon>"
+    )
+
+
+def _box_faces(lat, lon, size, height):
+    la0, la1 = lat, lat + size
+    lo0, lo1 = lon, lon + size
+    b = [(la0, lo0, 0.0), (la0, lo1, 0.0), (la1, lo1, 0.0), (la1, lo0, 0.0)]
+    t = [(p[0], p[1], height) for p in b]
+    faces = {
+        "GroundSurface": [[b[0], b[3], b[2], b[1], b[0]]],
+        "RoofSurface": [[t[0], t[1], t[2], t[3], t[0]]],
+        "WallSurface": [
+            [b[i], b[(i + 1) % 4], t[(i + 1) % 4], t[i], b[i]] for i in range(4)
+        ],
+    }
+    return faces
+
+
+def _envelope(lat, lon, size, height) -> str:
+    return (
+        '<gml:boundedBy><gml:Envelope srsName="http://www.opengis.net/def/crs/EPSG/0/6697" srsDimension="3">'
+        f"<gml:lowerCorner>{lat:.9f} {lon:.9f} 0</gml:lowerCorner>"
+        f"<gml:upperCorner>{lat + size:.9f} {lon + size:.9f} {height:.3f}</gml:upperCorner>"
+        "</gml:Envelope></gml:boundedBy>"
+    )
+
+
+def _header(iur: str, max_height: float) -> str:
+    uro, urf = _IUR_NS[iur]
+    return _HEADER.format(
+        uro=uro,
+        urf=urf,
+        lower=f"{_ORIGIN_LAT} {_ORIGIN_LON} 0",
+        upper=f"{_ORIGIN_LAT + _MESH_DLAT} {_ORIGIN_LON + _MESH_DLON} {max_height}",
+    )
+
+
+def _building_member(
+    i: int,
+    lat: float,
+    lon: float,
+    size: float,
+    rnd: random.Random,
+    *,
+    lod2: bool,
+    risk: bool,
+    tex_targets: list[tuple[str, str, int]] | None,
+    mat_targets: list[str] | None,
+) -> str:
+    """1棟の建物の cityObjectMember を作る
+
+    tex_targets, mat_targets を与えると、LOD2 の面をテクスチャとマテリアルの対象として追加する。
+    """
+    height = rnd.uniform(3, 60)
+    faces = _box_faces(lat, lon, size, height)
+    bid = f"bldg_{i}"
+    o = [f'<core:cityObjectMember><bldg:Building gml:id="{bid}">']
+    o.append(_envelope(lat, lon, size, height))
+    o.append(f"<gml:name>建物{i}</gml:name>")
+    o.append("<core:creationDate>2023-03-31</core:creationDate>")
+    o.append(
+        f'<gen:stringAttribute name="note"><gen:value>n{i}</gen:value></gen:stringAttribute>'
+    )
+    o.append(
+        '<bldg:class codeSpace="../../codelists/Building_class.xml">3001</bldg:class>'
+    )
+    o.append(
+        f'<bldg:usage codeSpace="../../codelists/Building_usage.xml">{rnd.choice(["401", "411", "412"])}</bldg:usage>'
+    )
+    o.append(f'<bldg:measuredHeight uom="m">{height:.1f}</bldg:measuredHeight>')
+    o.append(f"<bldg:storeysAboveGround>{int(height // 3)}</bldg:storeysAboveGround>")
+    foot = faces["GroundSurface"][0]
+    o.append(
+        "<bldg:lod0RoofEdge><gml:MultiSurface><gml:surfaceMember>"
+        + _polygon([(p[0], p[1], 0.0) for p in foot])
+        + "</gml:surfaceMember></gml:MultiSurface></bldg:lod0RoofEdge>"
+    )
+    o.append("<bldg:lod1Solid><gml:Solid><gml:exterior><gml:CompositeSurface>")
+    for fl in faces.values():
+        for f in fl:
+            o.append("<gml:surfaceMember>" + _polygon(f) + "</gml:surfaceMember>")
+    o.append("</gml:CompositeSurface></gml:exterior></gml:Solid></bldg:lod1Solid>")
+    if lod2:
+        # LOD2 の立体は境界面のポリゴンを xlink:href で参照する
+        o.append("<bldg:lod2Solid><gml:Solid><gml:exterior><gml:CompositeSurface>")
+        num_faces = sum(len(fl) for fl in faces.values())
+        for k in range(num_faces):
+            o.append(f'<gml:surfaceMember xlink:href="#{bid}_p{k}"/>')
+        o.append("</gml:CompositeSurface></gml:exterior></gml:Solid></bldg:lod2Solid>")
+        k = 0
+        for j, (kind, fl) in enumerate(faces.items()):
+            sid = f"{bid}_s{j}"
+            o.append(
+                f'<bldg:boundedBy><bldg:{kind} gml:id="{sid}"><bldg:lod2MultiSurface><gml:MultiSurface gml:id="{sid}_ms">'
+            )
+            for f in fl:
+                pid = f"{bid}_p{k}"
+                rid = f"{bid}_r{k}"
+                o.append(
+                    "<gml:surfaceMember>"
+                    + _polygon(f, pid, rid)
+                    + "</gml:surfaceMember>"
+                )
+                if tex_targets is not None:
+                    tex_targets.append((pid, rid, len(f)))
+                k += 1
+            o.append(
+                f"</gml:MultiSurface></bldg:lod2MultiSurface></bldg:{kind}></bldg:boundedBy>"
+            )
+            if mat_targets is not None:
+                # マテリアルは最初の面だけポリゴンに、残りは MultiSurface に指定する
+                mat_targets.append(f"{sid}_ms" if j else f"{bid}_p0")
+    o.append(
+        "<bldg:address><core:Address><core:xalAddress><xAL:AddressDetails><xAL:Country>"
+        "<xAL:CountryName>日本</xAL:CountryName><xAL:Locality><xAL:LocalityName>東京都千代田区</xAL:LocalityName>"
+        "</xAL:Locality></xAL:Country></xAL:AddressDetails></core:xalAddress></core:Address></bldg:address>"
+    )
+    if risk:
+        o.append(
+            "<uro:buildingDisasterRiskAttribute><uro:BuildingRiverFloodingRiskAttribute>"
+            '<uro:description codeSpace="../../codelists/BuildingRiverFloodingRiskAttribute_description.xml">1</uro:description>'
+            f'<uro:rank codeSpace="../../codelists/BuildingRiverFloodingRiskAttribute_rank.xml">{rnd.randint(1, 4)}</uro:rank>'
+            f'<uro:depth uom="m">{rnd.uniform(0, 3):.2f}</uro:depth>'
+            '<uro:adminType codeSpace="../../codelists/BuildingRiverFloodingRiskAttribute_adminType.xml">2</uro:adminType>'
+            '<uro:scale codeSpace="../../codelists/BuildingRiverFloodingRiskAttribute_scale.xml">1</uro:scale>'
+            "</uro:BuildingRiverFloodingRiskAttribute></uro:buildingDisasterRiskAttribute>"
+        )
+    o.append(
+        "<uro:buildingIDAttribute><uro:BuildingIDAttribute>"
+        f"<uro:buildingID>13101-bldg-{i}</uro:buildingID>"
+        '<uro:prefecture codeSpace="../../codelists/Common_localPublicAuthorities.xml">13</uro:prefecture>'
+        '<uro:city codeSpace="../../codelists/Common_localPublicAuthorities.xml">13101</uro:city>'
+        "</uro:BuildingIDAttribute></uro:buildingIDAttribute>"
+    )
+    o.append("</bldg:Building></core:cityObjectMember>\n")
+    return "".join(o)
+
+
+def _building_appearance(
+    tex_targets: list[tuple[str, str, int]],
+    mat_targets: list[str],
+    rnd: random.Random,
+) -> str:
+    """テクスチャ1枚とマテリアル2つからなる appearanceMember を作る"""
+    out = ["<app:appearanceMember><app:Appearance><app:theme>rgbTexture</app:theme>"]
+    out.append(
+        "<app:surfaceDataMember><app:ParameterizedTexture>"
+        "<app:imageURI>53394611_bldg_6697_appearance/tex0.jpg</app:imageURI>"
+        "<app:mimeType>image/jpg</app:mimeType>"
+    )
+    for pid, rid, npts in tex_targets:
+        uv = " ".join(f"{rnd.random():.6f} {rnd.random():.6f}" for _ in range(npts))
+        out.append(
+            f'<app:target uri="#{pid}"><app:TexCoordList>'
+            f'<app:textureCoordinates ring="#{rid}">{uv}</app:textureCoordinates>'
+            "</app:TexCoordList></app:target>"
+        )
+    out.append("</app:ParameterizedTexture></app:surfaceDataMember>")
+    out.append(
+        "<app:surfaceDataMember><app:X3DMaterial>"
+        "<app:diffuseColor>0.2 0.2 0.2</app:diffuseColor>"
+        "</app:X3DMaterial></app:surfaceDataMember>"
+    )
+    out.append(
+        "<app:surfaceDataMember><app:X3DMaterial>"
+        "<app:diffuseColor>0.6 0.5 0.4</app:diffuseColor>"
+    )
+    for sid in mat_targets:
+        out.append(f"<app:target>#{sid}</app:target>")
+    out.append("</app:X3DMaterial></app:surfaceDataMember>")
+    out.append("</app:Appearance></app:appearanceMember>\n")
+    return "".join(out)
+
+
+def building_gml(
+    n: int,
+    *,
+    lod2: bool = True,
+    risk: bool = True,
+    appearance: bool = False,
+    seed: int = 0,
+    iur: str = "3.0",
+) -> str:
+    """n 棟の建物 (直方体) の CityGML を作る"""
+    rnd = random.Random(seed)
+    side = max(1, int(n**0.5))
+    step_lat = _MESH_DLAT / side
+    step_lon = _MESH_DLON / side
+    size = min(step_lat, step_lon) * 0.6
+    out = [_header(iur, 100)]
+    tex_targets: list[tuple[str, str, int]] = []
+    mat_targets: list[str] = []
+    for i in range(n):
+        lat = _ORIGIN_LAT + (i // side) * step_lat
+        lon = _ORIGIN_LON + (i % side) * step_lon
+        out.append(
+            _building_member(
+                i,
+                lat,
+                lon,
+                size,
+                rnd,
+                lod2=lod2,
+                risk=risk,
+                tex_targets=tex_targets if appearance else None,
+                mat_targets=mat_targets if appearance else None,
+            )
+        )
+    if tex_targets or mat_targets:
+        out.append(_building_appearance(tex_targets, mat_targets, rnd))
+    out.append(_FOOTER)
+    return "".join(out)
+
+
+def road_gml(n: int, *, seed: int = 0, iur: str = "3.0") -> str:
+    """n 本の道路と、それぞれ2つの交通領域の CityGML を作る"""
+    rnd = random.Random(seed)
+    out = [_header(iur, 100)]
+    step = _MESH_DLAT / max(n, 1)
+    for i in range(n):
+        lat = _ORIGIN_LAT + i * step
+        lon0, lon1 = _ORIGIN_LON, _ORIGIN_LON + _MESH_DLON
+        w = step * 0.4
+        ring = [
+            (lat, lon0, 0),
+            (lat, lon1, 0),
+            (lat + w, lon1, 0),
+            (lat + w, lon0, 0),
+            (lat, lon0, 0),
+        ]
+        o = [f'<core:cityObjectMember><tran:Road gml:id="road_{i}">']
+        o.append(
+            '<tran:class codeSpace="../../codelists/TransportationComplex_class.xml">1040</tran:class>'
+        )
+        o.append(
+            f'<tran:function codeSpace="../../codelists/Road_function.xml">{rnd.choice(["1", "2", "3"])}</tran:function>'
+        )
+        o.append(
+            "<tran:lod1MultiSurface><gml:MultiSurface><gml:surfaceMember>"
+            + _polygon(ring)
+            + "</gml:surfaceMember></gml:MultiSurface></tran:lod1MultiSurface>"
+        )
+        half = [
+            (lat, lon0, 0),
+            (lat, lon1, 0),
+            (lat + w / 2, lon1, 0),
+            (lat + w / 2, lon0, 0),
+            (lat, lon0, 0),
+        ]
+        other = [
+            (lat + w / 2, lon0, 0),
+            (lat + w / 2, lon1, 0),
+            (lat + w, lon1, 0),
+            (lat + w, lon0, 0),
+            (lat + w / 2, lon0, 0),
+        ]
+        for j, r in enumerate((half, other)):
+            o.append(
+                f'<tran:trafficArea><tran:TrafficArea gml:id="ta_{i}_{j}">'
+                '<tran:function codeSpace="../../codelists/TrafficArea_function.xml">1000</tran:function>'
+                "<tran:lod2MultiSurface><gml:MultiSurface><gml:surfaceMember>"
+                + _polygon(r)
+                + "</gml:surfaceMember></gml:MultiSurface></tran:lod2MultiSurface>"
+                "</tran:TrafficArea></tran:trafficArea>"
+            )
+        o.append(
+            "<uro:roadStructureAttribute><uro:RoadStructureAttribute>"
+            f'<uro:width uom="m">{rnd.uniform(4, 20):.1f}</uro:width>'
+            "<uro:numberOfLanes>2</uro:numberOfLanes>"
+            "</uro:RoadStructureAttribute></uro:roadStructureAttribute>"
+        )
+        o.append("</tran:Road></core:cityObjectMember>\n")
+        out.append("".join(o))
+    out.append(_FOOTER)
+    return "".join(out)
+
+
+def urf_gml(n: int, *, iur: str = "3.0") -> str:
+    """n 個の用途地域の CityGML を作る"""
+    out = [_header(iur, 0)]
+    step = _MESH_DLON / max(n, 1)
+    for i in range(n):
+        lon = _ORIGIN_LON + i * step
+        ring = [
+            (_ORIGIN_LAT, lon, 0),
+            (_ORIGIN_LAT, lon + step, 0),
+            (_ORIGIN_LAT + _MESH_DLAT, lon + step, 0),
+            (_ORIGIN_LAT + _MESH_DLAT, lon, 0),
+            (_ORIGIN_LAT, lon, 0),
+        ]
+        out.append(
+            f'<core:cityObjectMember><urf:UseDistrict gml:id="ud_{i}">'
+            '<urf:function codeSpace="../../codelists/Common_urbanPlanType.xml">1</urf:function>'
+            '<urf:city codeSpace="../../codelists/Common_localPublicAuthorities.xml">13101</urf:city>'
+            "<urf:floorAreaRate>4.0</urf:floorAreaRate>"
+            "<urf:lod1MultiSurface><gml:MultiSurface><gml:surfaceMember>"
+            + _polygon(ring)
+            + "</gml:surfaceMember></gml:MultiSurface></urf:lod1MultiSurface>"
+            "</urf:UseDistrict></core:cityObjectMember>\n"
+        )
+    out.append(_FOOTER)
+    return "".join(out)
+
+
+def dem_gml(grid: int, *, seed: int = 0, iur: str = "3.0") -> str:
+    """grid x grid の格子を三角形に分割した TIN の地形モデルの CityGML を作る"""
+    rnd = random.Random(seed)
+    out = [_header(iur, 100)]
+    out.append(
+        '<core:cityObjectMember><dem:ReliefFeature gml:id="dem_0"><dem:lod>1</dem:lod>'
+        '<dem:reliefComponent><dem:TINRelief gml:id="tin_0"><dem:lod>1</dem:lod><dem:tin>'
+        "<gml:TriangulatedSurface><gml:trianglePatches>"
+    )
+    dlat = _MESH_DLAT / grid
+    dlon = _MESH_DLON / grid
+    heights = [[rnd.uniform(0, 50) for _ in range(grid + 1)] for _ in range(grid + 1)]
+
+    def v(i, j):
+        return (_ORIGIN_LAT + i * dlat, _ORIGIN_LON + j * dlon, heights[i][j])
+
+    for i in range(grid):
+        for j in range(grid):
+            for tri in (
+                (v(i, j), v(i, j + 1), v(i + 1, j)),
+                (v(i + 1, j), v(i, j + 1), v(i + 1, j + 1)),
+            ):
+                out.append(
+                    "<gml:Triangle><gml:exterior><gml:LinearRing><gml:posList>"
+                    f"{_poslist((*tri, tri[0]))}"
+                    "</gml:posList></gml:LinearRing></gml:exterior></gml:Triangle>\n"
+                )
+    out.append(
+        "</gml:trianglePatches></gml:TriangulatedSurface></dem:tin></dem:TINRelief>"
+        "</dem:reliefComponent></dem:ReliefFeature></core:cityObjectMember>\n"
+    )
+    out.append(_FOOTER)
+    return "".join(out)
+
+
+_BUILDING_USAGE_CODELIST = """<?xml version="1.0" encoding="UTF-8"?>
+<gml:Dictionary xmlns:gml="http://www.opengis.net/gml" gml:id="Building_usage">
+<gml:name>Building_usage</gml:name>
+<gml:dictionaryEntry><gml:Definition gml:id="id1"><gml:description>業務施設</gml:description><gml:name>401</gml:name></gml:Definition></gml:dictionaryEntry>
+<gml:dictionaryEntry><gml:Definition gml:id="id2"><gml:description>住宅</gml:description><gml:name>411</gml:name></gml:Definition></gml:dictionaryEntry>
+</gml:Dictionary>
+"""
+
+
+def write_dataset(
+    root: Path, scale: int = 100, *, seed: int = 0, iur: str = "3.0"
+) -> dict[str, Path]:
+    """配布データと同じ構成 (udx/<種類>/*.gml, codelists/) で合成データを書き出す
+
+    scale は建物と道路の数で、用途地域はその 1/10、地形モデルは約 32 x scale 個の三角形になる。
+    データの種類 -> 書き出したファイルのパス を返す。
+    """
+    root = Path(root)
+    contents = {
+        "bldg": building_gml(scale, appearance=True, seed=seed, iur=iur),
+        "tran": road_gml(scale, seed=seed, iur=iur),
+        "urf": urf_gml(max(1, scale // 10), iur=iur),
+        "dem": dem_gml(max(2, int(scale**0.5) * 4), seed=seed, iur=iur),
+    }
+    files: dict[str, Path] = {}
+    for feature_type, text in contents.items():
+        path = root / "udx" / feature_type / f"53394611_{feature_type}_6697_op.gml"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        files[feature_type] = path
+
+    codelists = root / "codelists"
+    codelists.mkdir(parents=True, exist_ok=True)
+    (codelists / "Building_usage.xml").write_text(
+        _BUILDING_USAGE_CODELIST, encoding="utf-8"
+    )
+    return files
@@ -16,12 +16,19 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-from qgis._gui import QgisInterface
+from __future__ import annotations
 
-from .plugin import PlateauPlugin
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from qgis._gui import QgisInterface
 
 
 def classFactory(iface: QgisInterface):
     """The entrypoint for QGIS plugin"""
 
+    # パースのワーカープロセスは plateau_plugin.plateau だけを import するので、
+    # パッケージの import 時には Qt を読み込まないようにプラグイン本体はここで import する
+    from .plugin import PlateauPlugin
+
     return PlateauPlugin(iface)
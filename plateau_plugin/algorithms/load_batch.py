@@ -0,0 +1,256 @@
+"""Processing algorithm for loading a whole PLATEAU distribution as vector layers"""
+
+# Copyright (C) 2023 MLIT Japan
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path, PurePosixPath
+from typing import Any
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsProcessingContext,
+    QgsProcessingException,  # pyright: ignore
+    QgsProcessingFeedback,
+    QgsProcessingParameterFile,
+    QgsProcessingParameterString,
+    QgsProject,
+)
+
+from ..plateau.catalog import DatasetCatalog, feature_type_of
+from ..plateau.parse.cache import default_cache_dir
+from ..plateau.parse.parallel import parse_files_in_parallel
+from ..plateau.sources import list_zip_members, make_zip_source
+from .load_vector import _LOD_OPTIONS, PlateauVectorLoaderAlrogithm, _make_feature
+from .utils.layermanger import FeatureWriteBuffer
+
+_DESCRIPTION = """PLATEAU 3D都市モデルの配布データ (udx ディレクトリを含むフォルダまたは zip ファイル) に含まれる CityGML ファイルをまとめて読み込みます。
+
+ファイルは複数のプロセスで並列に読み込まれ、同じ種類の地物は1つのレイヤにまとめられます。
+
+"読み込むデータの種類" には udx 以下のディレクトリ名 (bldg, tran など) をカンマ区切りで指定します。空欄の場合は地形モデル (dem) 以外の全てを読み込みます。地形モデルは "PLATEAU 地形モデルをメッシュとして読み込む" で読み込むことを推奨します。
+
+zip ファイルは展開せずに、中の CityGML ファイルやコードリストを直接読み込みます。
+
+"読み込む範囲" を指定した場合は、範囲と交差する都市オブジェクトだけを読み込みます。フォルダを指定した場合は、さらに配布データの目録 (ファイルごとの範囲や地物数の索引) を作成し、範囲と交差するファイルだけを開きます。目録はキャッシュディレクトリに保存され、2回目以降は変更されたファイルだけを走査します。
+
+そのほかのオプションは "PLATEAU 3D都市モデルを読み込む" と同じです。
+"""
+
+_EXCLUDED_BY_DEFAULT = frozenset({"dem"})
+
+
+def _is_target(type_name: str | None, feature_types: set[str] | None) -> bool:
+    if type_name is None:
+        return False
+    if feature_types is None:
+        return type_name not in _EXCLUDED_BY_DEFAULT
+    return type_name in feature_types
+
+
+def _collect_gml_files(root: Path, feature_types: set[str] | None) -> list[str]:
+    """配布データのディレクトリから読み込み対象の CityGML ファイルを集める"""
+    files = []
+    for path in sorted(root.rglob("*.gml")):
+        relative = PurePosixPath(path.relative_to(root.parent).as_posix())
+        if _is_target(feature_type_of(relative), feature_types):
+            files.append(str(path))
+    return files
+
+
+def _collect_zip_gml_sources(
+    zip_path: str, feature_types: set[str] | None
+) -> list[str]:
+    """配布データの zip から読み込み対象の CityGML を zip:// 形式で集める (展開はしない)"""
+    return [
+        make_zip_source(zip_path, name)
+        for name in sorted(list_zip_members(zip_path))
+        if name.endswith(".gml")
+        and _is_target(feature_type_of(PurePosixPath(name)), feature_types)
+    ]
+
+
+class PlateauBatchLoaderAlgorithm(PlateauVectorLoaderAlrogithm):
+    """Processing algorithm to load a whole PLATEAU distribution as vector layers"""
+
+    INPUT_DIR = "INPUT_DIR"
+    INPUT_ZIP = "INPUT_ZIP"
+    FEATURE_TYPES = "FEATURE_TYPES"
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.INPUT_DIR,
+                self.tr("PLATEAU 配布データのフォルダ"),
+                behavior=QgsProcessingParameterFile.Folder,
+                optional=True,
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.INPUT_ZIP,
+                self.tr("PLATEAU 配布データの zip ファイル"),
+                fileFilter=self.tr("zip ファイル (*.zip)"),
+                optional=True,
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.FEATURE_TYPES,
+                self.tr("読み込むデータの種類 (例: bldg,tran)"),
+                defaultValue="",
+                optional=True,
+            )
+        )
+        self._init_loading_parameters(default_workers=os.cpu_count() or 1)
+
+    def createInstance(self):
+        return PlateauBatchLoaderAlgorithm()
+
+    def name(self):
+        return "load_batch_as_vector"
+
+    def displayName(self):
+        return self.tr("PLATEAU 3D都市モデルをまとめて読み込む (フォルダ・zip)")
+
+    def shortHelpString(self) -> str:
+        return self.tr(_DESCRIPTION)
+
+    def _collect_inputs(
+        self, parameters, context, feedback: QgsProcessingFeedback
+    ) -> list[str]:
+        """入力のフォルダまたは zip ファイルから読み込み対象のファイルを集める"""
+        feature_types_str = self.parameterAsString(
+            parameters, self.FEATURE_TYPES, context
+        )
+        feature_types = {
+            s.strip() for s in feature_types_str.split(",") if s.strip()
+        } or None
+
+        if input_dir := self.parameterAsFile(parameters, self.INPUT_DIR, context):
+            root = Path(input_dir)
+            filenames = _collect_gml_files(root, feature_types)
+            if (bbox := self._get_bbox(parameters, context)) is not None:
+                catalog_path = (
+                    default_cache_dir()
+                    / f"catalog-{hashlib.sha1(str(root.resolve()).encode()).hexdigest()}.sqlite"
+                )
+                filenames = self._select_by_catalog(
+                    root, catalog_path, filenames, bbox, feedback
+                )
+            return filenames
+
+        if input_zip := self.parameterAsFile(parameters, self.INPUT_ZIP, context):
+            return _collect_zip_gml_sources(input_zip, feature_types)
+
+        raise QgsProcessingException(
+            self.tr("フォルダまたは zip ファイルのいずれかを指定してください")
+        )
+
+    def _select_by_catalog(
+        self,
+        root: Path,
+        catalog_path: Path,
+        filenames: list[str],
+        bbox: tuple[float, float, float, float],
+        feedback: QgsProcessingFeedback,
+    ) -> list[str]:
+        """配布データの目録を更新し、範囲と交差するファイルだけを選ぶ"""
+        feedback.pushInfo("配布データの目録を更新しています...")
+        catalog_path.parent.mkdir(parents=True, exist_ok=True)
+        with DatasetCatalog(root, catalog_path) as catalog:
+            catalog.update(Path(f) for f in filenames)
+            intersecting = {str(entry.path) for entry in catalog.query(bbox)}
+        return [f for f in filenames if f in intersecting]
+
+    def processAlgorithm(
+        self,
+        parameters: dict[str, Any],
+        context: QgsProcessingContext,
+        feedback: QgsProcessingFeedback,
+    ):
+        destination_crs = self.parameterAsCrs(parameters, self.CRS, context)
+        force2d = self.parameterAsBoolean(parameters, self.FORCE_2D, context)
+        lod_option = _LOD_OPTIONS[
+            self.parameterAsEnum(parameters, self.LOD_PREFERENCE, context)
+        ]
+        (workers, mp_context) = self._get_workers(parameters, context, feedback)
+        write_buffer = FeatureWriteBuffer(
+            self.parameterAsInt(parameters, self.BATCH_SIZE, context)
+        )
+
+        # 全てのファイルでレイヤ、座標変換、パーサの設定を共有する
+        layer_manager = self._make_layer_manager(parameters, context, lod_option)
+        settings = self._make_settings(parameters, context, lod_option)
+        crs_transform = QgsCoordinateTransform(
+            QgsCoordinateReferenceSystem("epsg:6697"),
+            destination_crs,
+            QgsProject.instance(),
+        )
+
+        filenames = self._collect_inputs(parameters, context, feedback)
+        feedback.pushInfo(f"{len(filenames)}個の CityGML ファイルを読み込みます。")
+        profiler = self._make_profiler(parameters, context)
+
+        count = 0
+        parsed_files = parse_files_in_parallel(
+            filenames,
+            settings,
+            max_workers=workers,
+            mp_context=mp_context,
+            cache=self._make_cache(parameters, context),
+            use_index=self.parameterAsBoolean(parameters, self.USE_INDEX, context),
+            profiler=profiler,
+        )
+        for file_count, (filename, cityobjs) in enumerate(
+            profiler.timed_iter("parse", parsed_files), start=1
+        ):
+            if feedback.isCanceled():
+                # 読み込み済みの地物はレイヤに残す
+                break
+
+            source = Path(filename).stem
+            for cityobj in cityobjs:
+                profiler.count("features", cityobj.processor.id)
+                with profiler.stage("make_feature"):
+                    layer = layer_manager.get_layer(cityobj)
+                    feature = _make_feature(
+                        cityobj,
+                        layer.dataProvider().fields(),
+                        layer_manager.get_field_indices(layer),
+                        source,
+                        force2d,
+                        crs_transform,
+                        profiler,
+                    )
+                with profiler.stage("add_feature"):
+                    write_buffer.add(layer, feature)
+                count += 1
+
+            feedback.setProgress(file_count / len(filenames) * 100)
+            feedback.pushInfo(
+                f"{source} を読み込みました ({file_count}/{len(filenames)}、計 {count} 個の地物)"
+            )
+
+        with profiler.stage("add_feature"):
+            write_buffer.flush()
+        with profiler.stage("finalize_layers"):
+            self._finalize_layers(layer_manager, context)
+        return self._report_profile(profiler, parameters, context, feedback, workers)
@@ -16,8 +16,6 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-import lxml.etree as et
-import numpy as np
 from qgis.core import (
     QgsProcessingAlgorithm,
     QgsProcessingContext,
@@ -27,48 +25,11 @@ from qgis.core import (
 )
 from qgis.PyQt.QtCore import QCoreApplication
 
-from ..plateau.namespaces import BASE_NS
-
-_PLY_HEADER_TEMPLATE = """ply
-format binary_little_endian 1.0
-comment crs: GEOGCRS["JGD2011",DATUM["Japanese Geodetic Datum 2011",ELLIPSOID["GRS 1980",6378137,298.257222101,LENGTHUNIT["metre",1]]],PRIMEM["Greenwich",0,ANGLEUNIT["degree",0.0174532925199433]],CS[ellipsoidal,2],AXIS["geodetic latitude (Lat)",north,ORDER[1],ANGLEUNIT["degree",0.0174532925199433]],AXIS["geodetic longitude (Lon)",east,ORDER[2],ANGLEUNIT["degree",0.0174532925199433]],USAGE[SCOPE["Horizontal component of 3D system."],AREA["Japan - onshore and offshore."],BBOX[17.09,122.38,46.05,157.65]],ID["EPSG",6668]]
-element vertex {n_verts}
-property float x
-property float y
-property float z
-element face {n_faces}
-property list uchar uint vertex_indices
-end_header\n"""
-
-
-_DESCRIPTION = """PLATEAU の地形モデル (./dem/) の CityGML ファイルを QGIS のメッシュレイヤとして読み込みます。"""
-
-
-def convert_citygml_relief_to_ply(src_filename: str, dst_filename: str) -> None:
-    doc = et.parse(src_filename, None)
-    index_map = {}
-    points = []
-    faces = []
-    for pos_list in doc.iterfind(".//dem:TINRelief//gml:posList", BASE_NS):
-        tri_verts = [float(v) for v in pos_list.text.split()]
-        tri_indices = [b"\x03"]
-        for i in range(3):
-            y, x, z = tri_verts[i * 3 : i * 3 + 3]
-            key = (x, y)
-            if (idx := index_map.get(key)) is None:
-                idx = index_map[key] = len(index_map)
-                points.extend((x, y, z))
-            tri_indices.append(idx.to_bytes(4, "little"))
-        faces.append(b"".join(tri_indices))
-
-    with open(dst_filename, "wb") as f:
-        f.write(
-            _PLY_HEADER_TEMPLATE.format(
-                n_verts=len(points) // 3, n_faces=len(faces)
-            ).encode("ascii")
-        )
-        f.write(np.asarray(points, dtype="<f4").tobytes())
-        f.write(b"".join(faces))
+from ..ply import convert_citygml_relief_to_ply
+
+_DESCRIPTION = """PLATEAU の地形モデル (./dem/) の CityGML ファイルを QGIS のメッシュレイヤとして読み込みます。
+
+配布データの zip ファイル内の CityGML ファイルは、zip:///path/to/data.zip!/udx/dem/xxx.gml の形式で指定すると展開せずに読み込めます。"""
 
 
 class PlateauDEMLoaderAlrogithm(QgsProcessingAlgorithm):
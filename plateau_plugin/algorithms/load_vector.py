@@ -20,7 +20,9 @@ from __future__ import annotations
 
 import datetime
 import json
+import os
 import platform
+from multiprocessing.context import BaseContext
 from pathlib import Path
 from typing import Any
 
@@ -28,23 +30,33 @@ from qgis.core import (
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
     QgsFeature,
-    QgsFeatureSink,
+    QgsFields,
     QgsProcessingAlgorithm,
     QgsProcessingContext,
     QgsProcessingException,  # pyright: ignore
     QgsProcessingFeedback,
     QgsProcessingParameterBoolean,
     QgsProcessingParameterCrs,
+    QgsProcessingParameterDefinition,
     QgsProcessingParameterEnum,
+    QgsProcessingParameterExtent,
     QgsProcessingParameterFile,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingParameterNumber,
     QgsProcessingUtils,
     QgsProject,
 )
 from qgis.PyQt.QtCore import QCoreApplication, QDate
 
 from ..geometry import to_qgis_geometry
+from ..plateau.models import processors
 from ..plateau.parse import ParserSettings, PlateauCityGmlParser
-from .utils.layermanger import LayerManager
+from ..plateau.parse.cache import ParseCache
+from ..plateau.parse.index import load_or_build_index
+from ..plateau.profiling import NULL_PROFILER, Profiler
+from ..plateau.types import CityObject
+from .utils.layermanger import FeatureWriteBuffer, LayerManager
+from .utils.processes import get_mp_context
 
 
 def _convert_to_qt_value(v: Any) -> Any:
@@ -65,6 +77,70 @@ def _convert_to_qt_value(v: Any) -> Any:
             return v
 
 
+def _make_feature(
+    cityobj: CityObject,
+    fields: QgsFields,
+    field_indices: dict[str, int],
+    source: str,
+    force2d: bool,
+    crs_transform: QgsCoordinateTransform,
+    profiler: Profiler = NULL_PROFILER,
+) -> QgsFeature:
+    """CityObject から QGIS の地物を作る
+
+    属性値はフィールド名ではなく field_indices で引いた位置に直接並べる。
+    """
+    feature = QgsFeature(fields)
+
+    # Set attributes
+    attrs: list[Any] = [None] * len(fields)
+    core_values = {
+        "id": cityobj.id,
+        "source": source,
+        "type": cityobj.type,
+        "lod": cityobj.lod,
+        "name": cityobj.name,
+        "description": cityobj.description,
+        "creationDate": (
+            QDate(cityobj.creation_date) if cityobj.creation_date else None  # type: ignore
+        ),
+        "terminationDate": (
+            QDate(cityobj.termination_date)  # type: ignore
+            if cityobj.termination_date
+            else None
+        ),
+        # 親Featureと結合 (join) できるように親Featureの ID を持たせる
+        "parent": cityobj.parent.id if cityobj.parent else None,
+    }
+    for name, value in core_values.items():
+        # 追記先の既存のレイヤにフィールドがない場合は無視する
+        if (index := field_indices.get(name)) is not None:
+            attrs[index] = value
+
+    for name, value in cityobj.attributes.items():
+        # レイヤにフィールドがない属性は無視する
+        if (index := field_indices.get(name)) is not None:
+            attrs[index] = _convert_to_qt_value(value)
+    feature.setAttributes(attrs)
+
+    if cityobj.geometry:
+        # Should be treated as 2D?
+        as2d = False
+        if cityobj.lod is not None:
+            lod_def = cityobj.processor.lod_list[cityobj.lod]
+            if lod_def:
+                as2d = force2d or lod_def.is2d
+
+        # Set geometry
+        with profiler.stage("to_qgis_geometry"):
+            geom = to_qgis_geometry(cityobj.geometry, as2d=as2d)
+        with profiler.stage("crs_transform"):
+            geom.transform(crs_transform, transformZ=False)
+        feature.setGeometry(geom)
+
+    return feature
+
+
 _LOD_OPTIONS = {
     0: {
         "label": "最も単純なLODのみを読み込む",
@@ -83,11 +159,25 @@ _DESCRIPTION = """3D都市モデル標準製品仕様書 第3.0版に対応し
 
 データは一時スクラッチレイヤに読み込まれます。
 
+配布データの zip ファイル内の CityGML ファイルは、zip:///path/to/data.zip!/udx/bldg/xxx.gml の形式で指定すると展開せずに読み込めます。コードリストは同じ zip ファイル内から読み込まれます。
+
 同一の都市オブジェクトに複数のLOD (詳細度) が用意されている場合は、デフォルトでは最も単純なLODのみを読み込みます。必要に応じて、"読み込むLOD" オプションで「最も詳細なLODのみを読み込む」または「全てのLODを読み込む」を選択してください。
 
 「地物を構成する部分ごとにレイヤを分ける」を有効にすると、一部のモデルのLOD2以上において、壁や屋根、車道や歩道といった意味論的な子要素ごとにレイヤを分けて地物を読み込みます。このオプションを有効にすると地物の数が大幅に増える可能性があります。
 
+「読み込む範囲」を指定すると、範囲と交差する都市オブジェクトだけを読み込みます。範囲外の都市オブジェクトは解析を省略するため、大きなファイルの一部だけが必要な場合に高速です。
+
+詳細パラメータの「読み込む地物の種類」「読み込まない地物の種類」で、読み込む地物を種類ごとに選べます。選ばれなかった種類の地物は解析そのものを省略します。
+
+詳細パラメータの「属性のみを読み込む (ジオメトリなし)」を有効にすると、ジオメトリの解析を省略し、全ての地物をジオメトリをもたない表として読み込みます。属性の集計だけが必要な場合に高速です。
+
 「3Dデータを強制的に平面化する」を有効にすると、3次元の情報を捨てて平面データとして読み込みます。高さをもたないモデル (都市計画決定情報など) はこのオプションにかかわらず常に平面として読み込みます。
+
+詳細パラメータの「パース結果をディスクにキャッシュする」を有効にすると、同じファイルを同じ設定で再び読み込む際に CityGML の解析を省略します。キャッシュは環境変数 PLATEAU_CACHE_DIR で指定したディレクトリ (デフォルトではユーザーのキャッシュディレクトリ) に保存され、合計 2GiB を超えると古いものから削除されます。
+
+詳細パラメータの「範囲を指定した読み込みに索引ファイル (.plidx) を使う」を有効にすると、「読み込む範囲」を指定した場合に、CityGML ファイルの隣に保存した索引ファイルから範囲内の都市オブジェクトの位置を調べ、その部分だけを読み込みます。索引ファイルがない場合や CityGML ファイルが更新された場合は、最初の読み込み時に作成します。同じファイルから範囲を変えて繰り返し読み込む場合に高速です。
+
+詳細パラメータの「処理時間の内訳を計測して表示する」を有効にすると、読み込みの最後に XML の読み込み、属性やジオメトリの解析、座標変換、レイヤへの追加などの段階ごとの所要時間と、地物の種類ごとの数をログに表示します。「処理時間の内訳の保存先 (JSON)」を指定すると、同じ内容を JSON ファイルに保存します。
 """
 
 
@@ -100,6 +190,16 @@ class PlateauVectorLoaderAlrogithm(QgsProcessingAlgorithm):
     FORCE_2D = "FORCE_2D"
     APPEND_MODE = "APPEND_MODE"
     CRS = "CRS"
+    EXTENT = "EXTENT"
+    INCLUDE_TYPES = "INCLUDE_TYPES"
+    EXCLUDE_TYPES = "EXCLUDE_TYPES"
+    ATTRIBUTES_ONLY = "ATTRIBUTES_ONLY"
+    WORKERS = "WORKERS"
+    BATCH_SIZE = "BATCH_SIZE"
+    USE_CACHE = "USE_CACHE"
+    USE_INDEX = "USE_INDEX"
+    PROFILE = "PROFILE"
+    PROFILE_OUTPUT = "PROFILE_OUTPUT"
 
     def tr(self, string: str):
         return QCoreApplication.translate("Processing", string)
@@ -112,6 +212,10 @@ class PlateauVectorLoaderAlrogithm(QgsProcessingAlgorithm):
                 fileFilter=self.tr("PLATEAU CityGML ファイル (*.gml)"),
             )
         )
+        self._init_loading_parameters()
+
+    def _init_loading_parameters(self, default_workers: int = 1):
+        """入力以外の読み込みオプションのパラメータを定義する"""
         self.addParameter(
             QgsProcessingParameterEnum(
                 self.LOD_PREFERENCE,
@@ -152,6 +256,105 @@ class PlateauVectorLoaderAlrogithm(QgsProcessingAlgorithm):
                 optional=True,
             )
         )
+        self.addParameter(
+            QgsProcessingParameterExtent(
+                self.EXTENT,
+                self.tr("読み込む範囲 (指定しない場合は全体)"),
+                optional=True,
+            )
+        )
+        for name, description in (
+            (self.INCLUDE_TYPES, self.tr("読み込む地物の種類 (指定しない場合は全て)")),
+            (self.EXCLUDE_TYPES, self.tr("読み込まない地物の種類")),
+        ):
+            types_param = QgsProcessingParameterEnum(
+                name,
+                description,
+                options=[f"{p.name} ({p.id})" for p in processors],
+                allowMultiple=True,
+                optional=True,
+            )
+            types_param.setFlags(
+                types_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+            )
+            self.addParameter(types_param)
+        attributes_only_param = QgsProcessingParameterBoolean(
+            self.ATTRIBUTES_ONLY,
+            self.tr("属性のみを読み込む (ジオメトリなし)"),
+            defaultValue=False,
+            optional=True,
+        )
+        attributes_only_param.setFlags(
+            attributes_only_param.flags()
+            | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(attributes_only_param)
+        workers_param = QgsProcessingParameterNumber(
+            self.WORKERS,
+            self.tr("パースに使うプロセス数 (1の場合は並列化しない)"),
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=default_workers,
+            minValue=1,
+            maxValue=os.cpu_count() or 1,
+            optional=True,
+        )
+        workers_param.setFlags(
+            workers_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(workers_param)
+        batch_size_param = QgsProcessingParameterNumber(
+            self.BATCH_SIZE,
+            self.tr("レイヤにまとめて追加する地物の数"),
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=1000,
+            minValue=1,
+            optional=True,
+        )
+        batch_size_param.setFlags(
+            batch_size_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(batch_size_param)
+        cache_param = QgsProcessingParameterBoolean(
+            self.USE_CACHE,
+            self.tr("パース結果をディスクにキャッシュする"),
+            defaultValue=False,
+            optional=True,
+        )
+        cache_param.setFlags(
+            cache_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(cache_param)
+        index_param = QgsProcessingParameterBoolean(
+            self.USE_INDEX,
+            self.tr("範囲を指定した読み込みに索引ファイル (.plidx) を使う"),
+            defaultValue=False,
+            optional=True,
+        )
+        index_param.setFlags(
+            index_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(index_param)
+        profile_param = QgsProcessingParameterBoolean(
+            self.PROFILE,
+            self.tr("処理時間の内訳を計測して表示する"),
+            defaultValue=False,
+            optional=True,
+        )
+        profile_param.setFlags(
+            profile_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(profile_param)
+        profile_output_param = QgsProcessingParameterFileDestination(
+            self.PROFILE_OUTPUT,
+            self.tr("処理時間の内訳の保存先 (JSON)"),
+            fileFilter=self.tr("JSON ファイル (*.json)"),
+            optional=True,
+            createByDefault=False,
+        )
+        profile_output_param.setFlags(
+            profile_output_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced
+        )
+        self.addParameter(profile_output_param)
 
     def createInstance(self):
         return PlateauVectorLoaderAlrogithm()
@@ -171,25 +374,142 @@ class PlateauVectorLoaderAlrogithm(QgsProcessingAlgorithm):
     def shortHelpString(self) -> str:
         return self.tr(_DESCRIPTION)
 
-    def _make_parser(
-        self, filename: str, parameters, context, lod_option
-    ) -> PlateauCityGmlParser:
-        """プロセシングの設定をもとにパーサを作る"""
+    def _make_settings(self, parameters, context, lod_option) -> ParserSettings:
+        """プロセシングの設定をもとにパーサの設定を作る"""
         load_semantic_parts = self.parameterAsBoolean(
             parameters, self.SEMANTIC_PARTS, context
         )
-        settings = ParserSettings(
+        return ParserSettings(
             load_semantic_parts=load_semantic_parts,
             target_lods=(False, True, True, True, True),
             only_first_found_lod=lod_option["only_first"],
             lowest_lod_first=lod_option["prefer_lowest"],
+            attributes_only=self.parameterAsBoolean(
+                parameters, self.ATTRIBUTES_ONLY, context
+            ),
+            bbox=self._get_bbox(parameters, context),
+            include_processors=self._get_processor_ids(
+                parameters, self.INCLUDE_TYPES, context
+            )
+            or None,
+            exclude_processors=self._get_processor_ids(
+                parameters, self.EXCLUDE_TYPES, context
+            ),
+        )
+
+    def _get_processor_ids(self, parameters, name: str, context) -> tuple[str, ...]:
+        """複数選択された地物の種類を Processor の ID に変換する"""
+        processor_ids = [p.id for p in processors]
+        return tuple(
+            sorted(
+                processor_ids[i]
+                for i in self.parameterAsEnums(parameters, name, context)
+            )
+        )
+
+    def _get_bbox(
+        self, parameters, context
+    ) -> tuple[float, float, float, float] | None:
+        """読み込む範囲を EPSG:6697 (経度, 緯度) に変換して返す"""
+        extent = self.parameterAsExtent(
+            parameters,
+            self.EXTENT,
+            context,
+            QgsCoordinateReferenceSystem("EPSG:6697"),
+        )
+        if extent.isEmpty():
+            return None
+        return (
+            extent.xMinimum(),
+            extent.yMinimum(),
+            extent.xMaximum(),
+            extent.yMaximum(),
         )
 
+    def _make_parser(
+        self,
+        filename: str,
+        parameters,
+        context,
+        lod_option,
+        profiler: Profiler = NULL_PROFILER,
+    ) -> PlateauCityGmlParser:
+        """プロセシングの設定をもとにパーサを作る"""
+        settings = self._make_settings(parameters, context, lod_option)
+
         if filename is None:
             raise QgsProcessingException(
                 self.invalidSourceError(parameters, self.INPUT)
             )  # pragma: no cover
-        return PlateauCityGmlParser(filename, settings)
+        return PlateauCityGmlParser(
+            filename,
+            settings,
+            cache=self._make_cache(parameters, context),
+            index=(
+                load_or_build_index(filename)
+                if settings.bbox is not None
+                and self.parameterAsBoolean(parameters, self.USE_INDEX, context)
+                else None
+            ),
+            profiler=profiler,
+        )
+
+    def _make_cache(self, parameters, context) -> ParseCache | None:
+        """キャッシュを使う設定であればパース結果のキャッシュを返す"""
+        if self.parameterAsBoolean(parameters, self.USE_CACHE, context):
+            return ParseCache()
+        return None
+
+    def _get_workers(
+        self, parameters, context, feedback: QgsProcessingFeedback
+    ) -> tuple[int, BaseContext | None]:
+        """パースに使うプロセス数と、ワーカープロセスを起動するためのコンテキストを返す"""
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
+        if workers <= 1:
+            return (1, None)
+        if (mp_context := get_mp_context()) is None:
+            feedback.reportError(
+                self.tr(
+                    "ワーカープロセスに使う Python が見つからないため、並列化せずに読み込みます。"
+                ),
+                fatalError=False,
+            )
+            return (1, None)
+        return (workers, mp_context)
+
+    def _make_profiler(self, parameters, context) -> Profiler:
+        """処理時間を計測する設定であれば Profiler を、そうでなければ NULL_PROFILER を返す"""
+        if self.parameterAsBoolean(
+            parameters, self.PROFILE, context
+        ) or self.parameterAsFileOutput(parameters, self.PROFILE_OUTPUT, context):
+            return Profiler()
+        return NULL_PROFILER
+
+    def _report_profile(
+        self,
+        profiler: Profiler,
+        parameters,
+        context: QgsProcessingContext,
+        feedback: QgsProcessingFeedback,
+        workers: int,
+    ) -> dict[str, Any]:
+        """計測結果を表示し、保存先が指定されていれば JSON として保存する"""
+        if not profiler.enabled:
+            return {}
+        feedback.pushInfo("処理時間の内訳:")
+        for line in profiler.format_lines():
+            feedback.pushInfo(line)
+        if workers > 1:
+            feedback.pushInfo(
+                "(ワーカープロセスで行ったパースの内訳は含まれません。parse は結果を待った時間です)"
+            )
+        if output := self.parameterAsFileOutput(
+            parameters, self.PROFILE_OUTPUT, context
+        ):
+            profiler.save_json(output)
+            feedback.pushInfo(f"処理時間の内訳を {output} に保存しました。")
+            return {self.PROFILE_OUTPUT: output}
+        return {}
 
     def flags(self) -> QgsProcessingAlgorithm.Flags:
         if platform.system() == "Windows":
@@ -198,7 +518,17 @@ class PlateauVectorLoaderAlrogithm(QgsProcessingAlgorithm):
         else:
             return super().flags()
 
-    def processAlgorithm(  # noqa: C901
+    def _make_layer_manager(self, parameters, context, lod_option) -> LayerManager:
+        """プロセシングの設定をもとにレイヤマネージャを作る"""
+        return LayerManager(
+            force2d=self.parameterAsBoolean(parameters, self.FORCE_2D, context),
+            crs=self.parameterAsCrs(parameters, self.CRS, context),
+            append_mode=self.parameterAsBoolean(parameters, self.APPEND_MODE, context),
+            lod_in_name=not lod_option["only_first"],
+            project=context.project(),
+        )
+
+    def processAlgorithm(
         self,
         parameters: dict[str, Any],
         context: QgsProcessingContext,
@@ -206,20 +536,20 @@ class PlateauVectorLoaderAlrogithm(QgsProcessingAlgorithm):
     ):
         destination_crs = self.parameterAsCrs(parameters, self.CRS, context)
         force2d = self.parameterAsBoolean(parameters, self.FORCE_2D, context)
-        append_mode = self.parameterAsBoolean(parameters, self.APPEND_MODE, context)
         lod_option = _LOD_OPTIONS[
             self.parameterAsEnum(parameters, self.LOD_PREFERENCE, context)
         ]
-        layer_manager = LayerManager(
-            force2d=force2d,
-            crs=destination_crs,
-            append_mode=append_mode,
-            lod_in_name=not lod_option["only_first"],
-            project=context.project(),
-        )
+        layer_manager = self._make_layer_manager(parameters, context, lod_option)
         filename = self.parameterAsFile(parameters, self.INPUT, context)
+        source = Path(filename).stem
+        profiler = self._make_profiler(parameters, context)
+
+        (workers, mp_context) = self._get_workers(parameters, context, feedback)
+        write_buffer = FeatureWriteBuffer(
+            self.parameterAsInt(parameters, self.BATCH_SIZE, context)
+        )
 
-        parser = self._make_parser(filename, parameters, context, lod_option)
+        parser = self._make_parser(filename, parameters, context, lod_option, profiler)
         total_count = parser.count_toplevel_cityobjs()
         feedback.pushInfo(
             f"{total_count}個のトップレベル都市オブジェクトが含まれています。"
@@ -234,58 +564,49 @@ class PlateauVectorLoaderAlrogithm(QgsProcessingAlgorithm):
             QgsProject.instance(),
         )
 
+        if workers > 1:
+            # パースはワーカープロセスで行い、レイヤへの追加だけをこのスレッドで行う
+            cityobjs = parser.iter_cityobjs_parallel(workers, mp_context=mp_context)
+        else:
+            cityobjs = parser.iter_cityobjs()
+
         # NOTE: 例外のハンドリングはプロセッシングフレームワークに任せている
-        for top_level_count, cityobj in parser.iter_cityobjs():
+        for top_level_count, cityobj in profiler.timed_iter("parse", cityobjs):
             if feedback.isCanceled():
-                return {}
-
-            layer = layer_manager.get_layer(cityobj)
-            provider = layer.dataProvider()
-            feature = QgsFeature(provider.fields())
-
-            # Set attributes
-            feature.setAttribute("id", cityobj.id)
-            feature.setAttribute("source", Path(filename).stem)
-            feature.setAttribute("type", cityobj.type)
-            feature.setAttribute("lod", cityobj.lod)
-            feature.setAttribute("name", cityobj.name)
-            feature.setAttribute("description", cityobj.description)
-            feature.setAttribute(
-                "creationDate",
-                QDate(cityobj.creation_date) if cityobj.creation_date else None,  # type: ignore
-            )
-            feature.setAttribute(
-                "terminationDate",
-                QDate(cityobj.creation_date) if cityobj.termination_date else None,  # type: ignore
-            )
-            if cityobj.parent:
-                # 親Featureと結合 (join) できるように親Featureの ID を持たせる
-                feature.setAttribute("parent", cityobj.parent.id)
-
-            for name, value in cityobj.attributes.items():
-                feature.setAttribute(name, _convert_to_qt_value(value))
-
-            if cityobj.geometry:
-                # Should be treated as 2D?
-                as2d = False
-                if cityobj.lod is not None:
-                    lod_def = cityobj.processor.lod_list[cityobj.lod]
-                    if lod_def:
-                        as2d = force2d or lod_def.is2d
-
-                # Set geometry
-                geom = to_qgis_geometry(cityobj.geometry, as2d=as2d)
-                geom.transform(crs_transform, transformZ=False)
-                feature.setGeometry(geom)
-
-            provider.addFeature(feature, QgsFeatureSink.FastInsert)
+                # 読み込み済みの地物はレイヤに残す
+                break
+
+            profiler.count("features", cityobj.processor.id)
+            with profiler.stage("make_feature"):
+                layer = layer_manager.get_layer(cityobj)
+                feature = _make_feature(
+                    cityobj,
+                    layer.dataProvider().fields(),
+                    layer_manager.get_field_indices(layer),
+                    source,
+                    force2d,
+                    crs_transform,
+                    profiler,
+                )
+            with profiler.stage("add_feature"):
+                write_buffer.add(layer, feature)
             count += 1
             if count % 100 == 0:
                 feedback.setProgress(top_level_count / total_count * 100)
                 feedback.pushInfo(f"{count} 個の地物を読み込みました。")
 
+        with profiler.stage("add_feature"):
+            write_buffer.flush()
         feedback.pushInfo(f"{count} 個の地物を読み込みました。")
 
+        with profiler.stage("finalize_layers"):
+            self._finalize_layers(layer_manager, context)
+        return self._report_profile(profiler, parameters, context, feedback, workers)
+
+    def _finalize_layers(
+        self, layer_manager: LayerManager, context: QgsProcessingContext
+    ) -> None:
+        """読み込みを終えたレイヤを確定させ、新しいレイヤをプロジェクトに追加する"""
         layers = sorted(layer_manager.layers, key=lambda x: x.name())
         for layer in layers:
             layer.dataProvider().flushBuffer()
@@ -309,5 +630,3 @@ class PlateauVectorLoaderAlrogithm(QgsProcessingAlgorithm):
                 # NOTE: 以下はバッチ処理時に多大なパフォーマンス低下を招くため無効化している
                 # 既存レイヤに追記した場合は、背後のプロバイダをリロードする
                 # layer.dataProvider().reloadData()
-
-        return {}
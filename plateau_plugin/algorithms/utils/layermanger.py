@@ -24,6 +24,8 @@ from qgis._3d import QgsPolygon3DSymbol, QgsVectorLayer3DRenderer
 from qgis.core import (
     Qgis,
     QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsFeatureSink,
     QgsField,
     QgsProject,
     QgsVectorLayer,
@@ -65,6 +67,7 @@ class LayerManager:
         project: QgsProject,
     ):
         self._layers: dict[str, QgsVectorLayer] = {}
+        self._field_indices: dict[str, dict[str, int]] = {}
         self._parent_map: dict[str, str] = {}
         self._force2d = force2d
         self._crs = crs
@@ -98,6 +101,14 @@ class LayerManager:
 
         return self._add_new_layer(layer_id, cityobj)
 
+    def get_field_indices(self, layer: QgsVectorLayer) -> dict[str, int]:
+        """レイヤのフィールド名からフィールドの位置への対応を返す"""
+        if (indices := self._field_indices.get(layer.id())) is None:
+            fields = layer.dataProvider().fields()
+            indices = {field.name(): i for i, field in enumerate(fields)}
+            self._field_indices[layer.id()] = indices
+        return indices
+
     def _subclass_name(self, cityobj: CityObject) -> str:
         """特定の種類において、属性値に応じて恣意的にレイヤを分けるための副分類名を返す"""
         _type = cityobj.type
@@ -242,3 +253,30 @@ class LayerManager:
     #         join.setTargetFieldName("parent")
     #         join.setUsingMemoryCache(True)
     #         layer.addJoin(join)
+
+
+class FeatureWriteBuffer:
+    """レイヤごとに地物を溜めておき、batch_size 個ずつまとめてレイヤに追加する"""
+
+    def __init__(self, batch_size: int = 1000):
+        assert batch_size >= 1
+        self._batch_size = batch_size
+        self._buffers: dict[str, tuple[QgsVectorLayer, list[QgsFeature]]] = {}
+
+    def add(self, layer: QgsVectorLayer, feature: QgsFeature) -> None:
+        if (buffer := self._buffers.get(layer.id())) is None:
+            buffer = self._buffers[layer.id()] = (layer, [])
+        features = buffer[1]
+        features.append(feature)
+        if len(features) >= self._batch_size:
+            self._flush_layer(layer, features)
+
+    def flush(self) -> None:
+        """溜まっている全ての地物をレイヤに追加する"""
+        for layer, features in self._buffers.values():
+            self._flush_layer(layer, features)
+
+    def _flush_layer(self, layer: QgsVectorLayer, features: list[QgsFeature]):
+        if features:
+            layer.dataProvider().addFeatures(features, QgsFeatureSink.FastInsert)
+            features.clear()
@@ -0,0 +1,77 @@
+"""Utilities for running the parser in worker processes from inside QGIS"""
+
+# Copyright (C) 2023 MLIT Japan
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+from __future__ import annotations
+
+import functools
+import multiprocessing
+import subprocess
+import sys
+from multiprocessing.context import BaseContext
+from pathlib import Path
+
+
+def _is_usable_python(exe: Path) -> bool:
+    """exe がこのプロセスと同じバージョンの Python インタプリタとして起動できるかどうか"""
+    try:
+        result = subprocess.run(
+            [str(exe), "-c", "import sys; print(sys.version_info[:2])"],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.returncode == 0 and result.stdout.strip() == str(sys.version_info[:2])
+
+
+@functools.lru_cache(maxsize=None)
+def find_python_executable() -> Path | None:
+    """QGIS に同梱されている Python インタプリタを探す
+
+    QGIS の中では sys.executable が QGIS 本体を指していることがあるため、
+    候補を実際に起動してみて、このプロセスと同じバージョンの Python であるものを返す。
+    """
+    exe = Path(sys.executable)
+    candidates = [exe] if exe.stem.lower().startswith("python") else []
+    for prefix in (Path(sys.exec_prefix), Path(sys.prefix)):
+        candidates.extend(
+            (
+                prefix / "python.exe",
+                prefix / "bin" / "python3",
+                prefix / "bin" / "python",
+            )
+        )
+    for candidate in candidates:
+        if candidate.exists() and _is_usable_python(candidate):
+            return candidate
+    return None
+
+
+def get_mp_context() -> BaseContext | None:
+    """ワーカープロセスを起動するための multiprocessing のコンテキストを返す
+
+    QGIS はマルチスレッドのアプリケーションなので fork は使わずに spawn する。
+    ワーカーに使える Python インタプリタが見つからない場合は None を返す (呼び出し側は並列化しない)。
+    """
+    if (exe := find_python_executable()) is None:
+        return None
+    ctx = multiprocessing.get_context("spawn")
+    ctx.set_executable(str(exe))
+    return ctx
@@ -2,12 +2,8 @@
 
 from qgis.core import (
     QgsGeometry,
-    QgsLineString,
-    QgsMultiLineString,
     QgsMultiPoint,
-    QgsMultiPolygon,
     QgsPoint,
-    QgsPolygon,
 )
 
 from .plateau.types import (
@@ -16,81 +12,37 @@ from .plateau.types import (
     PointCollection,
     PolygonCollection,
 )
+from .wkb import lines_to_wkb, polygons_to_wkb
 
 
-def to_qgis_geometry(src_geom: Geometry, as2d: bool) -> QgsGeometry:
-    """Convert geometries from PLATEAU module into QGIS geometry"""
+def _from_wkb(wkb: bytes) -> QgsGeometry:
+    geom = QgsGeometry()
+    geom.fromWkb(wkb)
+    return geom
 
-    if as2d:
-        return _to_qgis_geometry_2d(src_geom)
 
-    if isinstance(src_geom, PolygonCollection):
-        # MultiPolygon
-        dest_geoms = QgsMultiPolygon()
-        for src_rings in src_geom.polygons:
-            # exterior ring
-            src_ring = src_rings[0]
-            dest_ring = QgsLineString(src_ring[:, 1], src_ring[:, 0], src_ring[:, 2])
-            dest_poly = QgsPolygon(dest_ring)
-            for src_ring in src_rings[1:]:
-                # interior rings
-                dest_ring = QgsLineString(
-                    src_ring[:, 1], src_ring[:, 0], src_ring[:, 2]
-                )
-                dest_poly.addInteriorRing(dest_ring)
-            dest_geoms.addGeometry(dest_poly)
-    elif isinstance(src_geom, LineStringCollection):
-        # MultiLineString
-        dest_geoms = QgsMultiLineString()
-        for src_line in src_geom.lines:
-            dest_line = QgsLineString(src_line[:, 1], src_line[:, 0], src_line[:, 2])
-            dest_geoms.addGeometry(dest_line)
-    elif isinstance(src_geom, PointCollection):
-        # MultiPoint
-        dest_geoms = QgsMultiPoint()
-        for src_point in src_geom.points:
-            x, y, z = src_point
-            dest_point = QgsPoint(y, x, z)
-            dest_geoms.addGeometry(dest_point)
-    else:
-        raise RuntimeError(f"Unsupported geometry type: {type(src_geom)}")
-
-    return dest_geoms
-
-
-def _to_qgis_geometry_2d(src_geom: Geometry) -> QgsGeometry:
+def to_qgis_geometry(src_geom: Geometry, as2d: bool) -> QgsGeometry:
     """Convert geometries from PLATEAU module into QGIS geometry"""
 
     if isinstance(src_geom, PolygonCollection):
         # MultiPolygon
-        polygons = []
-        for src_rings in src_geom.polygons:
-            # exterior ring
-            src_ring = src_rings[0]
-            dest_ring = QgsLineString(src_ring[:, 1], src_ring[:, 0])
-            dest_poly = QgsPolygon(dest_ring)
-            for src_ring in src_rings[1:]:
-                # interior rings
-                dest_ring = QgsLineString(src_ring[:, 1], src_ring[:, 0])
-                dest_poly.addInteriorRing(dest_ring)
-            polygons.append(dest_poly)
-
-        return QgsGeometry.unaryUnion(QgsGeometry(p) for p in polygons)
+        geom = _from_wkb(polygons_to_wkb(src_geom, as2d))
+        if as2d:
+            # 2次元にすると重なり合うポリゴンを1つにまとめる
+            return QgsGeometry.unaryUnion([geom])
+        return geom
 
     elif isinstance(src_geom, LineStringCollection):
         # MultiLineString
-        dest_geoms = QgsMultiLineString()
-        for src_line in src_geom.lines:
-            dest_line = QgsLineString(src_line[:, 1], src_line[:, 0])
-            dest_geoms.addGeometry(dest_line)
+        return _from_wkb(lines_to_wkb(src_geom, as2d))
+
     elif isinstance(src_geom, PointCollection):
         # MultiPoint
         dest_geoms = QgsMultiPoint()
         for src_point in src_geom.points:
-            x, y, _ = src_point
-            dest_point = QgsPoint(y, x)
+            x, y, z = src_point
+            dest_point = QgsPoint(y, x) if as2d else QgsPoint(y, x, z)
             dest_geoms.addGeometry(dest_point)
-    else:
-        raise RuntimeError(f"Unsupported geometry type: {type(src_geom)}")
+        return QgsGeometry(dest_geoms)
 
-    return dest_geoms
+    raise RuntimeError(f"Unsupported geometry type: {type(src_geom)}")
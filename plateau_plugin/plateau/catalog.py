@@ -0,0 +1,324 @@
+"""PLATEAU の配布データ全体の目録 (カタログ)
+
+配布データ (udx ディレクトリを含むフォルダ) の CityGML ファイルを一度だけ走査し、
+ファイルごとのメッシュコード、データの種類、範囲、都市オブジェクトの数、i-UR のバージョン、
+含まれる LOD を SQLite のデータベースに記録する。
+以後は各ファイルを開かずに、範囲や種類で読み込むファイルを絞り込める。
+
+ファイルのサイズと更新時刻が変わっていなければ、再走査は省略する。
+
+    python -m plateau_plugin.plateau.catalog build path/to/13100_tokyo23-ku_2022_citygml_1_op
+    python -m plateau_plugin.plateau.catalog query path/to/13100_tokyo23-ku_2022_citygml_1_op --bbox 139.76,35.67,139.77,35.68
+"""
+
+from __future__ import annotations
+
+import argparse
+import mmap
+import os
+import re
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path, PurePath
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+
+from .namespaces import Namespace
+from .parse.index import build_index
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    feature_type TEXT NOT NULL,
+    mesh_code TEXT,
+    min_lon REAL,
+    min_lat REAL,
+    max_lon REAL,
+    max_lat REAL,
+    feature_count INTEGER NOT NULL,
+    iur_version TEXT,
+    lods TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_feature_type ON files (feature_type);
+"""
+
+_CATALOG_FILENAME = "plateau_catalog.sqlite"
+
+_MESH_CODE = re.compile(r"^(\d{4}(?:\d{2}(?:\d{2}(?:\d{1,2})?)?)?)_")
+_LOD_TAG = re.compile(
+    rb"<[A-Za-z_][\w.\-]*:lod(?:([0-4])"
+    rb"(?:Geometry|MultiSurface|MultiSolid|Solid|Surface|MultiCurve|Network"
+    rb"|FootPrint|RoofEdge|TerrainIntersection|ImplicitRepresentation)[\s/>]"
+    rb"|>\s*([0-4])\s*<)"
+)
+"""lodN で始まるジオメトリのプロパティ要素 (uro:lod1HeightType などの属性は除く) と dem:lod 要素"""
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    path: Path
+    feature_type: str
+    mesh_code: str | None
+    bounds: tuple[float, float, float, float] | None
+    """最小経度, 最小緯度, 最大経度, 最大緯度 (EPSG:6697)"""
+    feature_count: int
+    iur_version: str | None
+    lods: tuple[int, ...]
+
+
+def feature_type_of(path: PurePath) -> str | None:
+    """udx ディレクトリ以下のパスから、データの種類 (bldg, tran など) を得る"""
+    parts = path.parts
+    if "udx" not in parts:
+        return None
+    i = parts.index("udx")
+    if len(parts) < i + 3:
+        return None
+    return parts[i + 1]
+
+
+def mesh_code_of(filename: str) -> str | None:
+    """ファイル名の先頭のメッシュコード (53394611_bldg_6697_op.gml -> 53394611) を得る"""
+    m = _MESH_CODE.match(PurePath(filename).name)
+    return m.group(1) if m else None
+
+
+def mesh_code_bounds(code: str) -> tuple[float, float, float, float]:
+    """地域メッシュコード (1次〜4分の1メッシュ) の範囲 (最小経度, 最小緯度, 最大経度, 最大緯度) を返す"""
+    lat = int(code[0:2]) / 1.5
+    lon = int(code[2:4]) + 100.0
+    height, width = 2 / 3, 1.0
+    if len(code) >= 6:
+        height, width = height / 8, width / 8
+        lat += int(code[4]) * height
+        lon += int(code[5]) * width
+    if len(code) >= 8:
+        height, width = height / 10, width / 10
+        lat += int(code[6]) * height
+        lon += int(code[7]) * width
+    for digit in code[8:10]:
+        # 2分の1・4分の1メッシュ: 1=南西, 2=南東, 3=北西, 4=北東
+        height, width = height / 2, width / 2
+        q = int(digit) - 1
+        lat += (q // 2) * height
+        lon += (q % 2) * width
+    return (lon, lat, lon + width, lat + height)
+
+
+def _iur_version(nsmap: dict[str, str]) -> str | None:
+    """文書で使われている i-UR のバージョン (uro 名前空間の末尾) を得る"""
+    if not any("/iur/uro/" in uri for uri in nsmap.values()):
+        return None
+    uro = Namespace.from_document_nsmap(nsmap).nsmap["uro"]
+    return uro.rstrip("/").rsplit("/", 1)[-1]
+
+
+def _scan_lods(filename: str) -> tuple[int, ...]:
+    """ファイルに現れる LOD を、lodN で始まるジオメトリのプロパティ要素 (と dem:lod 要素) から調べる"""
+    lods: set[int] = set()
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for m in _LOD_TAG.finditer(data):
+                lods.add(int(m.group(1) or m.group(2)))
+                if len(lods) == 5:
+                    break
+    return tuple(sorted(lods))
+
+
+def scan_file(filename: str, feature_type: str) -> CatalogEntry:
+    """1つの CityGML ファイルを走査して目録の項目を作る"""
+    index = build_index(filename)
+    mesh_code = mesh_code_of(filename)
+
+    # 範囲が不明なメンバーがある場合は、ファイルの範囲も (メッシュコードから分からなければ) 不明とする。
+    # 既知のメンバーの範囲だけで絞り込むと、範囲外と判定したファイルに範囲内のメンバーが含まれうる
+    bounds: tuple[float, float, float, float] | None = None
+    unknown = np.isnan(index.bounds).any(axis=1)
+    known = index.bounds[~unknown]
+    if unknown.any():
+        if mesh_code is not None:
+            bounds = mesh_code_bounds(mesh_code)
+            if len(known):
+                bounds = (
+                    min(bounds[0], float(known[:, 0].min())),
+                    min(bounds[1], float(known[:, 1].min())),
+                    max(bounds[2], float(known[:, 2].max())),
+                    max(bounds[3], float(known[:, 3].max())),
+                )
+    elif len(known):
+        bounds = (
+            float(known[:, 0].min()),
+            float(known[:, 1].min()),
+            float(known[:, 2].max()),
+            float(known[:, 3].max()),
+        )
+    elif mesh_code is not None:
+        bounds = mesh_code_bounds(mesh_code)
+
+    return CatalogEntry(
+        path=Path(filename),
+        feature_type=feature_type,
+        mesh_code=mesh_code,
+        bounds=bounds,
+        feature_count=len(index),
+        iur_version=_iur_version(index.nsmap),
+        lods=_scan_lods(filename),
+    )
+
+
+class DatasetCatalog:
+    """配布データの目録 (SQLite データベース)"""
+
+    def __init__(self, root: Path, db_path: Path | None = None) -> None:
+        """db_path を省略した場合は配布データのフォルダ直下に作る"""
+        self.root = Path(root)
+        self.db_path = db_path or self.root / _CATALOG_FILENAME
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> DatasetCatalog:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _relative(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    def update(
+        self,
+        filenames: Iterable[Path] | None = None,
+        progress: Callable[[int, int], None] | None = None,
+    ) -> int:
+        """CityGML ファイルを走査して目録を更新し、走査したファイルの数を返す
+
+        filenames を省略した場合は udx ディレクトリ以下の全ての CityGML ファイルを対象とし、
+        既に存在しなくなったファイルは目録から削除する。
+        サイズと更新時刻が目録と同じファイルは走査しない。
+        """
+        full_scan = filenames is None
+        if filenames is None:
+            filenames = sorted(self.root.glob("udx/**/*.gml"))
+        targets = [Path(f) for f in filenames]
+
+        known = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in self._conn.execute(
+                "SELECT path, size, mtime_ns FROM files"
+            )
+        }
+
+        scanned = 0
+        with self._conn:
+            if full_scan:
+                present = {self._relative(p) for p in targets}
+                self._conn.executemany(
+                    "DELETE FROM files WHERE path = ?",
+                    [(p,) for p in known.keys() - present],
+                )
+
+            for i, path in enumerate(targets):
+                if progress is not None:
+                    progress(i, len(targets))
+                relative = self._relative(path)
+                feature_type = feature_type_of(
+                    PurePath(path.relative_to(self.root.parent))
+                )
+                if feature_type is None:
+                    continue
+                stat = path.stat()
+                if known.get(relative) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+
+                entry = scan_file(str(path), feature_type)
+                bounds = entry.bounds or (None, None, None, None)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        relative,
+                        entry.feature_type,
+                        entry.mesh_code,
+                        *bounds,
+                        entry.feature_count,
+                        entry.iur_version,
+                        ",".join(str(lod) for lod in entry.lods),
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                    ),
+                )
+                scanned += 1
+        return scanned
+
+    def query(
+        self,
+        bbox: tuple[float, float, float, float] | None = None,
+        feature_types: Iterable[str] | None = None,
+    ) -> Iterator[CatalogEntry]:
+        """条件に合うファイルをパス順に返す
+
+        bbox (最小経度, 最小緯度, 最大経度, 最大緯度) を指定すると、範囲と交差する (または範囲が不明な) ファイルだけを返す。
+        """
+        sql = "SELECT * FROM files WHERE 1"
+        params: list = []
+        if feature_types is not None:
+            feature_types = list(feature_types)
+            sql += f" AND feature_type IN ({','.join('?' * len(feature_types))})"
+            params.extend(feature_types)
+        if bbox is not None:
+            sql += (
+                " AND (min_lon IS NULL"
+                " OR NOT (max_lon < ? OR min_lon > ? OR max_lat < ? OR min_lat > ?))"
+            )
+            params.extend((bbox[0], bbox[2], bbox[1], bbox[3]))
+        sql += " ORDER BY path"
+
+        for row in self._conn.execute(sql, params):
+            (path, feature_type, mesh_code, *bounds, count, iur, lods) = row[:10]
+            yield CatalogEntry(
+                path=self.root / path,
+                feature_type=feature_type,
+                mesh_code=mesh_code,
+                bounds=tuple(bounds) if bounds[0] is not None else None,  # type: ignore
+                feature_count=count,
+                iur_version=iur,
+                lods=tuple(int(v) for v in lods.split(",") if v),
+            )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m plateau_plugin.plateau.catalog",
+        description="PLATEAU の配布データの目録を作る・検索する",
+    )
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("root", type=Path, help="配布データのフォルダ")
+    parser.add_argument("--db", type=Path, help="目録のデータベースのパス")
+    parser.add_argument("--bbox", help="最小経度,最小緯度,最大経度,最大緯度")
+    parser.add_argument("--types", help="データの種類 (カンマ区切り)")
+    args = parser.parse_args(argv)
+
+    with DatasetCatalog(args.root, args.db) as catalog:
+        if args.command == "build":
+            scanned = catalog.update()
+            print(f"{scanned} files scanned: {catalog.db_path}")
+        else:
+            bbox = tuple(float(v) for v in args.bbox.split(",")) if args.bbox else None
+            types = args.types.split(",") if args.types else None
+            for entry in catalog.query(bbox, types):  # type: ignore
+                lods = ",".join(str(lod) for lod in entry.lods)
+                print(
+                    f"{entry.path}\t{entry.feature_type}\t{entry.feature_count}\t"
+                    f"i-UR {entry.iur_version}\tLOD {lods}"
+                )
+
+
+if __name__ == "__main__":
+    main()
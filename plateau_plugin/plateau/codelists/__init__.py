@@ -6,23 +6,89 @@
 from __future__ import annotations
 
 import json
+import threading
 from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping
 
 import lxml.etree as et
 
 from ..namespaces import BASE_NS as _NS
+from ..profiling import NULL_PROFILER, Profiler
+from ..sources import join_source, open_xml
+
+
+class PredefinedCodelists:
+    """事前定義されたコードリスト (codelists.json) をプロセス全体で共有するレジストリ
+
+    JSON全体を一度に展開せず、コードリスト名ごとに必要になった時点で読み込む。
+    読み込んだコードリストは変更不可として全ての CodelistStore から共有される。
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._source: bytes | None = None
+        self._whole: dict[str, Any] | None = None
+        self._loaded: dict[str, Mapping[str, str]] = {}
+
+    @property
+    def path(self) -> Path:
+        """codelists.json のパス"""
+        return self._path
+
+    def get(self, name: str) -> Mapping[str, str]:
+        """名前を指定してコードリストを取得する"""
+        if (codelist := self._loaded.get(name)) is not None:
+            return codelist
+
+        with self._lock:
+            if (codelist := self._loaded.get(name)) is None:
+                codelist = MappingProxyType(self._decode(name))
+                self._loaded[name] = codelist
+        return codelist
+
+    def _decode(self, name: str) -> dict[str, str]:
+        if self._source is None:
+            self._source = self._path.read_bytes()
+        source = self._source
+
+        # codelists.json はトップレベルのキーが2スペースで字下げされた整形済みの JSON なので
+        # 該当するオブジェクトの範囲だけを切り出してデコードする
+        key = b"\n  " + json.dumps(name).encode("ascii") + b": {"
+        if (start := source.find(key)) >= 0:
+            start += len(key) - 1
+            if (end := source.find(b"\n  }", start)) >= 0:
+                return json.loads(source[start : end + 4])
+
+        # 想定と異なる整形の場合は全体をデコードする
+        if self._whole is None:
+            self._whole = json.loads(source)
+        return self._whole[name]
+
+
+PREDEFINED_CODELISTS = PredefinedCodelists(
+    (Path(__file__).parent / "codelists.json").resolve()
+)
+"""プロセス全体で共有される事前定義コードリスト"""
 
 
 class CodelistStore:
-    """事前定義されたコードリストまたは頒布データの ./codelists/ ディレクトリからコードを検索する"""
+    """事前定義されたコードリストまたは頒布データの ./codelists/ ディレクトリからコードを検索する
 
-    def __init__(self, base_path: Path) -> None:
-        self._base_path = base_path
+    base_path は CityGML ファイルのあるディレクトリ。zip:// 形式の場合は同じアーカイブ内のコードリストを読む。
+    """
+
+    def __init__(
+        self, base_path: Path | str, profiler: Profiler = NULL_PROFILER
+    ) -> None:
+        self._base_path = str(base_path)
         self._cached: dict[str, dict[str, str] | None] = {}
-        self._predefined: dict[str, dict[str, str]] = {}
+        self._profiler = profiler
 
     def lookup(self, predefined_name: str | None, path: str | None, code: str) -> str:
         """事前定義されたコードリストまたは ./codelists/ ディレクトリ内のコードリストからコードを検索する"""
+        self._profiler.count("codelist", "lookups")
 
         # キャッシュされたコードリストがあればそこから取得する
         if path in self._cached:
@@ -45,10 +111,17 @@ class CodelistStore:
 
     def _load_dictionary(self, predefined: dict[str, str], path: str) -> dict[str, str]:
         """コードリスト (XML) を読み込む"""
+        with self._profiler.stage("codelist_load"):
+            return self._parse_dictionary(predefined, path)
+
+    def _parse_dictionary(
+        self, predefined: dict[str, str], path: str
+    ) -> dict[str, str]:
         try:
-            path_to_codes = (self._base_path / path).resolve()
-            doc = et.parse(str(path_to_codes), None)
-        except OSError:
+            with open_xml(join_source(self._base_path, path)) as src:
+                doc = et.parse(src, None)
+        except (OSError, KeyError):
+            # KeyError: アーカイブ内にファイルがない
             self._cached[str(path)] = predefined
             return predefined
         else:
@@ -63,10 +136,6 @@ class CodelistStore:
             self._cached[str(path)] = dictionary
             return dictionary
 
-    def get_predefined(self, name: str) -> dict[str, str]:
+    def get_predefined(self, name: str) -> Mapping[str, str]:
         """事前定義されたコードリスト一覧からコードリストを取得する"""
-        if not self._predefined:
-            with open((Path(__file__).parent / "codelists.json").resolve()) as f:
-                self._predefined = json.load(f)
-
-        return self._predefined[name]
+        return PREDEFINED_CODELISTS.get(name)
@@ -3,11 +3,14 @@ from __future__ import annotations
 import re
 from dataclasses import dataclass
 from functools import cached_property
-from typing import Iterable, Iterator, Literal, Sequence
+from typing import TYPE_CHECKING, Iterable, Iterator, Literal, NamedTuple, Sequence
 
 import lxml.etree as et
 
-from ..namespaces import BASE_NS
+from ..namespaces import BASE_NS, Namespace
+
+if TYPE_CHECKING:
+    from ..parse.geometry import GeometryCollector
 
 AttributeDatatype = Literal[
     "string",
@@ -147,6 +150,18 @@ class FeatureProcessingDefinition:
                 for em in self.lod_list
             )
 
+    @cached_property
+    def child_element_paths(self) -> tuple[str, ...]:
+        """子Feature (リスク属性、入れ子属性、DM、部分要素) になりうる要素への element paths"""
+        paths: list[str] = []
+        if self.disaster_risk_attr_conatiner_path:
+            paths.append(self.disaster_risk_attr_conatiner_path + "/*")
+        paths.extend(self.nested_attributes or [])
+        if self.dm_attr_container_path:
+            paths.append(self.dm_attr_container_path + "/*")
+        paths.extend(self.geometries.semantic_parts or [])
+        return tuple(paths)
+
     @cached_property
     def lod_list(self) -> tuple[GeometricAttribute | None, ...]:
         return (
@@ -157,6 +172,220 @@ class FeatureProcessingDefinition:
             self.geometries.lod4,
         )
 
+    @cached_property
+    def _compiled(self) -> dict[tuple[str, str], CompiledProcessor]:
+        return {}
+
+    def compile(self, ns: Namespace) -> CompiledProcessor:
+        """この Processor の element paths を ns の名前空間でコンパイルしたものを返す
+
+        コンパイル結果は i-UR のバージョン (Namespace.key) ごとに保持され、全ての地物・ファイルで使い回される。
+        """
+        if (compiled := self._compiled.get(ns.key)) is None:
+            compiled = self._compiled[ns.key] = CompiledProcessor(self, ns)
+        return compiled
+
+    def __getstate__(self):
+        # コンパイル済みの XPath は pickle できないので送らない
+        state = self.__dict__.copy()
+        state.pop("_compiled", None)
+        return state
+
+    def __reduce_ex__(self, protocol):
+        # 他のプロセスに渡す際は、登録済みの Processor であれば ID だけを送って参照し直す
+        from . import processors
+
+        if processors.get_processor_by_id(self.id) is self:
+            return (_get_registered_processor, (self.id,))
+        return super().__reduce_ex__(protocol)
+
+
+class CompiledPath(NamedTuple):
+    """コンパイル済みの element path"""
+
+    path: str
+    """元の (接頭辞を使った) element path"""
+
+    xpath: et.ETXPath
+
+    child_tag: str | None = None
+    """path が直接の子要素 (./P) を指す場合は、その修飾名"""
+
+    geometry_key: tuple[bool, str, str] | None = None
+    """path が ./P//G または .//P//G の形の場合は (.// かどうか, P, G の修飾名)
+
+    GeometryCollector はこの形の path を部分木の再探索なしに答える。
+    """
+
+    def first(self, elem: et._Element) -> et._Element | None:
+        """最初に見つかった要素を返す (見つからなければ None)"""
+        found = self.xpath(elem)
+        return found[0] if found else None
+
+
+class CompiledGeometricAttribute(NamedTuple):
+    lod_detection: tuple[CompiledPath, ...]
+    collect_all: tuple[CompiledPath, ...]
+    only_direct: tuple[CompiledPath, ...] | None
+
+
+class CompiledAttributeGroup(NamedTuple):
+    base_element: CompiledPath | None
+    attributes: tuple[tuple[Attribute, CompiledPath], ...]
+    children: dict[str, tuple[int, ...]]
+    """直接の子要素の修飾名 (Clark 表記) -> その要素から読む属性の attributes 内の位置"""
+    nested: tuple[tuple[int, CompiledPath], ...]
+    """直接の子要素ではない (孫以下の要素を指す) 属性の位置と path"""
+    lists: tuple[int, ...]
+    """値が無くても空のリストを出力する ([]string, []double の) 属性の位置"""
+
+    def match(self, base_elem: et._Element) -> dict[int, list[et._Element]]:
+        """基底要素の子要素を1回だけ走査し、属性の位置 -> 該当する要素 (文書順) を返す"""
+        found: dict[int, list[et._Element]] = {}
+        children = self.children
+        for child_elem in base_elem:
+            if (indices := children.get(child_elem.tag)) is not None:
+                for i in indices:
+                    if (elems := found.get(i)) is None:
+                        found[i] = [child_elem]
+                    else:
+                        elems.append(child_elem)
+        for i, path in self.nested:
+            if elems := path.xpath(base_elem):
+                found[i] = elems
+        for i in self.lists:
+            found.setdefault(i, [])
+        return found
+
+
+_DIRECT_CHILD = re.compile(r"(?:\./)?(\{[^}]*\}[^/\[\]]+)")
+_GEOMETRY_PATH = re.compile(r"\.(/?)/(\{[^}]*\}[^/\[\]*]+)//(\{[^}]*\}[^/\[\]*]+)")
+_LIST_DATATYPES = frozenset({"[]string", "[]double"})
+
+
+def _compile_path(path: str, ns: Namespace) -> CompiledPath:
+    qualified = ns.to_qualified_path(path)
+    child_tag = m.group(1) if (m := _DIRECT_CHILD.fullmatch(qualified)) else None
+    geometry_key = None
+    if m := _GEOMETRY_PATH.fullmatch(qualified):
+        geometry_key = (bool(m.group(1)), m.group(2), m.group(3))
+    return CompiledPath(path, et.ETXPath(qualified), child_tag, geometry_key)
+
+
+def _compile_attribute_group(
+    group: AttributeGroup, ns: Namespace
+) -> CompiledAttributeGroup:
+    """属性グループを、基底要素の子要素を1回だけ走査して読めるようにまとめる"""
+    attributes = tuple(
+        (attr, _compile_path(attr.path, ns)) for attr in group.attributes
+    )
+    children: dict[str, list[int]] = {}
+    nested: list[tuple[int, CompiledPath]] = []
+    for i, (_, path) in enumerate(attributes):
+        if path.child_tag is not None:
+            children.setdefault(path.child_tag, []).append(i)
+        else:
+            nested.append((i, path))
+    return CompiledAttributeGroup(
+        base_element=_compile_path(group.base_element, ns)
+        if group.base_element is not None
+        else None,
+        attributes=attributes,
+        children={tag: tuple(indices) for tag, indices in children.items()},
+        nested=tuple(nested),
+        lists=tuple(
+            i
+            for i, (attr, _) in enumerate(attributes)
+            if attr.datatype in _LIST_DATATYPES
+        ),
+    )
+
+
+class CompiledProcessor:
+    """ある名前空間の対応のもとで FeatureProcessingDefinition の element paths をコンパイルしたもの
+
+    lxml の find/iterfind は呼び出しのたびに path と nsmap を解釈し直すため、
+    繰り返し使う path は ETXPath にコンパイルしておく。
+    """
+
+    def __init__(self, processor: FeatureProcessingDefinition, ns: Namespace) -> None:
+        def compile_path(path: str) -> CompiledPath:
+            return _compile_path(path, ns)
+
+        def compile_geometric(
+            attr: GeometricAttribute | None,
+        ) -> CompiledGeometricAttribute | None:
+            if attr is None:
+                return None
+            return CompiledGeometricAttribute(
+                lod_detection=tuple(compile_path(p) for p in attr.lod_detection),
+                collect_all=tuple(compile_path(p) for p in attr.collect_all),
+                only_direct=tuple(compile_path(p) for p in attr.only_direct)
+                if attr.only_direct
+                else None,
+            )
+
+        geometries = processor.geometries
+        self.attribute_groups = tuple(
+            _compile_attribute_group(group, ns) for group in processor.attribute_groups
+        )
+        self.lod_list = tuple(compile_geometric(g) for g in processor.lod_list)
+        self.lod_n = compile_path(geometries.lod_n) if geometries.lod_n else None
+        self.lod_n_paths = compile_geometric(geometries.lod_n_paths)
+
+        self.disaster_risk_children = (
+            compile_path(processor.disaster_risk_attr_conatiner_path + "/*")
+            if processor.disaster_risk_attr_conatiner_path
+            else None
+        )
+        self.nested_attributes = tuple(
+            compile_path(p) for p in processor.nested_attributes or []
+        )
+        self.dm_children = (
+            compile_path(processor.dm_attr_container_path + "/*")
+            if processor.dm_attr_container_path
+            else None
+        )
+        self.semantic_parts = tuple(
+            compile_path(p) for p in geometries.semantic_parts or []
+        )
+
+        # GeometryCollector が集める、プロパティ要素の名前 -> ジオメトリ要素の名前
+        geometry_tags: dict[str, dict[str, None]] = {}
+        for attr in (*self.lod_list, self.lod_n_paths):
+            if attr is None:
+                continue
+            for path in (*attr.collect_all, *(attr.only_direct or ())):
+                if path.geometry_key is not None:
+                    (_, prop_tag, geom_tag) = path.geometry_key
+                    geometry_tags.setdefault(prop_tag, {})[geom_tag] = None
+        self.geometry_tags = {
+            prop_tag: tuple(geom_tags) for prop_tag, geom_tags in geometry_tags.items()
+        }
+
+    def detect_lods(self, geometries: GeometryCollector) -> tuple[bool, ...]:
+        """どの LoD が存在するかを返す (FeatureProcessingDefinition.detect_lods と同じ)"""
+        if self.lod_n is not None:
+            # dem では <lod>1</lod> のスタイルでLODが記述されている
+            lod = int(self.lod_n.first(geometries.element).text)  # type: ignore
+            return tuple(lod == i for i in range(5))
+        return tuple(
+            bool(em and any(geometries.exists(p) for p in em.lod_detection))
+            for em in self.lod_list
+        )
+
+
+_BASE_NAMESPACE = Namespace.from_document_nsmap({})
+"""登録時のタグ名の変換に使う対応 (i-UR 3.0 の文書と同じインスタンスで、変換結果を共有する)"""
+
+
+def _get_registered_processor(processor_id: str) -> FeatureProcessingDefinition:
+    from . import processors
+
+    processor = processors.get_processor_by_id(processor_id)
+    assert processor is not None, f"Processor {processor_id} is not registered"
+    return processor
+
 
 class ProcessorRegistory:
     """Feature を処理する Processors を登録しておくレジストリ"""
@@ -166,6 +395,7 @@ class ProcessorRegistory:
     ) -> None:
         self._tag_map: dict[str, FeatureProcessingDefinition] = {}
         self._id_map: dict[str, FeatureProcessingDefinition] = {}
+        self._reachable: dict[str, frozenset[str]] = {}
         if processors:
             for processor in processors:
                 self.register_processor(processor)
@@ -193,14 +423,13 @@ class ProcessorRegistory:
         )
 
         self._id_map[processor.id] = processor
+        self._reachable.clear()
         closed_target = set()
         for prefixed_name in self._make_prefix_variants(processor.target_elements):
             assert prefixed_name not in closed_target
             closed_target.add(prefixed_name)
 
-            qualified_name = re.sub(
-                r"^(.+?):()", lambda m: "{" + BASE_NS[m.group(1)] + "}", prefixed_name
-            )
+            qualified_name = _BASE_NAMESPACE.to_qualified_name(prefixed_name)
             assert prefixed_name not in self._tag_map
             self._tag_map[prefixed_name] = processor
             assert qualified_name not in self._tag_map
@@ -212,6 +441,52 @@ class ProcessorRegistory:
         """XMLの要素名をもとに Processor を取得する"""
         return self._tag_map.get(target_tag)
 
+    def get_processor_by_id(
+        self, processor_id: str
+    ) -> FeatureProcessingDefinition | None:
+        """ID をもとに Processor を取得する"""
+        return self._id_map.get(processor_id)
+
+    def __iter__(self) -> Iterator[FeatureProcessingDefinition]:
+        """登録されている Processor を登録順に返す"""
+        return iter(self._id_map.values())
+
+    def _child_processor_ids(self, processor: FeatureProcessingDefinition) -> set[str]:
+        """子Featureとして直接現れうる Processor の ID を返す"""
+        ids: set[str] = set()
+        for path in processor.child_element_paths:
+            container, target = path.rsplit("/", 1)
+            if target == "*":
+                # 包含する要素と同じ名前空間の要素が現れうる
+                # (e.g. uro:bldgDisasterRiskAttribute/* → uro:BuildingRiverFloodingRiskAttribute)
+                prefix = container.rsplit("/", 1)[-1].split(":", 1)[0]
+                ids.update(
+                    p.id
+                    for p in self._id_map.values()
+                    if any(t.startswith(prefix + ":") for t in p.target_elements)
+                )
+                continue
+            for prefixed in self._make_prefix_variants([target]):
+                if (child := self._tag_map.get(prefixed)) is not None:
+                    ids.add(child.id)
+        return ids
+
+    def get_reachable_processor_ids(self, processor_id: str) -> frozenset[str]:
+        """ある Processor の要素の子孫として現れうる Processor の ID を返す (自身は含まない)"""
+        if (reachable := self._reachable.get(processor_id)) is not None:
+            return reachable
+
+        found: set[str] = set()
+        stack = [processor_id]
+        while stack:
+            for child_id in self._child_processor_ids(self._id_map[stack.pop()]):
+                if child_id not in found:
+                    found.add(child_id)
+                    stack.append(child_id)
+        found.discard(processor_id)
+        reachable = self._reachable[processor_id] = frozenset(found)
+        return reachable
+
     def validate_processors(self) -> None:  # noqa: C901
         """Processor の定義を検証する処理 (テスト用)"""
         from pathlib import Path
@@ -4,6 +4,16 @@ from __future__ import annotations
 
 import re
 
+_PREFIXED_STEP = re.compile(r"([A-Za-z_][\w.\-]*):(?=[A-Za-z_*])")
+_PREFIX = re.compile(r"^(.+?):()")
+_QUALIFIER = re.compile(r"^{([^}]+)}")
+
+_NAME_MEMO_LIMIT = 4096
+"""タグ名の変換結果を覚えておく最大の数 (未知のタグが大量にある文書でも際限なく増えないように)"""
+
+_shared_namespaces: dict[tuple[str, str], Namespace] = {}
+"""Namespace.from_document_nsmap が返す、(uro, urf の名前空間) -> Namespace"""
+
 BASE_NS = {
     # GML
     "gml": "http://www.opengis.net/gml",
@@ -43,6 +53,13 @@ class Namespace:
     def __init__(self, update: dict) -> None:
         self.nsmap: dict[str, str] = dict(**BASE_NS, **update)
         self.inverted = {v: k for k, v in self.nsmap.items()}
+        self.key: tuple[str, str] = (
+            self.nsmap.get("uro", ""),
+            self.nsmap.get("urf", ""),
+        )
+        """uro, urf 接頭辞が指す名前空間の組 (これが同じ Namespace は同じ対応をもつ)"""
+        self._qualified_names: dict[str, str] = {}
+        self._prefixed_names: dict[str, str] = {}
 
     @classmethod
     def from_document_nsmap(
@@ -50,7 +67,8 @@ class Namespace:
     ) -> Namespace:
         """XML文書をもとに、接頭辞と名前空間の対応を作成する
 
-        特に、与えられた文書において uro および urf 接頭辞が指すべきXML名前空間を特定する
+        特に、与えられた文書において uro および urf 接頭辞が指すべきXML名前空間を特定する。
+        uro, urf の名前空間の組 (key) が同じであれば、同じインスタンスを返す。
         """
         _ns_update = {}
         for ns in src_nsmap.values():
@@ -73,22 +91,43 @@ class Namespace:
 
         _ns_update.setdefault("uro", "https://www.geospatial.jp/iur/uro/3.0")
         _ns_update.setdefault("urf", "https://www.geospatial.jp/iur/urf/3.0")
-        return cls(_ns_update)
+
+        # 同じ対応の Namespace を使い回し、タグ名の変換結果をファイル間で共有する
+        key = (_ns_update["uro"], _ns_update["urf"])
+        if (ns := _shared_namespaces.get(key)) is None or type(ns) is not cls:
+            ns = _shared_namespaces[key] = cls(_ns_update)
+        return ns
 
     def to_qualified_name(self, prefixed_name: str) -> str:
         """接頭辞を使ったタグ名を、名前空間を使ったタグ名に変換する
 
         gml:Polygon -> {http://www.opengis.net/gml}Polygon
         """
-        return re.sub(
-            r"^(.+?):()", lambda m: "{" + self.nsmap[m.group(1)] + "}", prefixed_name
-        )
+        if (name := self._qualified_names.get(prefixed_name)) is None:
+            name = _PREFIX.sub(
+                lambda m: "{" + self.nsmap[m.group(1)] + "}", prefixed_name
+            )
+            if len(self._qualified_names) < _NAME_MEMO_LIMIT:
+                self._qualified_names[prefixed_name] = name
+        return name
+
+    def to_qualified_path(self, path: str) -> str:
+        """接頭辞を使った element path を、名前空間を使った element path に変換する
+
+        ./uro:buildingIDAttribute/uro:BuildingIDAttribute
+        -> ./{https://www.geospatial.jp/iur/uro/3.0}buildingIDAttribute/{...}BuildingIDAttribute
+        """
+        return _PREFIXED_STEP.sub(lambda m: "{" + self.nsmap[m.group(1)] + "}", path)
 
     def to_prefixed_name(self, qualified_name: str) -> str:
         """名前空間を使ったタグ名を、接頭辞を使ったタグ名に変換する
 
         {http://www.opengis.net/gml}Polygon -> gml:Polygon
         """
-        return re.sub(
-            r"^{([^}]+)}", lambda m: f"{self.inverted[m.group(1)]}:", qualified_name
-        )
+        if (name := self._prefixed_names.get(qualified_name)) is None:
+            name = _QUALIFIER.sub(
+                lambda m: f"{self.inverted[m.group(1)]}:", qualified_name
+            )
+            if len(self._prefixed_names) < _NAME_MEMO_LIMIT:
+                self._prefixed_names[qualified_name] = name
+        return name
@@ -1,3 +1,9 @@
 from .parser import CityObjectParser, ParserSettings, PlateauCityGmlParser
+from .tabular import iter_attribute_rows
 
-__all__ = ["CityObjectParser", "ParserSettings", "PlateauCityGmlParser"]
+__all__ = [
+    "CityObjectParser",
+    "ParserSettings",
+    "PlateauCityGmlParser",
+    "iter_attribute_rows",
+]
@@ -1,69 +1,392 @@
-from typing import Iterable
+from __future__ import annotations
+
+import abc
+import mmap
+import os
+import re
+from typing import Iterable, Iterator, Mapping, Sequence
 
 import lxml.etree as et
 import numpy as np
 
 from ..namespaces import BASE_NS as _NS
+from ..sources import split_zip_source
 from ..types import Appearance, Material, Texture
+from .index import _map_source, _prefix_of, _read_prologue
+
+_GML_ID = "{" + _NS["gml"] + "}id"
+_POLYGON_TAGS = ("{" + _NS["gml"] + "}Polygon", "{" + _NS["gml"] + "}Triangle")
+_COMPOSITE_SURFACE = "{" + _NS["gml"] + "}CompositeSurface"
+_RING_ATTR = re.compile(rb"\sring\s*=\s*([\"'])#(.*?)\1")
+_SURFACE_TAGS = tuple(
+    "{" + _NS["gml"] + "}" + name
+    for name in (
+        "MultiSurface",
+        "CompositeSurface",
+        "Shell",
+        "OrientableSurface",
+        "TriangulatedSurface",
+        "Tin",
+        "Solid",
+    )
+)
+"""ポリゴンを (孫要素として) 構成する面"""
 
 
-def parse_appearances(doc: et._Element) -> Iterable[Appearance]:  # noqa: C901
+def parse_appearances(doc: et._Element) -> Iterable[Appearance]:
+    """文書に含まれる Appearance を読み込む
+
+    ポリゴンごとのマテリアルは文書全体から1回だけ解決しておく (Appearance.polygon_to_material)。
+    """
     for appearance in doc.iterfind(".//app:appearanceMember/app:Appearance", _NS):
-        target_to_material: dict[str, int] = {}
-        ring_to_texture: dict[str, tuple[int, np.ndarray]] = {}
+        app = _parse_appearance(appearance)
+        app.polygon_to_material = resolve_polygon_materials(doc, app.target_to_material)
+        yield app
 
-        materials: list[Material] = []
-        for material in appearance.iterfind(
-            ".//app:surfaceDataMember/app:X3DMaterial", _NS
-        ):
-            m = Material()
-            if (diffuse := material.find("./app:diffuseColor", _NS)) is not None:
-                v = tuple(float(v) for v in diffuse.text.split())
-                assert len(v) == 3
-                m.diffuse_color = v
-            if (specular := material.find("./app:specularColor", _NS)) is not None:
-                v = tuple(float(v) for v in specular.text.split())
-                assert len(v) == 3
-                m.specular_color = v
-            if (emissive := material.find("./app:emissiveColor", _NS)) is not None:
-                v = tuple(float(v) for v in emissive.text.split())
-                assert len(v) == 3
-                m.specular_color = v
-            if (shininess := material.find("./app:shininess", _NS)) is not None:
-                m.shininess = float(shininess.text)
-            if (transparency := material.find("./app:transparency", _NS)) is not None:
-                m.transparency = float(transparency.text)
-            if (
-                ambient_intensity := material.find("./app:ambientIntensity", _NS)
-            ) is not None:
-                m.ambient_intensity = float(ambient_intensity.text)
-
-            materials.append(m)
-            idx = len(materials) - 1
-            for target in material.iterfind("./app:target", _NS):
-                assert target.text.startswith("#")
-                target_id = target.text[1:]
-                target_to_material[target_id] = idx
-
-        textures: list[Texture] = []
-        for texture in appearance.iterfind(
-            ".//app:surfaceDataMember/app:ParameterizedTexture", _NS
+
+def scan_appearances(filename: str) -> Iterable[Appearance]:
+    """文書全体をパースせずに app:appearanceMember を探して Appearance を読み込む
+
+    ファイルをバイト列として走査して app:appearanceMember 要素の範囲を探し、その部分だけをパースする。
+    app 名前空間がルート要素で宣言されていない文書からは何も読まない。
+    コメントや CDATA セクションの中に現れるタグは考慮しない。
+    """
+    with _map_source(filename) as data:
+        (prologue, root_end, root) = _read_prologue(data, filename)
+        try:
+            app_prefix = _prefix_of(root.nsmap, _NS["app"])
+        except ValueError:
+            return
+        member_start = re.compile(
+            rb"<" + re.escape(app_prefix) + rb"appearanceMember(?=[\s>])[^>]*(?<!/)>"
+        )
+        member_end = b"</" + app_prefix + b"appearanceMember>"
+        ordinal = 0
+        pos = len(prologue)
+        while (m := member_start.search(data, pos)) is not None:
+            if (end := data.find(member_end, m.end())) < 0:
+                break
+            pos = end + len(member_end)
+            doc = et.fromstring(prologue + data[m.start() : pos] + root_end)
+            for appearance in doc.iterfind(
+                "./app:appearanceMember/app:Appearance", _NS
+            ):
+                app = _parse_appearance(appearance)
+                if split_zip_source(filename) is None:
+                    # 要素を保持し続けないよう、UV座標はファイル中の位置から読む
+                    app.ring_to_texture = _map_ring_textures(
+                        filename, appearance.prefix, ordinal, app.ring_to_texture
+                    )
+                ordinal += 1
+                yield app
+
+
+def lookup_material(
+    polygon: et._Element, target_to_material: dict[str, int]
+) -> int | None:
+    """ポリゴンのマテリアルを、ポリゴン自身、それを含む面、その面を含む CompositeSurface の順に探す"""
+    if (poly_id := polygon.get(_GML_ID)) and (
+        m := target_to_material.get(poly_id)
+    ) is not None:
+        return m
+    sur = polygon.getparent().getparent()  # type: ignore
+    if (sur_id := sur.get(_GML_ID)) and (
+        m := target_to_material.get(sur_id)
+    ) is not None:
+        return m
+    if sur.tag == _COMPOSITE_SURFACE:
+        sur2 = sur.getparent().getparent()  # type: ignore
+        if (sur2_id := sur2.get(_GML_ID)) and (
+            m := target_to_material.get(sur2_id)
+        ) is not None:
+            return m
+    return None
+
+
+def resolve_polygon_materials(
+    doc: et._Element, target_to_material: dict[str, int]
+) -> dict[str, int]:
+    """gml:id をもつポリゴンについて、マテリアルを解決した索引を作る (lookup_material と同じ優先順)
+
+    ポリゴンごとに祖先をたどる代わりに、マテリアルが指定された面 (MultiSurface, CompositeSurface など) から
+    その構成ポリゴンへ、さらに CompositeSurface を含む面からその構成ポリゴンへ、指定を伝播させる。
+    """
+    if not target_to_material:
+        return {}
+
+    # ポリゴン自身への指定はそのまま使う (ポリゴン以外の id が混ざっても、ポリゴンの id でしか引かない)
+    return resolve_surface_materials(doc, target_to_material) | target_to_material
+
+
+def resolve_surface_materials(
+    elem: et._Element, target_to_material: dict[str, int]
+) -> dict[str, int]:
+    """要素の部分木について、面への指定をその構成ポリゴンへ伝播させた索引を作る
+
+    ポリゴン自身への指定は含まないので、target_to_material を先に引いてから使う。
+    文書全体を読み込まない場合に、トップレベルの都市オブジェクトごとに使う。
+    """
+    if not target_to_material:
+        return {}
+
+    # 面への指定 (優先度: CompositeSurface を含む面 < 面)
+    from_outer: dict[str, int] = {}
+    from_surface: dict[str, int] = {}
+    for sur in elem.iter(*_SURFACE_TAGS):
+        if (
+            not (sur_id := sur.get(_GML_ID))
+            or (m := target_to_material.get(sur_id)) is None
         ):
-            image_uri = texture.find("./app:imageURI", _NS).text
-            t = Texture(image_uri=image_uri)
-            textures.append(t)
-            idx = len(textures) - 1
-            for target in texture.iterfind("./app:target", _NS):
-                coords = target.find(".//app:textureCoordinates", _NS)
-                ring_id = coords.get("ring")
-                assert ring_id.startswith("#")
-                ring_id = ring_id[1:]
-                uv = np.fromstring(coords.text, dtype=np.float32, sep=" ")
-                ring_to_texture[ring_id] = (idx, uv.reshape(-1, 2))
-
-        yield Appearance(
-            materials=materials,
-            textures=textures,
-            target_to_material=target_to_material,
-            ring_to_texture=ring_to_texture,
+            continue
+        for poly_id, via_composite in _member_polygon_ids(sur):
+            (from_outer if via_composite else from_surface)[poly_id] = m
+    return from_outer | from_surface
+
+
+def _member_polygon_ids(sur: et._Element) -> Iterator[tuple[str, bool]]:
+    """面を構成するポリゴン (孫要素) と、面が含む CompositeSurface を構成するポリゴンの gml:id を返す
+
+    後者の場合は (gml:id, True) を返す。
+    """
+    for member in sur:
+        for child in member:
+            if child.tag in _POLYGON_TAGS:
+                if poly_id := child.get(_GML_ID):
+                    yield (poly_id, False)
+            elif child.tag == _COMPOSITE_SURFACE:
+                for member2 in child:
+                    for polygon in member2:
+                        if polygon.tag in _POLYGON_TAGS and (
+                            poly_id := polygon.get(_GML_ID)
+                        ):
+                            yield (poly_id, True)
+
+
+def _parse_appearance(appearance: et._Element) -> Appearance:  # noqa: C901
+    target_to_material: dict[str, int] = {}
+
+    materials: list[Material] = []
+    for material in appearance.iterfind(
+        ".//app:surfaceDataMember/app:X3DMaterial", _NS
+    ):
+        m = Material()
+        if (diffuse := material.find("./app:diffuseColor", _NS)) is not None:
+            v = tuple(float(v) for v in diffuse.text.split())
+            assert len(v) == 3
+            m.diffuse_color = v
+        if (specular := material.find("./app:specularColor", _NS)) is not None:
+            v = tuple(float(v) for v in specular.text.split())
+            assert len(v) == 3
+            m.specular_color = v
+        if (emissive := material.find("./app:emissiveColor", _NS)) is not None:
+            v = tuple(float(v) for v in emissive.text.split())
+            assert len(v) == 3
+            m.specular_color = v
+        if (shininess := material.find("./app:shininess", _NS)) is not None:
+            m.shininess = float(shininess.text)
+        if (transparency := material.find("./app:transparency", _NS)) is not None:
+            m.transparency = float(transparency.text)
+        if (
+            ambient_intensity := material.find("./app:ambientIntensity", _NS)
+        ) is not None:
+            m.ambient_intensity = float(ambient_intensity.text)
+
+        materials.append(m)
+        idx = len(materials) - 1
+        for target in material.iterfind("./app:target", _NS):
+            assert target.text.startswith("#")
+            target_id = target.text[1:]
+            target_to_material[target_id] = idx
+
+    textures: list[Texture] = []
+    ring_rows: dict[str, int] = {}
+    ring_textures: list[int] = []
+    ring_coords: list[et._Element] = []
+    for texture in appearance.iterfind(
+        ".//app:surfaceDataMember/app:ParameterizedTexture", _NS
+    ):
+        image_uri = texture.find("./app:imageURI", _NS).text
+        t = Texture(image_uri=image_uri)
+        textures.append(t)
+        idx = len(textures) - 1
+        for target in texture.iterfind("./app:target", _NS):
+            coords = target.find(".//app:textureCoordinates", _NS)
+            ring_id = coords.get("ring")
+            assert ring_id.startswith("#")
+            ring_id = ring_id[1:]
+            ring_rows[ring_id] = len(ring_coords)
+            ring_textures.append(idx)
+            ring_coords.append(coords)
+
+    return Appearance(
+        materials=materials,
+        textures=textures,
+        target_to_material=target_to_material,
+        ring_to_texture=_ElementRingTextures(
+            ring_rows, np.array(ring_textures, dtype=np.int32), ring_coords
+        ),
+    )
+
+
+class RingTextures(Mapping[str, tuple[int, np.ndarray]], abc.ABC):
+    """リングの gml:id -> (テクスチャの番号, UV座標) の対応
+
+    UV座標は読み込み元での位置 (要素またはバイト範囲) だけを記録しておき、引かれた時点で復号する。
+    範囲や種類で絞り込んで読む場合に出力しないリングの分を復号せずに済み、
+    テクスチャ付きの LOD3 のタイルのように UV座標が大きい場合にもメモリを節約できる。
+    復号した UV座標は保持しないので、引いた側 (ジオメトリ) が手放せば解放される。
+
+    読み込み元のファイルを開いている場合があるので、使い終えたら close を呼ぶ (with 文でもよい)。
+    close した後に引かれた場合は開き直す。
+    """
+
+    def __init__(self, rows: dict[str, int], textures: np.ndarray) -> None:
+        self._rows = rows
+        self._textures = textures
+
+    def __enter__(self) -> RingTextures:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """読み込み元のために開いているものがあれば閉じる"""
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __getitem__(self, ring_id: str) -> tuple[int, np.ndarray]:
+        row = self._rows[ring_id]
+        return (int(self._textures[row]), self._decode(row))
+
+    @abc.abstractmethod
+    def _decode(self, row: int) -> np.ndarray:
+        """row 番目のリングの UV座標を復号する"""
+
+
+class _ElementRingTextures(RingTextures):
+    """文書中の app:textureCoordinates 要素 (またはそのテキスト) から UV座標を復号する"""
+
+    def __init__(
+        self,
+        rows: dict[str, int],
+        textures: np.ndarray,
+        coords: Sequence[et._Element | str],
+    ) -> None:
+        super().__init__(rows, textures)
+        self._coords = coords
+
+    def _decode(self, row: int) -> np.ndarray:
+        src = self._coords[row]
+        text = src if isinstance(src, str) else src.text
+        return np.fromstring(text, dtype=np.float32, sep=" ").reshape(-1, 2)
+
+    def __reduce__(self):
+        # 要素は pickle できないので、ワーカープロセスにはテキストとして渡す
+        texts = [src if isinstance(src, str) else src.text for src in self._coords]
+        return (_ElementRingTextures, (self._rows, self._textures, texts))
+
+
+class _MappedRingTextures(RingTextures):
+    """読み込み元のファイル中のバイト範囲から UV座標を復号する"""
+
+    def __init__(
+        self,
+        rows: dict[str, int],
+        textures: np.ndarray,
+        spans: np.ndarray,
+        filename: str,
+    ) -> None:
+        super().__init__(rows, textures)
+        self._spans = spans
+        self._filename = filename
+        self._data: mmap.mmap | None = None
+
+    def _decode(self, row: int) -> np.ndarray:
+        if self._data is None:
+            with open(self._filename, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (start, end) = self._spans[row]
+        text = self._data[start:end]
+        return np.fromstring(text, dtype=np.float32, sep=" ").reshape(-1, 2)
+
+    def close(self) -> None:
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+    def __reduce__(self):
+        return (
+            _MappedRingTextures,
+            (self._rows, self._textures, self._spans, self._filename),
         )
+
+
+def _map_ring_textures(
+    filename: str,
+    prefix: str | None,
+    ordinal: int,
+    ring_textures: RingTextures,
+) -> RingTextures:
+    """ordinal 番目の Appearance の UV座標を、ファイル中のバイト範囲から読む形に置き換える
+
+    ファイルを走査して ordinal 番目の Appearance の各 app:target の最初の app:textureCoordinates の位置を調べる。
+    要素から読んだ対応とリングの並びが一致しない場合は (想定外の書き方の文書なので) 元の対応を返す。
+    """
+    assert isinstance(ring_textures, _ElementRingTextures)
+    coords = ring_textures._coords
+    found = _scan_texture_coordinates(filename, prefix, ordinal)
+    if found is None or len(found) != len(coords):
+        return ring_textures
+    for (ring_id, _, _), elem in zip(found, coords):
+        if "#" + ring_id != elem.get("ring"):  # type: ignore
+            return ring_textures
+    spans = np.array([(start, end) for _, start, end in found], dtype=np.int64)
+    return _MappedRingTextures(
+        ring_textures._rows, ring_textures._textures, spans.reshape(-1, 2), filename
+    )
+
+
+def _scan_texture_coordinates(
+    filename: str, prefix: str | None, ordinal: int
+) -> list[tuple[str, int, int]] | None:
+    """ordinal 番目の Appearance について、(リングの gml:id, テキストの開始位置, 終了位置) を文書順に返す
+
+    app:target の直後の app:textureCoordinates だけを拾う (_parse_appearance と同じく、各 target の最初のもの)。
+    """
+    qname = prefix.encode() + b":" if prefix else b""
+    p = re.escape(qname)
+    appearance_start = re.compile(rb"<" + p + rb"Appearance(?=[\s>])")
+    token = re.compile(rb"<" + p + rb"(target|textureCoordinates)(?=[\s/>])([^>]*)>")
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # app:appearanceMember 以降で ordinal 番目の app:Appearance を探す
+            pos = data.find(b"<" + qname + b"appearanceMember")
+            if pos < 0:
+                return None
+            for _ in range(ordinal + 1):
+                if (m := appearance_start.search(data, pos)) is None:
+                    return None
+                pos = m.end()
+            end = data.find(b"</" + qname + b"Appearance>", pos)
+            if end < 0:
+                return None
+
+            found: list[tuple[str, int, int]] = []
+            after_target = False
+            for m in token.finditer(data, pos, end):
+                if m.group(1) == b"target":
+                    after_target = not m.group(2).endswith(b"/")
+                elif after_target:
+                    if (ring := _RING_ATTR.search(m.group(2))) is None:
+                        return None
+                    text_end = data.find(b"<", m.end())
+                    found.append((ring.group(2).decode(), m.end(), text_end))
+                    after_target = False
+            return found
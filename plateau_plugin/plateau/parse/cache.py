@@ -0,0 +1,583 @@
+"""パース結果のディスクキャッシュ
+
+同じファイルを同じ設定で読み直す際に XML のパースを省略するため、
+パースした CityObject の列をコンパクトなバイナリ形式でディスクに保存しておく。
+
+キャッシュファイルの形式:
+
+- マジックナンバーとヘッダ・各バッファの長さ
+- ヘッダ (JSON): 各 CityObject のレコード、出力の順序、属性名の組のテーブル
+- 座標バッファ (float64, (頂点数, 3))
+- オフセットバッファ (int64): オフセットのほか、ポリゴンごとのマテリアル・テクスチャの番号
+- テクスチャ座標バッファ (float32, (頂点数, 2))
+
+ヘッダは pickle ではなく JSON なので、キャッシュのディレクトリに置かれたファイルを読んでもコードは実行されない。
+キャッシュの容量が上限を超えた場合は、最後に使われた時刻が古いものから削除する (LRU)。
+
+    python -m plateau_plugin.plateau.parse.cache info
+    python -m plateau_plugin.plateau.parse.cache prune --max-size 500M
+    python -m plateau_plugin.plateau.parse.cache clear
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+
+import numpy as np
+
+from ..codelists import PREDEFINED_CODELISTS
+from ..models import processors
+from ..sources import join_source, source_parent, source_stat, split_zip_source
+from ..types import (
+    CityObject,
+    LineStringCollection,
+    PointCollection,
+    PolygonCollection,
+)
+
+if TYPE_CHECKING:
+    from .parser import ParserSettings
+
+_FORMAT_VERSION = 1
+_MAGIC = b"PLTC"
+_PREAMBLE = struct.Struct("<4sIQQQQ")
+"""マジックナンバー、形式のバージョン、ヘッダ・座標・オフセット・テクスチャ座標の各バッファのバイト数"""
+
+_SUFFIX = ".plcache"
+
+DEFAULT_MAX_SIZE = 2 * 1024**3
+"""キャッシュの容量の上限のデフォルト (2GiB)"""
+
+
+def default_cache_dir() -> Path:
+    """キャッシュを置くデフォルトのディレクトリ
+
+    環境変数 PLATEAU_CACHE_DIR で変更できる。
+    """
+    if path := os.environ.get("PLATEAU_CACHE_DIR"):
+        return Path(path)
+    if sys.platform == "win32" and (base := os.environ.get("LOCALAPPDATA")):
+        return Path(base) / "plateau_plugin" / "cache"
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "plateau_plugin"
+
+
+@functools.lru_cache(maxsize=None)
+def _definitions_fingerprint() -> str:
+    """Processor の定義と事前定義コードリストのハッシュ
+
+    プラグインの更新で属性の定義やコードの対応が変わった場合に、古いキャッシュを使わないようにする。
+    """
+    h = hashlib.sha1()
+    for processor in processors:
+        h.update(repr(dataclasses.asdict(processor)).encode("utf-8"))
+    h.update(PREDEFINED_CODELISTS.path.read_bytes())
+    return h.hexdigest()
+
+
+def _directory_signature(path: Path) -> list[tuple[str, int, int]]:
+    """ディレクトリ内のファイルの (名前, サイズ, 更新時刻) の一覧 (ディレクトリがなければ空)"""
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return []
+    signature = []
+    for entry in entries:
+        if entry.is_file():
+            stat = entry.stat()
+            signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return sorted(signature)
+
+
+class ParseCache:
+    """パース結果のディスクキャッシュ
+
+    キャッシュはファイルのパス・サイズ・更新時刻と ParserSettings の組ごとに保存される。
+    Processor の定義・事前定義コードリスト・配布データのコードリスト (codelists/) が変わった場合も別のキャッシュになる。
+    """
+
+    def __init__(self, directory: Path | None = None, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = directory or default_cache_dir()
+        self.max_size = max_size
+        self._codelist_signatures: dict[str, list[tuple[str, int, int]]] = {}
+
+    def _codelist_signature(self, filename: str) -> list[tuple[str, int, int]]:
+        """配布データのコードリスト (udx/<種類>/ から見た ../../codelists/) のファイルの一覧
+
+        zip の場合はアーカイブ自体の更新時刻がキーに含まれるので調べない。
+        """
+        if split_zip_source(filename) is not None:
+            return []
+        directory = join_source(source_parent(filename), "../../codelists")
+        if (signature := self._codelist_signatures.get(directory)) is None:
+            signature = self._codelist_signatures[directory] = _directory_signature(
+                Path(directory)
+            )
+        return signature
+
+    def _key(self, filename: str, settings: ParserSettings) -> str:
+        (identity, size, mtime_ns) = source_stat(filename)
+        settings_items = sorted(
+            (k, v)
+            for k, v in dataclasses.asdict(settings).items()
+            if k != "streaming"  # 結果に影響しない
+        )
+        source = repr(
+            (
+                _FORMAT_VERSION,
+                _definitions_fingerprint(),
+                identity,
+                size,
+                mtime_ns,
+                settings_items,
+                self._codelist_signature(filename),
+            )
+        )
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    def _path(self, filename: str, settings: ParserSettings) -> Path:
+        return self.directory / (self._key(filename, settings) + _SUFFIX)
+
+    def load(self, filename: str, settings: ParserSettings) -> CachedCityObjects | None:
+        """キャッシュされたパース結果を返す (キャッシュがなければ None)
+
+        ジオメトリの配列は読み込んだバッファのビューで、パースした場合と同じく書き換えられる。
+        """
+        path = self._path(filename, settings)
+        try:
+            with open(path, "rb") as f:
+                # bytes ではなく bytearray に読み、np.frombuffer のビューを書き込み可能にする
+                data = bytearray(os.fstat(f.fileno()).st_size)
+                f.readinto(data)
+        except FileNotFoundError:
+            return None
+
+        try:
+            cached = CachedCityObjects(data)
+        except (ValueError, KeyError):
+            # 壊れているか、互換性のないキャッシュ
+            path.unlink(missing_ok=True)
+            return None
+
+        # LRU のために最終使用時刻を更新する
+        os.utime(path)
+        return cached
+
+    def record(
+        self,
+        filename: str,
+        settings: ParserSettings,
+        cityobjs: Iterable[tuple[int, CityObject]],
+    ) -> Iterator[tuple[int, CityObject]]:
+        """cityobjs をそのまま返しつつ、最後まで読み終えたらキャッシュに保存する"""
+        path = self._path(filename, settings)
+        writer = _CacheWriter()
+        for toplevel_count, cityobj in cityobjs:
+            writer.add(toplevel_count, cityobj)
+            yield (toplevel_count, cityobj)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                writer.write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        self.prune()
+
+    def entries(self) -> list[tuple[Path, int, float]]:
+        """キャッシュファイルの (パス, サイズ, 最終使用時刻) を古い順に返す"""
+        if not self.directory.is_dir():
+            return []
+        entries = []
+        for path in self.directory.glob("*" + _SUFFIX):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda e: e[2])
+        return entries
+
+    def prune(self, max_size: int | None = None) -> int:
+        """容量が上限に収まるまで古いキャッシュを削除し、削除したファイルの数を返す"""
+        max_size = self.max_size if max_size is None else max_size
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> int:
+        """全てのキャッシュを削除し、削除したファイルの数を返す"""
+        return self.prune(max_size=0)
+
+
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def _encode_value(value: Any) -> Any:
+    """属性値を JSON で表せる値にする
+
+    日付は {"d": ISO 8601 の文字列}、辞書 (汎用属性) は {"m": [[キー, 値], ...]} とする。
+    ヘッダ中の JSON のオブジェクトはこの2つだけなので、読み込む際に区別できる。
+    """
+    if isinstance(value, _SCALAR_TYPES):
+        return value
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(v) for v in value]
+    if isinstance(value, dict):
+        return {"m": [[k, _encode_value(v)] for k, v in value.items()]}
+    raise TypeError(f"Unsupported attribute value: {type(value)}")
+
+
+def _decode_object(obj: dict[str, Any]) -> Any:
+    """_encode_value で変換した日付と辞書を元に戻す (json.loads の object_hook)"""
+    if len(obj) == 1:
+        if "d" in obj:
+            return date.fromisoformat(obj["d"])
+        if "m" in obj:
+            return dict(obj["m"])
+    return obj
+
+
+class _CacheWriter:
+    """CityObject の列をキャッシュの形式にまとめる"""
+
+    def __init__(self) -> None:
+        self._records: list[tuple] = []
+        self._emissions: list[tuple[int, int]] = []
+        self._key_tables: dict[tuple[str, ...], int] = {}
+        self._toplevel_count = -1
+        self._index_of: dict[int, tuple[int, CityObject]] = {}
+        self._coords: list[np.ndarray] = []
+        self._num_coords = 0
+        self._offsets: list[np.ndarray] = []
+        self._num_offsets = 0
+        self._uvs: list[np.ndarray] = []
+        self._num_uvs = 0
+
+    def _add_coords(self, coords: np.ndarray) -> tuple[int, int]:
+        start = self._num_coords
+        self._coords.append(coords)
+        self._num_coords += len(coords)
+        return (start, self._num_coords)
+
+    def _add_offsets(self, offsets: np.ndarray) -> tuple[int, int]:
+        start = self._num_offsets
+        self._offsets.append(offsets)
+        self._num_offsets += len(offsets)
+        return (start, self._num_offsets)
+
+    def _add_uvs(self, uvs: np.ndarray) -> tuple[int, int]:
+        start = self._num_uvs
+        self._uvs.append(uvs)
+        self._num_uvs += len(uvs)
+        return (start, self._num_uvs)
+
+    def _encode_geometry(self, geom: Any) -> tuple | None:
+        if geom is None:
+            return None
+        if isinstance(geom, PolygonCollection):
+            return (
+                "P",
+                self._add_coords(geom.coords),
+                self._add_offsets(geom.ring_offsets),
+                self._add_offsets(geom.polygon_offsets),
+                None if geom.materials is None else self._add_offsets(geom.materials),
+                None if geom.textures is None else self._add_offsets(geom.textures),
+                None if geom.uvs is None else self._add_uvs(geom.uvs),
+            )
+        if isinstance(geom, LineStringCollection):
+            lengths = [len(line) for line in geom.lines]
+            line_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=line_offsets[1:])
+            coords = np.concatenate(geom.lines) if geom.lines else np.empty((0, 3))
+            return ("L", self._add_coords(coords), self._add_offsets(line_offsets))
+        if isinstance(geom, PointCollection):
+            return ("M", self._add_coords(geom.points))
+        raise NotImplementedError(f"Unsupported geometry type: {type(geom)}")
+
+    def add(self, toplevel_count: int, cityobj: CityObject) -> None:
+        if toplevel_count != self._toplevel_count:
+            # 親子関係はトップレベルの都市オブジェクトをまたがない
+            self._toplevel_count = toplevel_count
+            self._index_of.clear()
+        self._emissions.append((toplevel_count, self._intern(cityobj)))
+
+    def _intern(self, cityobj: CityObject) -> int:
+        """CityObject をレコードとして登録し、その番号を返す
+
+        親は子より先に出力されるとは限らない (出力されないこともある) ため、親を先に登録する。
+        """
+        if (entry := self._index_of.get(id(cityobj))) is not None:
+            return entry[0]
+
+        parent_index = -1
+        if cityobj.parent is not None:
+            parent_index = self._intern(cityobj.parent)
+
+        keys = tuple(cityobj.attributes.keys())
+        if (keys_index := self._key_tables.get(keys)) is None:
+            keys_index = self._key_tables[keys] = len(self._key_tables)
+
+        index = len(self._records)
+        self._index_of[id(cityobj)] = (index, cityobj)
+        self._records.append(
+            (
+                cityobj.lod,
+                cityobj.type,
+                cityobj.id,
+                cityobj.name,
+                cityobj.description,
+                _encode_value(cityobj.creation_date),
+                _encode_value(cityobj.termination_date),
+                cityobj.processor.id,
+                parent_index,
+                keys_index,
+                [
+                    v if isinstance(v, _SCALAR_TYPES) else _encode_value(v)
+                    for v in cityobj.attributes.values()
+                ],
+                self._encode_geometry(cityobj.geometry),
+            )
+        )
+        return index
+
+    def write(self, f) -> None:
+        header = json.dumps(
+            {
+                "key_tables": list(self._key_tables),
+                "records": self._records,
+                "emissions": self._emissions,
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        header += b"\0" * (-len(header) % 8)
+        coords = (
+            np.concatenate(self._coords).astype("<f8", copy=False)
+            if self._coords
+            else np.empty((0, 3), "<f8")
+        )
+        offsets = (
+            np.concatenate(self._offsets).astype("<i8", copy=False)
+            if self._offsets
+            else np.empty(0, "<i8")
+        )
+        uvs = (
+            np.concatenate(self._uvs).astype("<f4", copy=False)
+            if self._uvs
+            else np.empty((0, 2), "<f4")
+        )
+        f.write(
+            _PREAMBLE.pack(
+                _MAGIC,
+                _FORMAT_VERSION,
+                len(header),
+                coords.nbytes,
+                offsets.nbytes,
+                uvs.nbytes,
+            )
+        )
+        f.write(header)
+        f.write(np.ascontiguousarray(coords).tobytes())
+        f.write(np.ascontiguousarray(offsets).tobytes())
+        f.write(np.ascontiguousarray(uvs).tobytes())
+
+
+class CachedCityObjects:
+    """キャッシュから読み込んだパース結果"""
+
+    def __init__(self, data: bytes | bytearray) -> None:
+        if len(data) < _PREAMBLE.size:
+            raise ValueError("Incompatible cache file")
+        (magic, version, header_len, coords_len, offsets_len, uvs_len) = (
+            _PREAMBLE.unpack_from(data)
+        )
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError("Incompatible cache file")
+
+        pos = _PREAMBLE.size
+        header = json.loads(
+            data[pos : pos + header_len].rstrip(b"\0"), object_hook=_decode_object
+        )
+        pos += header_len
+        self._coords = np.frombuffer(data, "<f8", coords_len // 8, pos).reshape(-1, 3)
+        pos += coords_len
+        self._offsets = np.frombuffer(data, "<i8", offsets_len // 8, pos)
+        pos += offsets_len
+        self._uvs = np.frombuffer(data, "<f4", uvs_len // 4, pos).reshape(-1, 2)
+
+        self._key_tables: list[list[str]] = header["key_tables"]
+        self._records: list[list] = header["records"]
+        self._emissions: list[list[int]] = header["emissions"]
+
+        # 定義が変わって存在しなくなった Processor を参照していないか確かめる
+        self._processors = {}
+        for record in self._records:
+            processor_id = record[7]
+            if processor_id not in self._processors:
+                processor = processors.get_processor_by_id(processor_id)
+                if processor is None:
+                    raise KeyError(processor_id)
+                self._processors[processor_id] = processor
+
+    def count_toplevel_cityobjs(self) -> int:
+        """トップレベルの都市オブジェクトの数"""
+        return self._emissions[-1][0] + 1 if self._emissions else 0
+
+    def _decode_geometry(self, geom: tuple | None) -> Any:
+        if geom is None:
+            return None
+        coords = self._coords
+        offsets = self._offsets
+        kind = geom[0]
+        if kind == "P":
+            _, (c0, c1), (r0, r1), (p0, p1), materials, textures, uvs = geom
+            return PolygonCollection(
+                coords=coords[c0:c1],
+                ring_offsets=offsets[r0:r1],
+                polygon_offsets=offsets[p0:p1],
+                materials=None
+                if materials is None
+                else offsets[materials[0] : materials[1]].astype(np.int32),
+                textures=None
+                if textures is None
+                else offsets[textures[0] : textures[1]].astype(np.int32),
+                uvs=None if uvs is None else self._uvs[uvs[0] : uvs[1]],
+            )
+        if kind == "L":
+            _, (c0, c1), (o0, o1) = geom
+            line_coords = coords[c0:c1]
+            line_offsets = offsets[o0:o1].tolist()
+            return LineStringCollection(
+                lines=[line_coords[s:e] for s, e in zip(line_offsets, line_offsets[1:])]
+            )
+        if kind == "M":
+            _, (c0, c1) = geom
+            return PointCollection(points=coords[c0:c1])
+        raise ValueError(f"Unknown geometry kind: {kind}")
+
+    def _build(self, index: int, built: dict[int, CityObject]) -> CityObject:
+        if (cityobj := built.get(index)) is not None:
+            return cityobj
+
+        (
+            lod,
+            type_,
+            id_,
+            name,
+            description,
+            creation_date,
+            termination_date,
+            processor_id,
+            parent_index,
+            keys_index,
+            values,
+            geom,
+        ) = self._records[index]
+        cityobj = built[index] = CityObject(
+            lod=lod,
+            type=type_,
+            id=id_,
+            name=name,
+            description=description,
+            creation_date=creation_date,
+            termination_date=termination_date,
+            attributes=dict(zip(self._key_tables[keys_index], values)),
+            geometry=self._decode_geometry(geom),
+            processor=self._processors[processor_id],
+            parent=self._build(parent_index, built) if parent_index >= 0 else None,
+        )
+        return cityobj
+
+    def __iter__(self) -> Iterator[tuple[int, CityObject]]:
+        built: dict[int, CityObject] = {}
+        current_toplevel = -1
+        for toplevel_count, index in self._emissions:
+            if toplevel_count != current_toplevel:
+                current_toplevel = toplevel_count
+                built.clear()
+            yield (toplevel_count, self._build(index, built))
+
+
+def _parse_size(s: str) -> int:
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3}
+    s = s.strip().upper().removesuffix("B")
+    if s and s[-1] in units:
+        return int(float(s[:-1]) * units[s[-1]])
+    return int(s)
+
+
+def _format_size(n: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def main(argv: list[str] | None = None) -> None:
+    """キャッシュを確認・整理するためのコマンドラインインタフェース"""
+    parser = argparse.ArgumentParser(
+        prog="python -m plateau_plugin.plateau.parse.cache",
+        description="PLATEAU パース結果のキャッシュを確認・整理する",
+    )
+    parser.add_argument(
+        "--dir", type=Path, default=None, help="キャッシュのディレクトリ"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("info", help="キャッシュの一覧と合計サイズを表示する")
+    prune_parser = subparsers.add_parser(
+        "prune", help="容量が上限に収まるまで古いキャッシュを削除する"
+    )
+    prune_parser.add_argument(
+        "--max-size",
+        type=_parse_size,
+        default=DEFAULT_MAX_SIZE,
+        help="容量の上限 (例: 500M, 2G)",
+    )
+    subparsers.add_parser("clear", help="全てのキャッシュを削除する")
+    args = parser.parse_args(argv)
+
+    cache = ParseCache(args.dir)
+    if args.command == "info":
+        entries = cache.entries()
+        now = time.time()
+        for path, size, mtime in entries:
+            age = (now - mtime) / 3600
+            print(f"{path.name}  {_format_size(size):>10}  {age:8.1f} h ago")
+        total = sum(size for _, size, _ in entries)
+        print(f"{cache.directory}: {len(entries)} files, {_format_size(total)}")
+    elif args.command == "prune":
+        removed = cache.prune(args.max_size)
+        print(f"Removed {removed} files")
+    elif args.command == "clear":
+        removed = cache.clear()
+        print(f"Removed {removed} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,126 +1,243 @@
 from __future__ import annotations
 
-from typing import Iterable
+from typing import Iterable, Mapping
 
 import lxml.etree as et
 import numpy as np
 
-from ..types import Geometry, LineStringCollection, PointCollection, PolygonCollection
-from .appearance import Appearance
+from ..models.base import CompiledPath
+from ..namespaces import BASE_NS
+from ..profiling import NULL_PROFILER, Profiler
+from ..types import Geometry, LineStringCollection, PolygonCollection
+from .appearance import Appearance, lookup_material
+
+_GML = "{" + BASE_NS["gml"] + "}"
+_GML_ID = _GML + "id"
+_EXTERIOR_RING = et.ETXPath(f"./{_GML}exterior/{_GML}LinearRing")
+_INTERIOR_RINGS = et.ETXPath(f"./{_GML}interior/{_GML}LinearRing")
+_POS_LIST = et.ETXPath(f"./{_GML}posList")
+
+
+def _pack_rings(
+    rings: list[np.ndarray], ring_counts: list[int]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """リングごとの座標配列を1つの座標バッファとオフセット配列にまとめる"""
+    ring_offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    np.cumsum([len(ring) for ring in rings], out=ring_offsets[1:])
+    polygon_offsets = np.zeros(len(ring_counts) + 1, dtype=np.int64)
+    np.cumsum(ring_counts, out=polygon_offsets[1:])
+    return (np.concatenate(rings), ring_offsets, polygon_offsets)
+
+
+def _pack_uvs(
+    uvs: list[np.ndarray | None], ring_offsets: np.ndarray
+) -> np.ndarray | None:
+    """リングごとのテクスチャ座標を、座標バッファと同じオフセットを持つ1つのバッファにまとめる
+
+    テクスチャ座標のないリングの部分は NaN とする。どのリングにもなければ None を返す。
+    """
+    if all(uv is None for uv in uvs):
+        return None
+    if all(uv is not None for uv in uvs):
+        return np.concatenate(uvs).astype(np.float32, copy=False)  # type: ignore
+    packed = np.full((ring_offsets[-1], 2), np.nan, dtype=np.float32)
+    for i, uv in enumerate(uvs):
+        if uv is not None:
+            packed[ring_offsets[i] : ring_offsets[i + 1]] = uv
+    return packed
+
+
+class GeometryCollector:
+    """Feature の部分木のジオメトリ要素を、LOD プロパティ要素をもとに集める
+
+    collect_all などの path の多くは `.//bldg:lod2MultiSurface//gml:Polygon` のように子孫を探索するため、
+    LoD ごと・path ごとに部分木を探索し直すと、LOD2/LOD3 の建物では同じ部分木を何度も走査することになる。
+    ここでは、Processor の path に現れるプロパティ要素 (bldg:lod2MultiSurface など) を
+    部分木の1回の走査でまとめて見つけておき、./P//G, .//P//G の形の path には
+    該当するプロパティ要素の配下だけを探索して答える。直接の子要素 ./P の有無は子要素の名前の集合から答える。
+    それ以外の形の path は XPath で探索する。
+
+    いずれも最初に必要になった時点で作るので、ジオメトリを読まない Feature では何もしない。
+    """
+
+    def __init__(
+        self, element: et._Element, geometry_tags: dict[str, tuple[str, ...]]
+    ) -> None:
+        """geometry_tags はプロパティ要素の名前 -> その配下で集めるジオメトリ要素の名前"""
+        self.element = element
+        self._geometry_tags = geometry_tags
+        self._child_tags: set[str] | None = None
+        self._properties: dict[str, list[et._Element]] | None = None
+
+    @property
+    def child_tags(self) -> set[str]:
+        """直接の子要素の名前"""
+        if self._child_tags is None:
+            self._child_tags = {child.tag for child in self.element}
+        return self._child_tags
+
+    def _property_elements(self) -> dict[str, list[et._Element]]:
+        """プロパティ要素の名前 -> 部分木に含まれるその要素 (文書順)"""
+        if self._properties is None:
+            properties: dict[str, list[et._Element]] = {}
+            if self._geometry_tags:
+                for prop in self.element.iter(*self._geometry_tags):
+                    if (elems := properties.get(prop.tag)) is None:
+                        properties[prop.tag] = [prop]
+                    else:
+                        elems.append(prop)
+            self._properties = properties
+        return self._properties
+
+    def select(self, path: CompiledPath) -> list[et._Element]:
+        """path に該当する要素を文書順に返す"""
+        if (key := path.geometry_key) is None:
+            return path.xpath(self.element)
+        (descendant, prop_tag, geom_tag) = key
+        props = self._property_elements().get(prop_tag, ())
+        found: list[et._Element] = []
+        for prop in props:
+            if descendant or prop.getparent() is self.element:
+                found.extend(prop.iter(geom_tag))
+        if descendant and len(props) > 1 and len(set(found)) != len(found):
+            # 同名のプロパティ要素が入れ子になっている場合 (スキーマ上はありえない) は、
+            # 内側の要素の配下を二重に集めているので取り除く
+            found = list(dict.fromkeys(found))
+        return found
+
+    def exists(self, path: CompiledPath) -> bool:
+        """path に該当する要素があるかどうか"""
+        if path.child_tag is not None:
+            return path.child_tag in self.child_tags
+        return bool(self.select(path))
+
+
+def _read_pos_list(elem: et._Element) -> np.ndarray:
+    """要素の直下の gml:posList を (頂点数, 3) の座標配列として読む"""
+    poslist = _POS_LIST(elem)[0]
+    return np.fromstring(poslist.text, dtype=np.float64, sep=" ").reshape(-1, 3)
+
+
+class _PolygonBuilder:
+    """ポリゴンのリング、マテリアル、テクスチャを集めて1つの PolygonCollection にする"""
+
+    def __init__(
+        self,
+        appearance: Appearance | None,
+        polygon_to_material: Mapping[str, int] | None,
+    ) -> None:
+        self._appearance = appearance
+        self._polygon_to_material = polygon_to_material
+        self._rings: list[np.ndarray] = []
+        self._ring_counts: list[int] = []
+        self._materials: list[int] = []
+        self._textures: list[int] = []
+        self._uvs: list[np.ndarray | None] = []
+
+    def __bool__(self) -> bool:
+        return bool(self._ring_counts)
+
+    def add(self, polygon: et._Element) -> None:
+        """gml:Polygon (または gml:Triangle) 要素を1つ加える"""
+        num_rings = len(self._rings)
+        appearance = self._appearance
+
+        # exterior ring
+        ring_elem = _EXTERIOR_RING(polygon)[0]
+        ring = _read_pos_list(ring_elem)
+        self._rings.append(ring)
+        if appearance:
+            self._materials.append(self._material_of(polygon, appearance))
+            if tex_uv := appearance.ring_to_texture.get(ring_elem.get(_GML_ID)):
+                tex, uv = tex_uv
+                assert ring.shape[0] == uv.shape[0]
+                self._textures.append(tex)
+                self._uvs.append(uv)
+            else:
+                self._textures.append(-1)
+                self._uvs.append(None)
+
+        # interior rings
+        for ring_elem in _INTERIOR_RINGS(polygon):
+            ring = _read_pos_list(ring_elem)
+            self._rings.append(ring)
+            if appearance:
+                uv = None
+                if tex_uv := appearance.ring_to_texture.get(ring_elem.get(_GML_ID)):
+                    _, uv = tex_uv
+                    assert ring.shape[0] == uv.shape[0]
+                self._uvs.append(uv)
+
+        self._ring_counts.append(len(self._rings) - num_rings)
+
+    def _material_of(self, polygon: et._Element, appearance: Appearance) -> int:
+        """ポリゴンのマテリアルの番号 (なければ -1)"""
+        if (poly_id := polygon.get(_GML_ID)) and self._polygon_to_material is not None:
+            mat = self._polygon_to_material.get(poly_id)
+        else:
+            mat = lookup_material(polygon, appearance.target_to_material)
+        return -1 if mat is None else mat
+
+    def build(self, profiler: Profiler) -> PolygonCollection:
+        coords, ring_offsets, polygon_offsets = _pack_rings(
+            self._rings, self._ring_counts
+        )
+        profiler.count("geometry", "polygons", len(self._ring_counts))
+        profiler.count("geometry", "rings", len(self._rings))
+        profiler.count("geometry", "vertices", len(coords))
+        if not self._appearance:
+            return PolygonCollection(
+                coords=coords,
+                ring_offsets=ring_offsets,
+                polygon_offsets=polygon_offsets,
+                materials=None,
+                textures=None,
+                uvs=None,
+            )
+
+        assert len(self._ring_counts) == len(self._textures)
+        assert len(self._ring_counts) == len(self._materials)
+        assert len(self._rings) == len(self._uvs)
+        return PolygonCollection(
+            coords=coords,
+            ring_offsets=ring_offsets,
+            polygon_offsets=polygon_offsets,
+            materials=np.array(self._materials, dtype=np.int32),
+            textures=np.array(self._textures, dtype=np.int32),
+            uvs=_pack_uvs(self._uvs, ring_offsets),
+        )
 
 
-def parse_geometry(  # noqa: C901 (TODO)
-    element: et._Element,
-    geometry_paths: Iterable[str],
-    nsmap: dict[str, str],
+def parse_geometry(
+    geometries: GeometryCollector,
+    geometry_paths: Iterable[CompiledPath],
     appearance: Appearance | None,
+    polygon_to_material: Mapping[str, int] | None = None,
+    profiler: Profiler = NULL_PROFILER,
 ) -> Geometry | None:
-    """指定された GML のジオメトリへのパスをもとにマルチパートのジオメトリを構成して返す"""
-    # TODO: refactoring
+    """指定された GML のジオメトリへのパスをもとにマルチパートのジオメトリを構成して返す
 
-    mpoly_geoms = []
-    mpoly_materials: list[int | None] = []
-    mpoly_textures: list[int | None] = []
-    mpoly_uvs: list[list[np.ndarray] | None] = []
-    mline_geoms = []
-    mpoint_geoms = []
+    polygon_to_material はポリゴンの gml:id -> マテリアル (面への指定を伝播済み)。
+    指定しない場合や gml:id のないポリゴンは、祖先の面をたどってマテリアルを探す。
+    点のジオメトリ (gml:Point, uro:pos) には対応しておらず、読まない。
+    """
+    polygons = _PolygonBuilder(appearance, polygon_to_material)
+    lines: list[np.ndarray] = []
 
     for geometry_path in geometry_paths:
-        if geometry_path.endswith(("/gml:Polygon", "/gml:Triangle")):
-            for polygon in element.iterfind(geometry_path, nsmap):
-                # TODO: refactoring
-                poly_rings = []
-                poly_uvs = []
-
-                # exterior ring
-                ring_elem = polygon.find("./gml:exterior/gml:LinearRing", nsmap)
-                poslist = ring_elem.find("./gml:posList", nsmap)
-                vertices = np.fromstring(poslist.text, dtype=np.float64, sep=" ")
-                ring = vertices.reshape(-1, 3)
-                poly_rings.append(ring)
-                if appearance:
-                    poly_id = polygon.get("{http://www.opengis.net/gml}id")
-                    ring_id = ring_elem.get("{http://www.opengis.net/gml}id")
-
-                    # TODO: refactoring
-                    mat = None
-                    if poly_id and (m := appearance.target_to_material.get(poly_id)):
-                        mat = m
-                    else:
-                        sur = polygon.getparent().getparent()
-                        sur_id = sur.get("{http://www.opengis.net/gml}id")
-                        if sur_id and (m := appearance.target_to_material.get(sur_id)):
-                            mat = m
-                        elif sur.tag == "{http://www.opengis.net/gml}CompositeSurface":
-                            sur2 = sur.getparent().getparent()
-                            sur2_id = sur2.get("{http://www.opengis.net/gml}id")
-                            if sur2_id and (
-                                m := appearance.target_to_material.get(sur2_id)
-                            ):
-                                mat = m
-
-                    mpoly_materials.append(mat)
-
-                    if tex_uv := appearance.ring_to_texture.get(ring_id):
-                        tex, uv = tex_uv
-                        assert ring.shape[0] == uv.shape[0]
-                        mpoly_textures.append(tex)
-                        poly_uvs.append(uv)
-                    else:
-                        mpoly_textures.append(None)
-                        poly_uvs.append(None)
-
-                # interior rings
-                for ring_elem in polygon.iterfind(
-                    "./gml:interior/gml:LinearRing", nsmap
-                ):
-                    poslist = ring_elem.find("./gml:posList", nsmap)
-                    vertices = np.fromstring(poslist.text, dtype=np.float64, sep=" ")
-                    ring = vertices.reshape(-1, 3)
-                    poly_rings.append(ring)
-                    if appearance:
-                        uv = None
-                        ring_id = ring_elem.get("{http://www.opengis.net/gml}id")
-                        if tex_uv := appearance.ring_to_texture.get(ring_id):
-                            _, uv = tex_uv
-                            poly_uvs.append(uv)
-
-                if appearance:
-                    mpoly_uvs.append(poly_uvs)
-                mpoly_geoms.append(poly_rings)
-
-        elif geometry_path.endswith("/gml:LineString"):
-            for linestring in element.iterfind(geometry_path, nsmap):
-                poslist = linestring.find("./gml:posList", nsmap)
-                vertices = np.fromstring(poslist.text, dtype=np.float64, sep=" ")
-                line = vertices.reshape(-1, 3)
-                mline_geoms.append(line)
-
-        elif geometry_path.endswith("/gml:Point"):
-            # TODO
-            pass
-
-        elif geometry_path.endswith("/uro:pos"):
-            # TODO pos
-            pass
-
-        else:
-            raise NotImplementedError(f"Unsupported geometry path: {geometry_path}")
-
-    if mpoly_geoms:
-        if appearance:
-            assert len(mpoly_geoms) == len(mpoly_textures)
-            assert len(mpoly_geoms) == len(mpoly_uvs)
-            assert len(mpoly_geoms) == len(mpoly_materials)
-        return PolygonCollection(
-            polygons=mpoly_geoms,
-            materials=mpoly_materials if appearance else None,
-            textures=mpoly_textures if appearance else None,
-            uvs=mpoly_uvs if appearance else None,
-        )
-    elif mline_geoms:
-        return LineStringCollection(lines=mline_geoms)
-    elif mpoint_geoms:
-        return PointCollection(points=np.vstack(mpoint_geoms))
-
+        path = geometry_path.path
+        if path.endswith(("/gml:Polygon", "/gml:Triangle")):
+            for polygon in geometries.select(geometry_path):
+                polygons.add(polygon)
+        elif path.endswith("/gml:LineString"):
+            for linestring in geometries.select(geometry_path):
+                lines.append(_read_pos_list(linestring))
+        elif not path.endswith(("/gml:Point", "/uro:pos")):
+            raise NotImplementedError(f"Unsupported geometry path: {path}")
+
+    if polygons:
+        return polygons.build(profiler)
+    if lines:
+        profiler.count("geometry", "linestrings", len(lines))
+        return LineStringCollection(lines=lines)
     return None
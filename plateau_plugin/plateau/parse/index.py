@@ -0,0 +1,458 @@
+"""トップレベルの都市オブジェクトのバイトオフセットの索引
+
+CityGML ファイルを XML としてパースせずにバイト列として走査し、
+各 core:cityObjectMember の位置 (バイトオフセット)、gml:id、地物の種類、範囲を記録する。
+索引があれば、都市オブジェクトの数を数えたり、gml:id で1つの都市オブジェクトだけを読んだり、
+範囲外の都市オブジェクトを読み飛ばしたりするのに文書全体をパースする必要がなくなる。
+
+索引は CityGML ファイルの隣に拡張子 .plidx のファイルとして保存できる。
+
+索引ファイルの形式:
+
+- マジックナンバー、形式のバージョン、元ファイルのサイズ・更新時刻、各部のバイト数
+- 元ファイルの先頭からルート要素の開始タグまでのバイト列 (名前空間の宣言を含む)
+- ヘッダ (JSON): 文字コード、ルート要素の終了タグ、各都市オブジェクトの gml:id と種類
+- オフセット (int64, (都市オブジェクト数, 2)): core:cityObjectMember の開始位置と終了位置
+- 範囲 (float64, (都市オブジェクト数, 4)): 最小経度, 最小緯度, 最大経度, 最大緯度 (不明な場合は NaN)
+
+    python -m plateau_plugin.plateau.parse.index path/to/53394611_bldg_6697_op.gml ...
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import mmap
+import os
+import re
+import struct
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import lxml.etree as et
+import numpy as np
+
+from ..namespaces import BASE_NS, Namespace
+from ..sources import open_source, source_stat, split_zip_source
+
+_FORMAT_VERSION = 2
+_MAGIC = b"PLTI"
+_PREAMBLE = struct.Struct("<4sIQqQQQ")
+"""マジックナンバー、形式のバージョン、元ファイルのサイズ・更新時刻、ルート開始タグまで・ヘッダのバイト数、都市オブジェクトの数"""
+
+_SUFFIX = ".plidx"
+
+_CITY_MODEL_TAG = "{" + BASE_NS["core"] + "}CityModel"
+
+_ROOT_START_TAG = re.compile(rb"<([A-Za-z_][\w.\-]*(?::[A-Za-z_][\w.\-]*)?)[\s/>]")
+_START_TAG = re.compile(rb"<([A-Za-z_][\w.\-]*(?::[A-Za-z_][\w.\-]*)?)(\s[^>]*)?>")
+_SRS_DIMENSION = re.compile(rb"\ssrsDimension\s*=\s*[\"'](\d+)[\"']")
+_SRS_NAME = re.compile(rb"\ssrsName\s*=\s*[\"']([^\"']*)[\"']")
+_GEOGRAPHIC_SRS_CODE = re.compile(r"(?:EPSG(?:/0/|::|:))(6697|6668)$")
+
+
+def is_geographic_srs(srs_name: str | None) -> bool:
+    """srsName が範囲の比較に使える JGD2011 の地理座標系 (EPSG:6697 または EPSG:6668) かどうか
+
+    srsName がない場合は、PLATEAU の製品仕様書に従い EPSG:6697 とみなす。
+    """
+    if not srs_name:
+        return True
+    return _GEOGRAPHIC_SRS_CODE.search(srs_name) is not None
+
+
+class CityObjectIndex:
+    """1つの CityGML ファイルのトップレベルの都市オブジェクトの索引"""
+
+    def __init__(
+        self,
+        source_size: int,
+        source_mtime_ns: int,
+        prologue: bytes,
+        root_end: bytes,
+        encoding: str,
+        ids: list[str | None],
+        types: list[str],
+        offsets: np.ndarray,
+        bounds: np.ndarray,
+    ) -> None:
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+        self.prologue = prologue
+        """ファイルの先頭からルート要素の開始タグの終わりまで"""
+        self.root_end = root_end
+        """ルート要素の終了タグ"""
+        self.encoding = encoding
+        self.ids = ids
+        self.types = types
+        self.offsets = offsets
+        self.bounds = bounds
+        self._id_to_index: dict[str, int] | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nsmap(self) -> dict[str, str]:
+        """ルート要素で宣言されている名前空間の対応"""
+        return et.fromstring(self.prologue + self.root_end).nsmap
+
+    def lookup(self, gml_id: str) -> int | None:
+        """gml:id から都市オブジェクトの (文書中での) 順番を引く"""
+        if self._id_to_index is None:
+            self._id_to_index = {
+                id_: i for i, id_ in enumerate(self.ids) if id_ is not None
+            }
+        return self._id_to_index.get(gml_id)
+
+    def intersecting(self, bbox: tuple[float, float, float, float]) -> np.ndarray:
+        """範囲と交差する (または範囲が分からない) 都市オブジェクトの順番を返す"""
+        b = self.bounds
+        with np.errstate(invalid="ignore"):
+            outside = (
+                (b[:, 2] < bbox[0])
+                | (b[:, 0] > bbox[2])
+                | (b[:, 3] < bbox[1])
+                | (b[:, 1] > bbox[3])
+            )
+        return np.flatnonzero(~outside)
+
+    def is_current(self, filename: str) -> bool:
+        """索引が元ファイルの現在の内容に対応しているかどうか"""
+        (_, size, mtime_ns) = source_stat(filename)
+        return size == self.source_size and mtime_ns == self.source_mtime_ns
+
+    def read_fragments(
+        self, filename: str, indices: Iterable[int] | None = None
+    ) -> Iterator[tuple[int, bytes]]:
+        """指定した順番の都市オブジェクトを、それだけを含む CityGML 文書のバイト列として返す
+
+        ファイルは索引のオフセットに直接シークして読むため、他の都市オブジェクトは読まない。
+        """
+        if indices is None:
+            indices = range(len(self))
+        with open_source(filename) as f:
+            for i in indices:
+                start, end = self.offsets[i]
+                f.seek(start)
+                member = f.read(end - start)
+                yield (int(i), self.prologue + member + self.root_end)
+
+    def save(self, path: Path) -> None:
+        header = json.dumps(
+            {
+                "encoding": self.encoding,
+                "root_end": self.root_end.decode("ascii"),
+                "ids": self.ids,
+                "types": self.types,
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(
+                _PREAMBLE.pack(
+                    _MAGIC,
+                    _FORMAT_VERSION,
+                    self.source_size,
+                    self.source_mtime_ns,
+                    len(self.prologue),
+                    len(header),
+                    len(self),
+                )
+            )
+            f.write(self.prologue)
+            f.write(header)
+            f.write(np.ascontiguousarray(self.offsets, dtype="<i8").tobytes())
+            f.write(np.ascontiguousarray(self.bounds, dtype="<f8").tobytes())
+
+    @classmethod
+    def load(cls, path: Path) -> CityObjectIndex:
+        data = path.read_bytes()
+        if len(data) < _PREAMBLE.size:
+            raise ValueError("Truncated index file")
+        (magic, version, size, mtime_ns, prologue_len, header_len, count) = (
+            _PREAMBLE.unpack_from(data)
+        )
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError("Incompatible index file")
+
+        pos = _PREAMBLE.size
+        prologue = data[pos : pos + prologue_len]
+        pos += prologue_len
+        header = json.loads(data[pos : pos + header_len].decode("utf-8"))
+        pos += header_len
+        offsets = np.frombuffer(data, dtype="<i8", count=count * 2, offset=pos)
+        pos += offsets.nbytes
+        bounds = np.frombuffer(data, dtype="<f8", count=count * 4, offset=pos)
+        return cls(
+            source_size=size,
+            source_mtime_ns=mtime_ns,
+            prologue=prologue,
+            root_end=header["root_end"].encode("ascii"),
+            encoding=header["encoding"],
+            ids=header["ids"],
+            types=header["types"],
+            offsets=offsets.reshape(-1, 2),
+            bounds=bounds.reshape(-1, 4),
+        )
+
+
+def sidecar_path(filename: str) -> Path:
+    """CityGML ファイルの隣に置く索引ファイルのパス"""
+    return Path(filename + _SUFFIX)
+
+
+def load_or_build_index(filename: str, save: bool = True) -> CityObjectIndex:
+    """索引ファイルがあって最新ならそれを読み、なければ索引を作る
+
+    save が True の場合は、作った索引を CityGML ファイルの隣に保存する
+    (書き込めない場所にある場合は保存しない)。
+    zip アーカイブ内のファイルの索引は保存しない。
+    """
+    if split_zip_source(filename) is not None:
+        return build_index(filename)
+
+    path = sidecar_path(filename)
+    try:
+        index = CityObjectIndex.load(path)
+        if index.is_current(filename):
+            return index
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+
+    index = build_index(filename)
+    if save:
+        with contextlib.suppress(OSError):
+            index.save(path)
+    return index
+
+
+def element_from_fragment(fragment: bytes) -> et._Element:
+    """read_fragments が返す文書、または単独の都市オブジェクト要素のバイト列から都市オブジェクト要素を得る"""
+    elem = et.fromstring(fragment)
+    if elem.tag == _CITY_MODEL_TAG:
+        child = elem.find("./*/*")
+        assert child is not None
+        return child
+    return elem
+
+
+def _parse_bounds(
+    data: mmap.mmap | bytes,
+    start: int,
+    end: int,
+    gml: bytes,
+) -> tuple[float, float, float, float] | None:
+    """都市オブジェクトのおおよその範囲を得る (parser._element_bounds と同じ規則)"""
+    envelope = re.compile(
+        rb"\s*<"
+        + gml
+        + rb"boundedBy(?:\s[^>]*)?>\s*<"
+        + gml
+        + rb"Envelope(\s[^>]*)?>.*?</"
+        + gml
+        + rb"Envelope>",
+        re.DOTALL,
+    ).match(data, start, end)
+    if envelope is not None:
+        text = envelope.group(0)
+        srs_name = _SRS_NAME.search(envelope.group(1) or b"")
+        if not is_geographic_srs(srs_name.group(1).decode() if srs_name else None):
+            return None
+        lower = re.search(rb"<" + gml + rb"lowerCorner[^>]*>([^<]*)<", text)
+        upper = re.search(rb"<" + gml + rb"upperCorner[^>]*>([^<]*)<", text)
+        if lower and upper and lower.group(1) and upper.group(1):
+            lat0, lon0 = lower.group(1).split()[:2]
+            lat1, lon1 = upper.group(1).split()[:2]
+            return (float(lon0), float(lat0), float(lon1), float(lat1))
+
+    pos_list = re.compile(rb"<" + gml + rb"posList(\s[^>]*)?>([^<]*)<").search(
+        data, start, end
+    )
+    if pos_list is not None and pos_list.group(2):
+        dim_match = _SRS_DIMENSION.search(pos_list.group(1) or b"")
+        dim = int(dim_match.group(1)) if dim_match else 3
+        coords = np.fromstring(pos_list.group(2), dtype=np.float64, sep=" ")
+        coords = coords[: len(coords) // dim * dim].reshape(-1, dim)
+        if len(coords):
+            (lat0, lon0), (lat1, lon1) = coords[:, :2].min(0), coords[:, :2].max(0)
+            return (float(lon0), float(lat0), float(lon1), float(lat1))
+
+    return None
+
+
+def _prefix_of(nsmap: dict[str | None, str], uri: str) -> bytes:
+    """名前空間の接頭辞を、タグ名の前に付ける形 (b"gml:" など) で返す"""
+    for prefix, ns_uri in nsmap.items():
+        if ns_uri == uri:
+            return (prefix + ":").encode("ascii") if prefix else b""
+    raise ValueError(f"Namespace not declared: {uri}")
+
+
+@contextmanager
+def _map_source(filename: str) -> Iterator[mmap.mmap | bytes]:
+    """ファイル全体をバイト列として参照する (ローカルのファイルはメモリマップする)"""
+    if split_zip_source(filename) is not None:
+        with open_source(filename) as f:
+            yield f.read()
+        return
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def _read_prologue(
+    data: mmap.mmap | bytes, filename: str
+) -> tuple[bytes, bytes, et._Element]:
+    """ルート要素の開始タグまでを読んで、(そこまでのバイト列, ルート要素の終了タグ, ルート要素) を返す"""
+    pos = 0
+    while True:
+        pos = data.find(b"<", pos)
+        if pos < 0:
+            raise ValueError(f"No root element found: {filename}")
+        if (m := _ROOT_START_TAG.match(data, pos)) is not None:
+            break
+        pos += 1
+    prologue = data[: data.find(b">", pos) + 1]
+    root_end = b"</" + m.group(1) + b">"
+    return (prologue, root_end, et.fromstring(prologue + root_end))
+
+
+def read_without_geometry(filename: str) -> bytes:
+    """CityGML ファイルから、ジオメトリと Appearance の要素を取り除いた文書のバイト列を得る
+
+    属性だけを読む場合に、XML のパースにかかる時間を減らすために使う。
+    取り除くのは、子要素が GML のジオメトリである lod で始まる名前の要素 (bldg:lod2Solid など) と、
+    app:appearanceMember, app:appearance 要素。コメントや CDATA セクションの中に現れるタグは考慮しない。
+    """
+    with _map_source(filename) as data:
+        (prologue, _, root) = _read_prologue(data, filename)
+        gml = re.escape(_prefix_of(root.nsmap, BASE_NS["gml"]))
+        geometry_start = re.compile(
+            rb"<((?:[A-Za-z_][\w.\-]*:)?lod[0-4][A-Za-z]*)(?:\s[^>]*)?>\s*<" + gml
+        )
+        markers = [b"lod"]
+        with contextlib.suppress(ValueError):
+            app = re.escape(_prefix_of(root.nsmap, BASE_NS["app"]))
+            markers.append(b"appearance")
+            geometry_start = re.compile(
+                geometry_start.pattern
+                + rb"|<("
+                + app
+                + rb"(?:appearanceMember|appearance))(?=[\s>])[^>]*(?<!/)>"
+            )
+
+        pieces: list[bytes] = []
+        pos = cursor = len(prologue)
+        # 候補の文字列を find で探してから正規表現で確かめるほうが、正規表現だけで探すより速い
+        hits: dict[bytes, int | None] = dict.fromkeys(markers)
+        """候補の文字列 -> 次に現れる位置 (None は未検索、-1 はもう現れない)"""
+        while True:
+            for marker, i in hits.items():
+                if i is None or 0 <= i < cursor:
+                    hits[marker] = data.find(marker, cursor)
+            if (hit := min((i for i in hits.values() if i >= 0), default=-1)) < 0:  # type: ignore
+                break
+            cursor = hit + 3
+            if (lt := data.rfind(b"<", max(pos, hit - 64), hit)) < 0:
+                continue
+            if (m := geometry_start.match(data, lt)) is None:
+                continue
+            name = m.group(1) or m.group(2)
+            if (end := data.find(b"</" + name + b">", m.end())) < 0:
+                continue
+            pieces.append(data[pos:lt])
+            pos = cursor = end + len(name) + 3
+        pieces.append(data[pos:])
+    return prologue + b"".join(pieces)
+
+
+def build_index(filename: str) -> CityObjectIndex:
+    """CityGML ファイルをバイト列として走査して索引を作る
+
+    コメントや CDATA セクションの中に現れるタグは考慮しない。
+    """
+    (_, size, mtime_ns) = source_stat(filename)
+    with _map_source(filename) as data:
+        # ルート要素の開始タグまでを読んで、名前空間の対応を得る
+        (prologue, root_end, root) = _read_prologue(data, filename)
+        encoding = root.getroottree().docinfo.encoding or "utf-8"
+        doc_nsmap = root.nsmap
+        ns = Namespace.from_document_nsmap(doc_nsmap)
+        core = _prefix_of(doc_nsmap, BASE_NS["core"])
+        gml = _prefix_of(doc_nsmap, BASE_NS["gml"])
+        member_tag = re.compile(
+            rb"<(/?)" + re.escape(core) + rb"cityObjectMember(?=[\s/>])[^>]*>"
+        )
+        gml_id = re.compile(rb"\s" + re.escape(gml) + rb"id\s*=\s*([\"'])(.*?)\1")
+
+        ids: list[str | None] = []
+        types: list[str] = []
+        offsets: list[tuple[int, int]] = []
+        bounds: list[tuple[float, float, float, float]] = []
+
+        depth = 0
+        member_start = 0
+        content_start = 0
+        for m in member_tag.finditer(data, len(prologue)):
+            if m.group(1):
+                depth -= 1
+                if depth > 0:
+                    continue
+                # core:cityObjectMember の直下の都市オブジェクトを調べる
+                feature = _START_TAG.search(data, content_start, m.start())
+                if feature is None:
+                    continue
+                prefix, _, local = feature.group(1).decode("ascii").rpartition(":")
+                qualified = "{" + doc_nsmap.get(prefix or None, "") + "}" + local
+                try:
+                    types.append(ns.to_prefixed_name(qualified))
+                except KeyError:
+                    types.append(feature.group(1).decode("ascii"))
+                id_match = gml_id.search(feature.group(2) or b"")
+                ids.append(id_match.group(2).decode(encoding) if id_match else None)
+                offsets.append((member_start, m.end()))
+                bounds.append(
+                    _parse_bounds(data, feature.end(), m.start(), re.escape(gml))
+                    or (np.nan, np.nan, np.nan, np.nan)
+                )
+            elif not m.group(0).endswith(b"/>"):
+                if depth == 0:
+                    member_start = m.start()
+                    content_start = m.end()
+                depth += 1
+
+    return CityObjectIndex(
+        source_size=size,
+        source_mtime_ns=mtime_ns,
+        prologue=prologue,
+        root_end=root_end,
+        encoding=encoding,
+        ids=ids,
+        types=types,
+        offsets=np.array(offsets, dtype=np.int64).reshape(-1, 2),
+        bounds=np.array(bounds, dtype=np.float64).reshape(-1, 4),
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m plateau_plugin.plateau.parse.index",
+        description="CityGML ファイルの隣に都市オブジェクトの索引ファイルを作る",
+    )
+    parser.add_argument("files", nargs="+", help="CityGML ファイル")
+    args = parser.parse_args(argv)
+
+    for filename in args.files:
+        index = build_index(filename)
+        index.save(sidecar_path(filename))
+        print(f"{sidecar_path(filename)}: {len(index)} city objects")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""トップレベルの都市オブジェクトを複数のプロセスで並列にパースする"""
+
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from multiprocessing.context import BaseContext
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+import lxml.etree as et
+
+from ..codelists import CodelistStore
+from ..namespaces import Namespace
+from ..profiling import NULL_PROFILER, Profiler
+from ..sources import source_parent
+from ..types import Appearance, CityObject
+from .index import element_from_fragment, load_or_build_index
+
+if TYPE_CHECKING:
+    from .cache import ParseCache
+    from .parser import CityObjectParser, ParserSettings
+
+_worker_parser: CityObjectParser | None = None
+"""ワーカープロセス内で使い回すパーサー"""
+
+
+def _init_worker(
+    settings: ParserSettings,
+    ns: Namespace,
+    base_dir: str,
+    appearance: Appearance | None,
+) -> None:
+    global _worker_parser
+    from .parser import CityObjectParser
+
+    _worker_parser = CityObjectParser(
+        settings,
+        ns=ns,
+        codelist_store=CodelistStore(base_dir),
+        appearance=appearance,
+    )
+
+
+def _parse_chunk(
+    indices: list[int], fragments: list[bytes]
+) -> list[tuple[int, CityObject]]:
+    """シリアライズされたトップレベルの都市オブジェクトのまとまりをパースする (ワーカープロセス側)"""
+    assert _worker_parser is not None
+    results: list[tuple[int, CityObject]] = []
+    for index, fragment in zip(indices, fragments):
+        elem = element_from_fragment(fragment)
+        for cityobj in _worker_parser.process_cityobj_element(elem, parent=None):
+            results.append((index, cityobj))
+    return results
+
+
+def parse_in_parallel(
+    elements: Iterable[tuple[int, et._Element | bytes]],
+    settings: ParserSettings,
+    ns: Namespace,
+    base_dir: str,
+    appearance: Appearance | None,
+    max_workers: int,
+    chunk_size: int = 32,
+    mp_context: BaseContext | None = None,
+) -> Iterator[tuple[int, CityObject]]:
+    """トップレベルの都市オブジェクト要素を chunk_size 個ずつワーカープロセスでパースし、文書順に返す
+
+    elements は (文書中での順番, 要素) の組で与え、結果にはその順番が付く。
+    要素の代わりに、索引から読んだバイト列 (CityObjectIndex.read_fragments) を与えてもよい。
+
+    未処理のまとまりは最大で max_workers の2倍までしか保持しないため、
+    呼び出し側の処理が遅い場合でも結果が際限なく溜まることはない。
+    """
+    assert max_workers >= 1
+    assert chunk_size >= 1
+
+    elements = iter(elements)
+    pending: deque[Future[list[tuple[int, CityObject]]]] = deque()
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(settings, ns, base_dir, appearance),
+    )
+
+    def submit_next() -> None:
+        indices = []
+        fragments = []
+        for index, elem in islice(elements, chunk_size):
+            indices.append(index)
+            fragments.append(
+                elem if isinstance(elem, bytes) else et.tostring(elem, with_tail=False)
+            )
+        if fragments:
+            pending.append(executor.submit(_parse_chunk, indices, fragments))
+
+    try:
+        for _ in range(max_workers * 2):
+            submit_next()
+
+        while pending:
+            results = pending.popleft().result()
+            submit_next()
+            yield from results
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+_worker_codelist_stores: dict[str, CodelistStore] = {}
+"""ワーカープロセス内でディレクトリごとに使い回すコードリスト"""
+
+
+def _parse_file(
+    filename: str,
+    settings: ParserSettings,
+    cache: ParseCache | None,
+    use_index: bool = False,
+    profiler: Profiler = NULL_PROFILER,
+) -> list[CityObject]:
+    """1つのファイルをパースする (ワーカープロセス側)"""
+    from .parser import PlateauCityGmlParser
+
+    base_dir = source_parent(filename)
+    if (codelists := _worker_codelist_stores.get(base_dir)) is None:
+        codelists = _worker_codelist_stores[base_dir] = CodelistStore(base_dir)
+
+    index = (
+        load_or_build_index(filename)
+        if use_index and settings.bbox is not None
+        else None
+    )
+    parser = PlateauCityGmlParser(
+        filename,
+        settings,
+        codelist_store=codelists,
+        cache=cache,
+        index=index,
+        profiler=profiler,
+    )
+    return [cityobj for _, cityobj in parser.iter_cityobjs()]
+
+
+def parse_files_in_parallel(
+    filenames: Iterable[str],
+    settings: ParserSettings,
+    max_workers: int,
+    mp_context: BaseContext | None = None,
+    cache: ParseCache | None = None,
+    use_index: bool = False,
+    profiler: Profiler = NULL_PROFILER,
+) -> Iterator[tuple[str, list[CityObject]]]:
+    """複数のファイルをワーカープロセスでパースし、パースを終えたファイルから順に返す
+
+    max_workers が 1 の場合はワーカープロセスを使わずにこのプロセスでパースする。
+    cache を指定すると、各ワーカーはパース結果のキャッシュを読み書きする。
+    use_index が True で settings.bbox が指定されている場合は、索引ファイルを使って範囲外の都市オブジェクトを読み飛ばす
+    (索引ファイルがなければ作って保存する)。
+    profiler は、このプロセスでパースする場合にだけ使う。
+    """
+    assert max_workers >= 1
+
+    if max_workers == 1:
+        for filename in filenames:
+            yield (
+                filename,
+                _parse_file(filename, settings, cache, use_index, profiler),
+            )
+        return
+
+    filenames = iter(filenames)
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
+    pending: dict[Future[list[CityObject]], str] = {}
+
+    def submit_next() -> None:
+        for filename in islice(filenames, 1):
+            pending[
+                executor.submit(_parse_file, filename, settings, cache, use_index)
+            ] = filename
+
+    try:
+        for _ in range(max_workers * 2):
+            submit_next()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename = pending.pop(future)
+                submit_next()
+                yield (filename, future.result())
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -1,22 +1,91 @@
 from __future__ import annotations
 
+from collections import ChainMap
 from dataclasses import dataclass
 from datetime import date
-from pathlib import Path
-from typing import Any, Iterable
+from multiprocessing.context import BaseContext
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Mapping
 
 import lxml.etree as et
+import numpy as np
 
 from ..codelists import CodelistStore
 from ..models import processors
-from ..models.base import FeatureProcessingDefinition
-from ..namespaces import Namespace
+from ..models.base import Attribute, FeatureProcessingDefinition
+from ..namespaces import BASE_NS, Namespace
+from ..profiling import NULL_PROFILER, Profiler
+from ..sources import open_xml, source_parent
 from ..types import Appearance, CityObject
-from .appearance import parse_appearances
-from .geometry import parse_geometry
+from .appearance import (
+    RingTextures,
+    parse_appearances,
+    resolve_surface_materials,
+    scan_appearances,
+)
+from .geometry import GeometryCollector, parse_geometry
+from .index import (
+    element_from_fragment,
+    is_geographic_srs,
+    load_or_build_index,
+    read_without_geometry,
+)
+from .parallel import parse_in_parallel
+
+if TYPE_CHECKING:
+    from .cache import ParseCache
+    from .index import CityObjectIndex
 
 _BOOLEAN_TRUE_STRINGS = frozenset({"true", "True", "1"})
 
+_MISSING = object()
+"""属性の変換関数が、値が無いため出力しないことを表す"""
+
+_AttributeConverter = Callable[
+    [Attribute, list[et._Element], et._Element, et._Element], Any
+]
+"""(属性の定義, 該当する要素, 基底要素, Feature の要素) から属性値を得る関数"""
+
+
+def _scalar_converter(parse: Callable[[str], Any]) -> _AttributeConverter:
+    """最初の要素のテキストを parse で変換する関数を作る"""
+
+    def convert(
+        prop: Attribute,
+        elems: list[et._Element],
+        base_elem: et._Element,
+        feature_elem: et._Element,
+    ) -> Any:
+        if (value := elems[0].text) is None:
+            return _MISSING
+        return parse(value)
+
+    return convert
+
+
+def _convert_double_list(
+    prop: Attribute,
+    elems: list[et._Element],
+    base_elem: et._Element,
+    feature_elem: et._Element,
+) -> list[float]:
+    return [float(e.text) for e in elems if e.text is not None]
+
+
+def _convert_xal(
+    prop: Attribute,
+    elems: list[et._Element],
+    base_elem: et._Element,
+    feature_elem: et._Element,
+) -> str:
+    return " ".join(s.strip() for s in elems[0].itertext() if s.strip())
+
+
+_GML_ID = "{" + BASE_NS["gml"] + "}id"
+_GML_NAME = et.ETXPath("./{" + BASE_NS["gml"] + "}name")
+_GML_DESCRIPTION = et.ETXPath("./{" + BASE_NS["gml"] + "}description")
+_CREATION_DATE = et.ETXPath("./{" + BASE_NS["core"] + "}creationDate")
+_TERMINATION_DATE = et.ETXPath("./{" + BASE_NS["core"] + "}terminationDate")
+
 
 @dataclass
 class ParserSettings:
@@ -38,6 +107,40 @@ class ParserSettings:
     load_dm: bool = False
     """公共測量標準図式 (DM) を読み込むかどうか"""
 
+    streaming: bool = False
+    """文書全体をメモリに保持せず、トップレベルの都市オブジェクトごとに逐次読み込むかどうか
+
+    巨大なファイルを読む際のメモリ使用量を、最大の都市オブジェクト1つ分程度に抑える。
+    """
+
+    include_processors: tuple[str, ...] | None = None
+    """出力する Processor の ID (None の場合は全て)
+
+    ここに含まれない種類の要素は、子孫に出力対象が現れうる場合を除いて読み飛ばす。
+    """
+
+    exclude_processors: tuple[str, ...] = ()
+    """出力しない Processor の ID
+
+    ここに含まれる種類の要素は、その子孫も含めて読み飛ばす。
+    """
+
+    attributes_only: bool = False
+    """属性だけを読み込み、ジオメトリを読まないかどうか
+
+    LODの検出やジオメトリのパースを行わず、全ての都市オブジェクトをジオメトリなしで出力する。
+    Apperance も読み込まない。
+    """
+
+    bbox: tuple[float, float, float, float] | None = None
+    """読み込む範囲 (EPSG:6697 の 最小経度, 最小緯度, 最大経度, 最大緯度)
+
+    指定すると、範囲と交差しないトップレベルの都市オブジェクトは属性やジオメトリを読まずに読み飛ばす。
+    都市オブジェクトの範囲には gml:boundedBy/gml:Envelope を使い、なければ最初の gml:posList の範囲で代用する。
+    Envelope の srsName が EPSG:6697 (または EPSG:6668) 以外の場合は範囲が不明なものとして読み込む。
+    srsName がない Envelope と gml:posList は、PLATEAU の製品仕様書に従い EPSG:6697 の座標とみなす。
+    """
+
 
 class CityObjectParser:
     def __init__(
@@ -46,28 +149,65 @@ class CityObjectParser:
         ns: Namespace,
         codelist_store: CodelistStore,
         appearance: Appearance | None = None,
+        profiler: Profiler = NULL_PROFILER,
     ) -> None:
         self._settings = settings
+        self._profiler = profiler
         self._ns: Namespace = ns
         self._nsmap: dict[str, str] = ns.nsmap
         self._codelist_store = codelist_store
         self.appearance = appearance
+        self._polygon_to_material: Mapping[str, int] | None = None
+        """処理中のトップレベルの都市オブジェクトについて、ポリゴンの gml:id -> マテリアル"""
+        self._filter_cache: dict[str, tuple[bool, bool]] = {}
+        self._converters: dict[str, _AttributeConverter] = {
+            "string": self._convert_string,
+            "[]string": self._convert_string_list,
+            "double": _scalar_converter(float),
+            "[]double": _convert_double_list,
+            "integer": _scalar_converter(int),
+            "boolean": _scalar_converter(lambda v: v in _BOOLEAN_TRUE_STRINGS),
+            "date": _scalar_converter(date.fromisoformat),
+            "xAL": _convert_xal,
+        }
+
+    def _filter(self, processor: FeatureProcessingDefinition) -> tuple[bool, bool]:
+        """この Processor の要素を (出力するかどうか, 子孫を含めて探索するかどうか) を返す"""
+        if (result := self._filter_cache.get(processor.id)) is not None:
+            return result
+
+        settings = self._settings
+        if processor.id in settings.exclude_processors:
+            result = (False, False)
+        elif settings.include_processors is None:
+            result = (True, True)
+        else:
+            included = set(settings.include_processors).difference(
+                settings.exclude_processors
+            )
+            emit = processor.id in included
+            walk = emit or not included.isdisjoint(
+                processors.get_reachable_processor_ids(processor.id)
+            )
+            result = (emit, walk)
+        self._filter_cache[processor.id] = result
+        return result
 
     def _get_id_and_name(
         self, elem: et._Element
     ) -> tuple[str | None, str | None, str | None]:
         """@gml:id と gml:name (あれば) と gml:description (あれば) を読む"""
-        nsmap = self._nsmap
-        gml_id = elem.get("{http://www.opengis.net/gml}id", None)
-        if (name_elem := elem.find("./gml:name", nsmap)) is not None:
+        gml_id = elem.get(_GML_ID, None)
+        if name_elems := _GML_NAME(elem):
+            name_elem = name_elems[0]
             gml_name = name_elem.text
             if path := name_elem.get("codeSpace"):
                 gml_name = self._codelist_store.lookup(None, path, gml_name)
         else:
             gml_name = None
 
-        if (desc_elem := elem.find("./gml:description", nsmap)) is not None:
-            gml_description = desc_elem.text
+        if desc_elems := _GML_DESCRIPTION(elem):
+            gml_description = desc_elems[0].text
         else:
             gml_description = None
 
@@ -75,15 +215,14 @@ class CityObjectParser:
 
     def _get_basic_dates(self, elem: et._Element) -> tuple[date | None, date | None]:
         """基本的な日付 core:creationDate (あれば) と core:terminationDate (あれば) を読む"""
-        nsmap = self._nsmap
         creation_date = (
-            date.fromisoformat(name_elem.text)
-            if (name_elem := elem.find("./core:creationDate", nsmap)) is not None
+            date.fromisoformat(found[0].text)
+            if (found := _CREATION_DATE(elem))
             else None
         )
         termination_date = (
-            date.fromisoformat(name_elem.text)
-            if (name_elem := elem.find("./core:terminationDate", nsmap)) is not None
+            date.fromisoformat(found[0].text)
+            if (found := _TERMINATION_DATE(elem))
             else None
         )
         return (creation_date, termination_date)
@@ -96,82 +235,77 @@ class CityObjectParser:
 
         return codelist[self._ns.to_prefixed_name(base_elem.tag)]
 
-    def _load_props(  # noqa: C901
+    def _load_props(
         self, processor: FeatureProcessingDefinition, feature_elem: et._Element
     ) -> dict[str, Any]:
-        """属性値を読み込む"""
-        nsmap = self._nsmap
+        """属性値を読み込む
+
+        属性グループごとに基底要素の子要素を1回だけ走査し、修飾名から読むべき属性を引く。
+        そのため、定義されている属性の数ではなく、実際に存在する属性の数に比例した時間で読める。
+        """
         props: dict[str, Any] = {}
-        codelist_lookup = self._codelist_store.lookup
+        converters = self._converters
 
         if processor.load_generic_attributes:
             props["generic"] = self._parse_generic_attributes(feature_elem)
 
-        for group in processor.attribute_groups:
+        for group in processor.compile(self._ns).attribute_groups:
             if group.base_element is None:
                 base_elem = feature_elem
             else:
-                base_elem = feature_elem.find(group.base_element, nsmap)
+                base_elem = group.base_element.first(feature_elem)
                 if base_elem is None:
                     continue
 
-            for prop in group.attributes:
+            found = group.match(base_elem)
+
+            # 定義の順に出力する
+            attributes = group.attributes
+            for i in sorted(found):
+                prop = attributes[i][0]
                 assert prop.name in prop.path, f"{prop.name} not in {prop.path}"
-                if prop.datatype == "[]string":
-                    values = []
-                    for child_elem in base_elem.iterfind(prop.path, nsmap):
-                        v = child_elem.text
-                        path = child_elem.get("codeSpace")
-                        if prop.predefined_codelist or path:
-                            pcl = self._get_codelist(
-                                feature_elem, prop.predefined_codelist
-                            )
-                            v = codelist_lookup(pcl, path, v)
-                        values.append(v)
-                    props[prop.name] = values
-                elif prop.datatype == "[]double":
-                    props[prop.name] = [
-                        float(e.text)
-                        for e in base_elem.findall(prop.path, nsmap)
-                        if e.text is not None
-                    ]
-                elif prop.datatype == "xAL":
-                    if (child_elem := base_elem.find(prop.path, nsmap)) is not None:
-                        value = " ".join(
-                            s.strip() for s in child_elem.itertext() if s.strip()
-                        )
-                        props[prop.name] = value
-                    else:
-                        continue
-                else:
-                    if (child_elem := base_elem.find(prop.path, nsmap)) is not None:
-                        value = child_elem.text
-                    else:
-                        continue
-                    if value is None:
-                        continue
-
-                    if prop.datatype == "string":
-                        v = str(value)
-                        path = child_elem.get("codeSpace")
-                        if prop.predefined_codelist or path:
-                            pcl = self._get_codelist(
-                                base_elem, prop.predefined_codelist
-                            )
-                            v = codelist_lookup(pcl, path, v)
-                        props[prop.name] = v
-                    elif prop.datatype == "double":
-                        props[prop.name] = float(value)
-                    elif prop.datatype == "integer":
-                        props[prop.name] = int(value)
-                    elif prop.datatype == "boolean":
-                        props[prop.name] = bool(value in _BOOLEAN_TRUE_STRINGS)
-                    elif prop.datatype == "date":
-                        props[prop.name] = date.fromisoformat(value)
-                    else:
-                        raise NotImplementedError(f"Unknown datatype: {prop.datatype}")
+                convert = converters.get(prop.datatype)
+                if convert is None:
+                    raise NotImplementedError(f"Unknown datatype: {prop.datatype}")
+                value = convert(prop, found[i], base_elem, feature_elem)
+                if value is not _MISSING:
+                    props[prop.name] = value
         return props
 
+    def _convert_string_list(
+        self,
+        prop: Attribute,
+        elems: list[et._Element],
+        base_elem: et._Element,
+        feature_elem: et._Element,
+    ) -> list[str | None]:
+        values = []
+        for child_elem in elems:
+            v = child_elem.text
+            path = child_elem.get("codeSpace")
+            if prop.predefined_codelist or path:
+                pcl = self._get_codelist(feature_elem, prop.predefined_codelist)
+                v = self._codelist_store.lookup(pcl, path, v)
+            values.append(v)
+        return values
+
+    def _convert_string(
+        self,
+        prop: Attribute,
+        elems: list[et._Element],
+        base_elem: et._Element,
+        feature_elem: et._Element,
+    ) -> Any:
+        child_elem = elems[0]
+        if (value := child_elem.text) is None:
+            return _MISSING
+        v = str(value)
+        path = child_elem.get("codeSpace")
+        if prop.predefined_codelist or path:
+            pcl = self._get_codelist(base_elem, prop.predefined_codelist)
+            v = self._codelist_store.lookup(pcl, path, v)
+        return v
+
     def _parse_generic_attributes(  # noqa: C901
         self, elem: et._Element
     ) -> dict[str, Any]:
@@ -211,25 +345,51 @@ class CityObjectParser:
 
         return generic_attrs
 
+    def _resolve_materials(
+        self, elem: et._Element, appearance: Appearance
+    ) -> Mapping[str, int]:
+        """トップレベルの都市オブジェクトのポリゴンのマテリアルを引くための対応を返す
+
+        文書全体から解決済みであればそれを使い、そうでなければ (ストリーミングや索引を使う場合)
+        この都市オブジェクトの部分木だけで面への指定を伝播させる。
+        """
+        if appearance.polygon_to_material is not None:
+            return appearance.polygon_to_material
+        with self._profiler.stage("appearance"):
+            surface_materials = resolve_surface_materials(
+                elem, appearance.target_to_material
+            )
+        # ポリゴン自身への指定を優先する
+        return ChainMap(appearance.target_to_material, surface_materials)
+
     def process_cityobj_element(  # noqa: C901
         self,
         elem: et._Element,
         parent: CityObject | None,  # 親 Feature の Processor
     ) -> Iterable[CityObject]:
         ns = self._ns
-        nsmap = self._nsmap
         appearance = self.appearance
 
-        (gml_id, gml_name, gml_desc) = self._get_id_and_name(elem)
-        (creation_date, termination_date) = self._get_basic_dates(elem)
-
         # この要素のための Processor を得る
         processor = processors.get_processor_by_tag(elem.tag)
         if processor is None:
             return
+        plan = processor.compile(ns)
 
-        # 属性を収集する
-        props = self._load_props(processor, elem)
+        if parent is None and appearance is not None:
+            self._polygon_to_material = self._resolve_materials(elem, appearance)
+
+        # 読み込む種類が絞られている場合は、出力も探索もしない要素をここで読み飛ばす
+        (emit, walk) = self._filter(processor)
+        if not walk:
+            return
+
+        with self._profiler.stage("attributes"):
+            (gml_id, gml_name, gml_desc) = self._get_id_and_name(elem)
+            (creation_date, termination_date) = self._get_basic_dates(elem)
+
+            # 属性を収集する (出力しない場合は子Featureの親としてのみ使うので属性は読まない)
+            props = self._load_props(processor, elem) if emit else {}
 
         # 親Feature (ジオメトリなし) を用意する
         nogeom_obj = CityObject(
@@ -248,46 +408,49 @@ class CityObjectParser:
         nogeom_emitted = False  # NoGeometry な Feature が出力済みかどうか
 
         # リスク属性
-        if processor.disaster_risk_attr_conatiner_path:
-            for risk in elem.iterfind(
-                processor.disaster_risk_attr_conatiner_path + "/*", nsmap
-            ):
+        if plan.disaster_risk_children is not None:
+            for risk in plan.disaster_risk_children.xpath(elem):
                 for child_obj in self.process_cityobj_element(risk, nogeom_obj):
                     yield child_obj
 
         # 入れ子属性
-        if processor.nested_attributes:
-            for path in processor.nested_attributes:
-                for child in elem.iterfind(path, nsmap):
+        if plan.nested_attributes:
+            for path in plan.nested_attributes:
+                for child in path.xpath(elem):
                     for child_obj in self.process_cityobj_element(child, nogeom_obj):
                         yield child_obj
 
         # 公共測量標準図式 (DM)
-        if self._settings.load_dm and processor.dm_attr_container_path:
-            for dm in elem.iterfind(processor.dm_attr_container_path + "/*", nsmap):
+        if self._settings.load_dm and plan.dm_children is not None:
+            for dm in plan.dm_children.xpath(elem):
                 for child_obj in self.process_cityobj_element(dm, nogeom_obj):
                     yield child_obj
 
         # 子Feature (部分要素) を個別に読み込む設定の場合は、子Featureを探索する
-        if self._settings.load_semantic_parts and processor.geometries.semantic_parts:
-            for path in processor.geometries.semantic_parts:
-                for child_elem in elem.iterfind(path, nsmap):
+        if self._settings.load_semantic_parts and plan.semantic_parts:
+            for path in plan.semantic_parts:
+                for child_elem in path.xpath(elem):
                     # 子Featureの Processor に処理を委ねる
                     for child_obj in self.process_cityobj_element(
                         child_elem, nogeom_obj
                     ):
                         yield child_obj
 
-        # ジオメトリをもたない場合は、ここで終了
-        if processor.non_geometric:
+        if not emit:
+            return
+
+        # ジオメトリをもたない場合や、属性だけを読む設定の場合は、ここで終了
+        if processor.non_geometric or self._settings.attributes_only:
             if not nogeom_emitted:
                 yield nogeom_obj
                 nogeom_emitted = True
             return
 
         # ジオメトリを読んで出力する
-        lod_defs = processor.lod_list
-        has_lods = processor.detect_lods(elem, nsmap)
+        lod_defs = plan.lod_list
+        geometries = GeometryCollector(elem, plan.geometry_tags)
+        with self._profiler.stage("geometry"):
+            has_lods = plan.detect_lods(geometries)
         target_lods = (
             (0, 1, 2, 3, 4) if self._settings.lowest_lod_first else (4, 3, 2, 1, 0)
         )
@@ -297,10 +460,7 @@ class CityObjectParser:
             if not has_lods[lod]:
                 continue
 
-            if processor.geometries.lod_n is not None:
-                emission = processor.geometries.lod_n_paths
-            else:
-                emission = lod_defs[lod]
+            emission = plan.lod_n_paths if plan.lod_n is not None else lod_defs[lod]
             if emission is None:
                 continue
 
@@ -311,9 +471,15 @@ class CityObjectParser:
                 else emission.collect_all
             )
 
-            if geom := parse_geometry(
-                elem, geom_paths, nsmap=nsmap, appearance=appearance
-            ):
+            with self._profiler.stage("geometry"):
+                geom = parse_geometry(
+                    geometries,
+                    geom_paths,
+                    appearance,
+                    self._polygon_to_material,
+                    profiler=self._profiler,
+                )
+            if geom:
                 yield CityObject(
                     lod=lod,
                     type=ns.to_prefixed_name(elem.tag),
@@ -340,42 +506,278 @@ class CityObjectParser:
 class PlateauCityGmlParser:
     """PLATEAU の CityGML ファイルのパーサー"""
 
-    def __init__(self, filename: str, settings: ParserSettings) -> None:
-        self._base_dir = Path(filename).parent
-        self._doc = et.parse(filename, None)
+    def __init__(
+        self,
+        filename: str,
+        settings: ParserSettings,
+        codelist_store: CodelistStore | None = None,
+        cache: ParseCache | None = None,
+        index: CityObjectIndex | None = None,
+        profiler: Profiler = NULL_PROFILER,
+    ) -> None:
+        """index を指定すると、文書全体は読まずに索引のオフセットから都市オブジェクトを読む
+
+        profiler を指定すると、XML の読み込みや属性・ジオメトリのパースなどの所要時間を計測する。
+        """
+        self._filename = filename
+        self._profiler = profiler
+        self._base_dir = source_parent(filename)
         self._settings = settings
+        self._cache = cache
+        self._index = index
         self.appearance: Appearance | None = None
 
+        # キャッシュがあれば XML は読まずにキャッシュから結果を再生する
+        self._cached = cache.load(filename, settings) if cache is not None else None
+        if self._cached is not None:
+            return
+
+        if index is not None:
+            # 索引がある場合は、都市オブジェクトを1つずつ索引の位置から読む
+            self._doc = None
+            nsmap = index.nsmap
+        elif settings.streaming:
+            # ストリーミングモードでは文書全体を読み込まない
+            self._doc = None
+            nsmap = _read_root_nsmap(filename)
+        elif settings.attributes_only and settings.bbox is None:
+            # 属性だけを読む場合は、ジオメトリと Appearance を取り除いてからパースする
+            # (範囲の判定には gml:posList を使うことがあるので、bbox を指定した場合は取り除かない)
+            with profiler.stage("xml_parse"):
+                self._doc = et.ElementTree(
+                    et.fromstring(read_without_geometry(filename))
+                )
+            nsmap = self._doc.getroot().nsmap
+        else:
+            with profiler.stage("xml_parse"), open_xml(filename) as src:
+                self._doc = et.parse(src, None)
+            nsmap = self._doc.getroot().nsmap
+
         # ドキュメントで使われている i-UR のバージョンを検出して
         # uro: と urf: 接頭辞が指すべきXML名前空間を自動で決定する
-        self._ns = Namespace.from_document_nsmap(self._doc.getroot().nsmap)
-        codelists = CodelistStore(self._base_dir)
-
-        if settings.load_apperance:
-            for app in parse_appearances(self._doc):
-                self.appearance = app
-                break
+        self._ns = Namespace.from_document_nsmap(nsmap)
+        # 同じディレクトリのファイルを続けて読む場合はコードリストのキャッシュを使い回せる
+        codelists = codelist_store or CodelistStore(self._base_dir, profiler=profiler)
+
+        if settings.load_apperance and not settings.attributes_only:
+            with profiler.stage("appearance"):
+                appearances = (
+                    parse_appearances(self._doc)
+                    if self._doc is not None
+                    else scan_appearances(filename)
+                )
+                for app in appearances:
+                    self.appearance = app
+                    break
 
         self._parser = CityObjectParser(
             self._settings,
             ns=self._ns,
             codelist_store=codelists,
             appearance=self.appearance,
+            profiler=profiler,
         )
 
     def count_toplevel_cityobjs(self) -> int:
         """ファイルに含まれるトップレベルのFeatureの数を返す"""
+        if self._cached is not None:
+            return self._cached.count_toplevel_cityobjs()
+
+        if self._index is not None:
+            return len(self._index)
+
+        if self._doc is None:
+            return sum(1 for _ in self._iterparse_members())
+
         return sum(
             1 for _ in self._doc.iterfind("./core:cityObjectMember", self._ns.nsmap)
         )
 
+    def _iterparse_members(self) -> Iterator[et._Element]:
+        """core:cityObjectMember 要素を逐次読み込んで返す
+
+        呼び出し側が次の要素を要求した時点で、処理済みの要素は解放される。
+        """
+        member_tag = self._ns.to_qualified_name("core:cityObjectMember")
+        with open_xml(self._filename) as src:
+            for _, member in et.iterparse(src, events=("end",), tag=member_tag):
+                parent = member.getparent()
+                if parent is None or parent.getparent() is not None:
+                    # core:CityModel 直下のもの以外は無視する
+                    continue
+
+                yield member
+
+                # 処理済みの部分木と、それより前の兄弟要素を解放する
+                member.clear(keep_tail=True)
+                while member.getprevious() is not None:
+                    del parent[0]
+
+    def _iter_toplevel_elements(self) -> Iterator[tuple[int, et._Element]]:
+        """トップレベルの都市オブジェクト要素を、文書中での順番とともに文書順に返す
+
+        読み込む範囲が指定されている場合は、範囲外の要素を除いて返す。
+        """
+        if self._index is not None:
+            for index, fragment in self._iter_toplevel_fragments():
+                yield (index, element_from_fragment(fragment))
+            return
+
+        if self._doc is not None:
+            elements = self._doc.iterfind("./core:cityObjectMember/*", self._ns.nsmap)
+        else:
+            elements = (
+                elem
+                for member in self._iterparse_members()
+                for elem in member.iterfind("./*")
+            )
+
+        if (bbox := self._settings.bbox) is None:
+            yield from enumerate(elements)
+            return
+
+        nsmap = self._ns.nsmap
+        for index, elem in enumerate(elements):
+            if _intersects_bbox(elem, bbox, nsmap):
+                yield (index, elem)
+
+    def _iter_toplevel_fragments(self) -> Iterator[tuple[int, bytes]]:
+        """索引を使って、トップレベルの都市オブジェクトをバイト列のまま文書順に返す"""
+        assert self._index is not None
+        indices = (
+            self._index.intersecting(bbox)
+            if (bbox := self._settings.bbox) is not None
+            else None
+        )
+        return self._index.read_fragments(self._filename, indices)
+
+    def get_cityobjs(self, gml_id: str) -> list[CityObject]:
+        """gml:id で指定したトップレベルの都市オブジェクトだけをパースして返す
+
+        索引を使い、他の都市オブジェクトは読まない。索引がなければここで作る。
+        """
+        if self._index is None:
+            self._index = load_or_build_index(self._filename, save=False)
+        if (position := self._index.lookup(gml_id)) is None:
+            return []
+
+        if self._cached is not None:
+            return [obj for i, obj in self._cached if i == position]
+
+        results = []
+        try:
+            for _, fragment in self._index.read_fragments(self._filename, [position]):
+                elem = element_from_fragment(fragment)
+                results.extend(self._parser.process_cityobj_element(elem, parent=None))
+        finally:
+            self._close_appearance()
+        return results
+
     def iter_cityobjs(self) -> Iterable[tuple[int, CityObject]]:
         """都市オブジェクトをパースして返す"""
-
-        for toplevel_count, city_object in enumerate(
-            self._doc.iterfind("./core:cityObjectMember/*", self._ns.nsmap)
+        if self._cached is not None:
+            return iter(self._cached)
+
+        cityobjs = self._iter_parsed_cityobjs()
+        if self._cache is not None:
+            return self._cache.record(self._filename, self._settings, cityobjs)
+        return cityobjs
+
+    def _iter_parsed_cityobjs(self) -> Iterator[tuple[int, CityObject]]:
+        # ストリーミングや索引を使う場合は、要素を取り出す時点で XML を読む
+        elements = self._profiler.timed_iter(
+            "xml_parse", self._iter_toplevel_elements()
+        )
+        try:
+            for toplevel_count, city_object in elements:
+                for cityobj in self._parser.process_cityobj_element(
+                    city_object, parent=None
+                ):
+                    yield (toplevel_count, cityobj)
+        finally:
+            # 全ての地物を出力し終えたら (または途中でやめたら) UV座標の読み込み元を閉じる
+            self._close_appearance()
+
+    def _close_appearance(self) -> None:
+        if self.appearance is not None and isinstance(
+            ring_to_texture := self.appearance.ring_to_texture, RingTextures
         ):
-            for cityobj in self._parser.process_cityobj_element(
-                city_object, parent=None
-            ):
-                yield (toplevel_count, cityobj)
+            ring_to_texture.close()
+
+    def iter_cityobjs_parallel(
+        self,
+        max_workers: int,
+        chunk_size: int = 32,
+        mp_context: BaseContext | None = None,
+    ) -> Iterable[tuple[int, CityObject]]:
+        """都市オブジェクトを複数のプロセスで並列にパースして返す
+
+        トップレベルの都市オブジェクトを chunk_size 個ずつワーカープロセスに分配し、
+        結果は iter_cityobjs と同じく文書順に返す。
+        """
+        if self._cached is not None:
+            return iter(self._cached)
+
+        # 索引がある場合は、要素にせずにバイト列のままワーカーに渡す
+        cityobjs = parse_in_parallel(
+            self._iter_toplevel_fragments()
+            if self._index is not None
+            else self._iter_toplevel_elements(),
+            self._settings,
+            ns=self._ns,
+            base_dir=self._base_dir,
+            appearance=self.appearance,
+            max_workers=max_workers,
+            chunk_size=chunk_size,
+            mp_context=mp_context,
+        )
+        if self._cache is not None:
+            return self._cache.record(self._filename, self._settings, cityobjs)
+        return cityobjs
+
+
+def _element_bounds(
+    elem: et._Element, nsmap: dict[str, str]
+) -> tuple[float, float, float, float] | None:
+    """都市オブジェクトのおおよその範囲 (最小経度, 最小緯度, 最大経度, 最大緯度) を得る"""
+    if (envelope := elem.find("./gml:boundedBy/gml:Envelope", nsmap)) is not None:
+        if not is_geographic_srs(envelope.get("srsName")):
+            return None
+        lower = envelope.find("./gml:lowerCorner", nsmap)
+        upper = envelope.find("./gml:upperCorner", nsmap)
+        if lower is not None and upper is not None and lower.text and upper.text:
+            lat0, lon0 = lower.text.split()[:2]
+            lat1, lon1 = upper.text.split()[:2]
+            return (float(lon0), float(lat0), float(lon1), float(lat1))
+
+    if (pos_list := elem.find(".//gml:posList", nsmap)) is not None and pos_list.text:
+        dim = int(pos_list.get("srsDimension", "3"))
+        coords = np.fromstring(pos_list.text, dtype=np.float64, sep=" ")
+        coords = coords[: len(coords) // dim * dim].reshape(-1, dim)
+        if len(coords):
+            (lat0, lon0), (lat1, lon1) = coords[:, :2].min(0), coords[:, :2].max(0)
+            return (float(lon0), float(lat0), float(lon1), float(lat1))
+
+    return None
+
+
+def _intersects_bbox(
+    elem: et._Element,
+    bbox: tuple[float, float, float, float],
+    nsmap: dict[str, str],
+) -> bool:
+    """都市オブジェクトが範囲と交差するかどうか (範囲が分からないものは交差するとみなす)"""
+    if (bounds := _element_bounds(elem, nsmap)) is None:
+        return True
+    min_x, min_y, max_x, max_y = bounds
+    return not (
+        max_x < bbox[0] or min_x > bbox[2] or max_y < bbox[1] or min_y > bbox[3]
+    )
+
+
+def _read_root_nsmap(filename: str) -> dict[str, str]:
+    """ルート要素だけを読んで、その名前空間の対応を返す"""
+    with open_xml(filename) as src:
+        for _, root in et.iterparse(src, events=("start",)):
+            return root.nsmap
+    raise ValueError(f"No root element found: {filename}")  # pragma: no cover
@@ -0,0 +1,35 @@
+"""QGIS を使わずに都市オブジェクトの属性を表形式で読み出す"""
+
+from __future__ import annotations
+
+import dataclasses
+from typing import Any, Iterator
+
+from ..codelists import CodelistStore
+from .parser import ParserSettings, PlateauCityGmlParser
+
+
+def iter_attribute_rows(
+    filename: str,
+    settings: ParserSettings | None = None,
+    codelist_store: CodelistStore | None = None,
+) -> Iterator[dict[str, Any]]:
+    """CityGML ファイルの都市オブジェクトの属性を1行ずつ辞書として返す
+
+    ジオメトリは読まない (settings.attributes_only は常に有効になる)。
+    各行は id, type, name, description, creationDate, terminationDate, parent
+    (親の都市オブジェクトの ID) と、種類ごとの属性からなる。
+    """
+    settings = dataclasses.replace(settings or ParserSettings(), attributes_only=True)
+    parser = PlateauCityGmlParser(filename, settings, codelist_store=codelist_store)
+    for _, cityobj in parser.iter_cityobjs():
+        yield {
+            "id": cityobj.id,
+            "type": cityobj.type,
+            "name": cityobj.name,
+            "description": cityobj.description,
+            "creationDate": cityobj.creation_date,
+            "terminationDate": cityobj.termination_date,
+            "parent": cityobj.parent.id if cityobj.parent else None,
+            **cityobj.attributes,
+        }
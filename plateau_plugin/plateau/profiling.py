@@ -0,0 +1,156 @@
+"""読み込み処理の段階ごとの所要時間と回数の計測 (プロファイリング)
+
+パーサーや QGIS への読み込み処理に Profiler を渡すと、段階 (XML の読み込み、属性の抽出、
+ジオメトリのパースなど) ごとの所要時間と呼び出し回数、各種の件数を集計する。
+渡さない場合は何もしない NULL_PROFILER が使われ、計測のコストはほぼかからない。
+
+    profiler = Profiler()
+    parser = PlateauCityGmlParser(filename, settings, profiler=profiler)
+    for _, cityobj in parser.iter_cityobjs():
+        ...
+    print("\\n".join(profiler.format_lines()))
+
+段階は入れ子になりうる (例えば codelist_load は attributes の内側で起こる) ため、
+各段階の所要時間の合計は全体の所要時間と一致しない。
+並列にパースする場合、ワーカープロセス内で行われた処理は集計されない。
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Iterable, Iterator, TypeVar
+
+_T = TypeVar("_T")
+
+
+class _Stage:
+    """with 文で囲んだ区間の所要時間を Profiler に加算する"""
+
+    __slots__ = ("_name", "_profiler", "_start")
+
+    def __init__(self, profiler: Profiler, name: str) -> None:
+        self._profiler = profiler
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *args) -> None:
+        self._profiler.add_time(self._name, time.perf_counter() - self._start)
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Profiler:
+    """段階ごとの所要時間・回数と、名前ごとの件数を集計する"""
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self._started = time.perf_counter()
+        self._stages: dict[str, list[float]] = {}
+        """段階の名前 -> [所要時間の合計 (秒), 回数]"""
+        self._counters: dict[str, dict[str, int]] = {}
+        """カウンタの名前 -> (キー -> 件数)"""
+
+    def stage(self, name: str) -> _Stage:
+        """with 文で囲んだ区間の所要時間を、段階 name の時間として計測する"""
+        return _Stage(self, name)
+
+    def add_time(self, name: str, seconds: float, calls: int = 1) -> None:
+        if (entry := self._stages.get(name)) is None:
+            self._stages[name] = [seconds, calls]
+        else:
+            entry[0] += seconds
+            entry[1] += calls
+
+    def count(self, name: str, key: str = "", n: int = 1) -> None:
+        """カウンタ name のキー key の件数を n 増やす"""
+        if (counter := self._counters.get(name)) is None:
+            counter = self._counters[name] = {}
+        counter[key] = counter.get(key, 0) + n
+
+    def timed_iter(self, name: str, iterable: Iterable[_T]) -> Iterator[_T]:
+        """iterable から次の要素を取り出すのにかかった時間を、段階 name の時間として計測する"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start, 0)
+                return
+            self.add_time(name, time.perf_counter() - start)
+            yield item
+
+    @property
+    def elapsed(self) -> float:
+        """Profiler を作ってからの経過時間 (秒)"""
+        return time.perf_counter() - self._started
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "elapsed": self.elapsed,
+            "stages": {
+                name: {"seconds": seconds, "calls": calls}
+                for name, (seconds, calls) in self._stages.items()
+            },
+            "counters": {name: dict(c) for name, c in self._counters.items()},
+        }
+
+    def save_json(self, path: Path | str) -> None:
+        Path(path).write_text(
+            json.dumps(self.to_dict(), ensure_ascii=False, indent=2) + "\n",
+            encoding="utf-8",
+        )
+
+    def format_lines(self) -> list[str]:
+        """集計結果を人が読む形式の行にする (所要時間の長い段階、件数の多いキーから順に)"""
+        elapsed = self.elapsed
+        lines = [f"全体: {elapsed:.3f} 秒"]
+        for name, (seconds, calls) in sorted(
+            self._stages.items(), key=lambda item: -item[1][0]
+        ):
+            ratio = seconds / elapsed * 100 if elapsed > 0 else 0.0
+            lines.append(f"  {name}: {seconds:.3f} 秒 ({ratio:.1f}%、{calls} 回)")
+        for name, counter in self._counters.items():
+            lines.append(f"{name}:")
+            for key, n in sorted(counter.items(), key=lambda item: -item[1]):
+                lines.append(f"  {key or '(計)'}: {n}")
+        return lines
+
+
+class NullProfiler(Profiler):
+    """何も計測しない Profiler"""
+
+    enabled = False
+
+    def stage(self, name: str) -> _Stage:
+        return _NULL_STAGE  # type: ignore
+
+    def add_time(self, name: str, seconds: float, calls: int = 1) -> None:
+        pass
+
+    def count(self, name: str, key: str = "", n: int = 1) -> None:
+        pass
+
+    def timed_iter(self, name: str, iterable: Iterable[_T]) -> Iterator[_T]:
+        return iter(iterable)
+
+
+NULL_PROFILER = NullProfiler()
+"""計測しない場合に使う Profiler"""
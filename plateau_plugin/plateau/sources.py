@@ -0,0 +1,112 @@
+"""CityGML などの読み込み元 (ローカルのファイルまたは zip アーカイブ内のファイル) を扱う
+
+配布データの zip を展開せずに読めるように、ファイル名の代わりに次の形式の文字列を受け付ける。
+
+    zip:///path/to/13100_tokyo23-ku_2022_citygml_1_op.zip!/udx/bldg/53394611_bldg_6697_op.gml
+
+アーカイブ内のファイルは展開せずにストリームとして読む。
+"""
+
+from __future__ import annotations
+
+import os
+import posixpath
+import threading
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+ZIP_SCHEME = "zip://"
+_ZIP_SEPARATOR = "!/"
+
+_archives: dict[str, tuple[int, int, zipfile.ZipFile]] = {}
+"""アーカイブのパス -> (プロセス ID, 更新時刻, 開いたアーカイブ)"""
+_archives_lock = threading.Lock()
+
+
+def split_zip_source(source: str) -> tuple[str, str] | None:
+    """zip:// 形式であれば (アーカイブのパス, アーカイブ内のパス) を、そうでなければ None を返す"""
+    if not source.startswith(ZIP_SCHEME):
+        return None
+    archive, sep, member = source[len(ZIP_SCHEME) :].partition(_ZIP_SEPARATOR)
+    if not sep:
+        raise ValueError(f"Invalid zip source (missing '!/'): {source}")
+    return (archive, member)
+
+
+def make_zip_source(archive: str, member: str) -> str:
+    return f"{ZIP_SCHEME}{archive}{_ZIP_SEPARATOR}{member.lstrip('/')}"
+
+
+def _open_archive(archive: str) -> zipfile.ZipFile:
+    """アーカイブを開く (中央ディレクトリを読み直さないよう、プロセス内で使い回す)
+
+    fork したプロセスではファイルの読み込み位置が親と共有されてしまうため、開き直す。
+    """
+    key = (os.getpid(), os.stat(archive).st_mtime_ns)
+    with _archives_lock:
+        if (entry := _archives.get(archive)) is not None and entry[:2] == key:
+            return entry[2]
+        zf = zipfile.ZipFile(archive)
+        if entry is not None and entry[0] == key[0]:
+            entry[2].close()
+        _archives[archive] = (*key, zf)
+        return zf
+
+
+def list_zip_members(archive: str) -> list[str]:
+    """アーカイブ内のファイルのパスの一覧"""
+    return [info.filename for info in _open_archive(archive).infolist()]
+
+
+def source_parent(source: str) -> str:
+    """読み込み元のファイルがあるディレクトリ (同じ形式)"""
+    if (zip_source := split_zip_source(source)) is not None:
+        archive, member = zip_source
+        return make_zip_source(archive, posixpath.dirname(member))
+    return str(Path(source).parent)
+
+
+def join_source(base: str, relative: str) -> str:
+    """ディレクトリ base からの相対パスを、同じ形式の読み込み元にする"""
+    if (zip_source := split_zip_source(base)) is not None:
+        archive, member_dir = zip_source
+        member = posixpath.normpath(posixpath.join(member_dir, relative))
+        return make_zip_source(archive, member)
+    return str((Path(base) / relative).resolve())
+
+
+def source_stat(source: str) -> tuple[str, int, int]:
+    """読み込み元の (絶対パス, サイズ, 更新時刻) を返す
+
+    アーカイブ内のファイルの更新時刻には、アーカイブ自体の更新時刻を使う。
+    """
+    if (zip_source := split_zip_source(source)) is not None:
+        archive, member = zip_source
+        info = _open_archive(archive).getinfo(member)
+        identity = make_zip_source(str(Path(archive).resolve()), member)
+        return (identity, info.file_size, os.stat(archive).st_mtime_ns)
+    stat = os.stat(source)
+    return (str(Path(source).resolve()), stat.st_size, stat.st_mtime_ns)
+
+
+def open_source(source: str) -> IO[bytes]:
+    """読み込み元をバイナリのストリームとして開く"""
+    if (zip_source := split_zip_source(source)) is not None:
+        archive, member = zip_source
+        return _open_archive(archive).open(member)
+    return open(source, "rb")
+
+
+@contextmanager
+def open_xml(source: str) -> Iterator[str | IO[bytes]]:
+    """lxml の parse や iterparse に渡せる形で読み込み元を開く
+
+    ローカルのファイルはパスのまま (lxml が直接読むほうが速い)、アーカイブ内のファイルはストリームとして渡す。
+    """
+    if split_zip_source(source) is None:
+        yield source
+        return
+    with open_source(source) as f:
+        yield f
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import date
-from typing import Any, Literal, Union
+from typing import Any, Iterator, Literal, Mapping, Union
 
 import numpy as np
 
@@ -23,13 +23,77 @@ class LineStringCollection:
 
 @dataclass
 class PolygonCollection:
-    __slots__ = ("materials", "polygons", "textures", "uvs")
-    polygons: list[list[np.ndarray]]
+    """マルチパートのポリゴン
+
+    GeoArrow と同様に、全ての頂点座標を1つの連続したバッファに格納し、
+    リングとポリゴンの境界をオフセットの配列で表す。
+
+    i 番目のポリゴンは polygon_offsets[i] 番目から polygon_offsets[i + 1] - 1 番目までのリングからなり、
+    j 番目のリングの頂点は coords[ring_offsets[j]:ring_offsets[j + 1]] である。
+    各ポリゴンの最初のリングが外周、残りが内周である。
+
+    アピアランスを読み込んだ場合は、マテリアル・テクスチャをポリゴンごとの int32 の配列
+    (該当なしは -1) で、テクスチャ座標を coords と同じ ring_offsets を共有する1つのバッファで持つ。
+    """
+
+    __slots__ = (
+        "coords",
+        "materials",
+        "polygon_offsets",
+        "ring_offsets",
+        "textures",
+        "uvs",
+    )
+
+    coords: np.ndarray
+    """全ての頂点座標 (shape: (頂点数, 3), dtype: float64)"""
+
+    ring_offsets: np.ndarray
+    """各リングの coords 上の開始位置 (shape: (リング数 + 1,))"""
+
+    polygon_offsets: np.ndarray
+    """各ポリゴンの ring_offsets 上の開始位置 (shape: (ポリゴン数 + 1,))"""
 
     # appearance
-    materials: list[int | None] | None
-    textures: list[int | None] | None
-    uvs: list[list[np.ndarray] | None] | None
+    materials: np.ndarray | None
+    """各ポリゴンのマテリアルの番号 (shape: (ポリゴン数,), dtype: int32, なしは -1)"""
+
+    textures: np.ndarray | None
+    """各ポリゴンの外周のテクスチャの番号 (shape: (ポリゴン数,), dtype: int32, なしは -1)"""
+
+    uvs: np.ndarray | None
+    """全ての頂点のテクスチャ座標 (shape: (頂点数, 2), dtype: float32)
+
+    j 番目のリングのテクスチャ座標は uvs[ring_offsets[j]:ring_offsets[j + 1]] である。
+    テクスチャ座標のないリングの部分は NaN で、どのリングにもない場合は None とする。
+    """
+
+    @property
+    def num_polygons(self) -> int:
+        """ポリゴンの数"""
+        return len(self.polygon_offsets) - 1
+
+    def iter_rings(self, index: int) -> Iterator[np.ndarray]:
+        """index 番目のポリゴンのリングの座標を (coords のビューとして) 返す"""
+        coords = self.coords
+        ring_offsets = self.ring_offsets
+        start, end = self.polygon_offsets[index : index + 2]
+        for i in range(start, end):
+            yield coords[ring_offsets[i] : ring_offsets[i + 1]]
+
+    def iter_ring_uvs(self, index: int) -> Iterator[np.ndarray]:
+        """index 番目のポリゴンのリングのテクスチャ座標を (uvs のビューとして) 返す"""
+        if (uvs := self.uvs) is None:
+            return
+        ring_offsets = self.ring_offsets
+        start, end = self.polygon_offsets[index : index + 2]
+        for i in range(start, end):
+            yield uvs[ring_offsets[i] : ring_offsets[i + 1]]
+
+    @property
+    def polygons(self) -> list[list[np.ndarray]]:
+        """ポリゴンごとのリングの座標のリスト (互換性のため)"""
+        return [list(self.iter_rings(i)) for i in range(self.num_polygons)]
 
 
 Geometry = Union[PolygonCollection, LineStringCollection, PointCollection]
@@ -139,4 +203,9 @@ class Appearance:
     materials: list[Material]
     textures: list[Texture]
     target_to_material: dict[str, int]
-    ring_to_texture: dict[str, tuple[int, np.ndarray]]
+    ring_to_texture: Mapping[str, tuple[int, np.ndarray]]
+    polygon_to_material: dict[str, int] | None = None
+    """ポリゴンの gml:id -> マテリアル (面や CompositeSurface への指定をポリゴンまで伝播済み)
+
+    文書全体を読み込んでいない場合は None で、ポリゴンごとに target_to_material を引く。
+    """
@@ -0,0 +1,159 @@
+"""PLATEAU の地形モデル (TIN) を PLY メッシュにする (QGIS に依存しない)"""
+
+import shutil
+import tempfile
+from itertools import islice
+from typing import Iterator
+
+import lxml.etree as et
+import numpy as np
+
+from .plateau.namespaces import BASE_NS
+from .plateau.sources import open_xml
+
+_PLY_HEADER_TEMPLATE = """ply
+format binary_little_endian 1.0
+comment crs: GEOGCRS["JGD2011",DATUM["Japanese Geodetic Datum 2011",ELLIPSOID["GRS 1980",6378137,298.257222101,LENGTHUNIT["metre",1]]],PRIMEM["Greenwich",0,ANGLEUNIT["degree",0.0174532925199433]],CS[ellipsoidal,2],AXIS["geodetic latitude (Lat)",north,ORDER[1],ANGLEUNIT["degree",0.0174532925199433]],AXIS["geodetic longitude (Lon)",east,ORDER[2],ANGLEUNIT["degree",0.0174532925199433]],USAGE[SCOPE["Horizontal component of 3D system."],AREA["Japan - onshore and offshore."],BBOX[17.09,122.38,46.05,157.65]],ID["EPSG",6668]]
+element vertex {n_verts}
+property float x
+property float y
+property float z
+element face {n_faces}
+property list uchar uint vertex_indices
+end_header\n"""
+
+_PLY_FACE_DTYPE = np.dtype([("n", "u1"), ("indices", "<u4", 3)])
+"""PLY の面要素 (頂点数 + 頂点インデックス x 3)"""
+
+
+def _parse_triangles(pos_lists: list[str]) -> np.ndarray:
+    """三角形の posList の文字列から、各三角形の3頂点の座標 (shape: (三角形数, 3, 3)) を得る
+
+    posList は始点を終点として繰り返す4頂点のものと、3頂点のものがありうる。
+    """
+    n_tris = len(pos_lists)
+    values = np.fromstring(" ".join(pos_lists), dtype=np.float64, sep=" ")
+    for n_values in (12, 9):
+        if len(values) == n_tris * n_values:
+            return values.reshape(n_tris, n_values // 3, 3)[:, :3]
+
+    # 頂点数が揃っていない場合は1つずつ読む
+    tris = np.empty((n_tris, 3, 3), dtype=np.float64)
+    for i, pos_list in enumerate(pos_lists):
+        tris[i] = np.fromstring(pos_list, dtype=np.float64, sep=" ")[:9].reshape(3, 3)
+    return tris
+
+
+class _VertexIndexer:
+    """三角形の頂点を水平位置で同一視して、通し番号を振る
+
+    頂点の番号は最初に現れた順とし、高さには最初に現れた頂点のものを使う。
+
+    既出の頂点は、水平位置 (経度, 緯度) を複素数にしたキーのソート済み配列 (ラン) で管理する。
+    まとまりを追加するたびに全体を作り直さなくて済むように、ランを複数持ち、
+    同程度の大きさのランどうしを随時マージする。
+    """
+
+    def __init__(self):
+        self._runs: list[tuple[np.ndarray, np.ndarray]] = []
+        self.num_vertices = 0
+
+    def add(self, tris: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """三角形のまとまりを追加し、新たに現れた頂点と各三角形の頂点インデックスを返す"""
+        verts = tris.reshape(-1, 3)
+        keys = np.empty(len(verts), dtype=np.complex128)
+        keys.real = verts[:, 1]  # x (経度)
+        keys.imag = verts[:, 0]  # y (緯度)
+        uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        # 既出の頂点を探す
+        uniq_ids = np.empty(len(uniq), dtype=np.uint32)
+        found = np.zeros(len(uniq), dtype=bool)
+        for run_keys, run_ids in self._runs:
+            pos = np.searchsorted(run_keys, uniq)
+            hit = pos < len(run_keys)
+            hit[hit] = run_keys[pos[hit]] == uniq[hit]
+            uniq_ids[hit] = run_ids[pos[hit]]
+            found |= hit
+
+        # 新しい頂点には、このまとまりの中で最初に現れた順に番号を振る
+        new = np.flatnonzero(~found)
+        new_in_order = new[np.argsort(first[new], kind="stable")]
+        uniq_ids[new_in_order] = np.arange(
+            self.num_vertices, self.num_vertices + len(new)
+        )
+        self.num_vertices += len(new)
+        if len(new):
+            self._push_run(uniq[new], uniq_ids[new])
+
+        points = verts[first[new_in_order]][:, [1, 0, 2]].astype("<f4")
+        indices = uniq_ids[inverse.ravel()].reshape(-1, 3)
+        return points, indices
+
+    def _push_run(self, keys: np.ndarray, ids: np.ndarray) -> None:
+        runs = self._runs
+        runs.append((keys, ids))
+        while len(runs) >= 2 and len(runs[-2][0]) <= 2 * len(runs[-1][0]):
+            (keys1, ids1), (keys2, ids2) = runs.pop(-2), runs.pop()
+            keys = np.concatenate([keys1, keys2])
+            order = np.argsort(keys, kind="stable")
+            runs.append((keys[order], np.concatenate([ids1, ids2])[order]))
+
+
+def _iter_triangle_pos_lists(src_filename: str) -> Iterator[str]:
+    """dem:TINRelief 以下の三角形の posList の文字列を逐次読み込んで返す"""
+    relief_tag = f"{{{BASE_NS['dem']}}}TINRelief"
+    triangle_tag = f"{{{BASE_NS['gml']}}}Triangle"
+    pos_list_tag = f"{{{BASE_NS['gml']}}}posList"
+
+    depth = 0
+    count = 0
+    with open_xml(src_filename) as src:
+        for event, elem in et.iterparse(
+            src, events=("start", "end"), tag=(relief_tag, triangle_tag)
+        ):
+            if elem.tag == relief_tag:
+                depth += 1 if event == "start" else -1
+            elif event == "end":
+                if depth > 0:
+                    for pos_list in elem.iter(pos_list_tag):
+                        yield pos_list.text
+
+                # 処理済みの三角形をある程度まとめて解放する
+                count += 1
+                if count % 1024 == 0:
+                    parent = elem.getparent()
+                    del parent[: parent.index(elem) + 1]
+
+
+def convert_citygml_relief_to_ply(
+    src_filename: str, dst_filename: str, chunk_size: int = 100_000
+) -> None:
+    """地形モデル (TIN) の CityGML を PLY メッシュに変換する
+
+    ファイル全体を読み込まずに、三角形を chunk_size 個ずつ処理して頂点と面を一時ファイルに書き出し、
+    最後に個数の確定したヘッダと結合する。
+    """
+    indexer = _VertexIndexer()
+    n_faces = 0
+
+    with tempfile.TemporaryFile() as verts_file, tempfile.TemporaryFile() as faces_file:
+        pos_lists = _iter_triangle_pos_lists(src_filename)
+        while chunk := list(islice(pos_lists, chunk_size)):
+            points, indices = indexer.add(_parse_triangles(chunk))
+            faces = np.empty(len(indices), dtype=_PLY_FACE_DTYPE)
+            faces["n"] = 3
+            faces["indices"] = indices
+            points.tofile(verts_file)
+            faces.tofile(faces_file)
+            n_faces += len(faces)
+
+        with open(dst_filename, "wb") as f:
+            f.write(
+                _PLY_HEADER_TEMPLATE.format(
+                    n_verts=indexer.num_vertices, n_faces=n_faces
+                ).encode("ascii")
+            )
+            for tmp in (verts_file, faces_file):
+                tmp.seek(0)
+                shutil.copyfileobj(tmp, f)
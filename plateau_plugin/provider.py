@@ -21,6 +21,7 @@ from pathlib import Path
 from qgis.core import QgsProcessingProvider
 from qgis.PyQt.QtGui import QIcon
 
+from .algorithms.load_batch import PlateauBatchLoaderAlgorithm
 from .algorithms.load_dem import PlateauDEMLoaderAlrogithm
 from .algorithms.load_vector import PlateauVectorLoaderAlrogithm
 
@@ -28,6 +29,7 @@ from .algorithms.load_vector import PlateauVectorLoaderAlrogithm
 class PlateauProcessingProvider(QgsProcessingProvider):
     def loadAlgorithms(self, *args, **kwargs):
         self.addAlgorithm(PlateauVectorLoaderAlrogithm())
+        self.addAlgorithm(PlateauBatchLoaderAlgorithm())
         self.addAlgorithm(PlateauDEMLoaderAlrogithm())
 
     def id(self, *args, **kwargs):
@@ -0,0 +1,116 @@
+"""PLATEAU のジオメトリを ISO WKB にする (QGIS に依存しない)"""
+
+import numpy as np
+
+from .plateau.types import LineStringCollection, PolygonCollection
+
+# ISO WKB の型コード
+_WKB_LINESTRING = 2
+_WKB_POLYGON = 3
+_WKB_MULTILINESTRING = 5
+_WKB_MULTIPOLYGON = 6
+_WKB_Z_OFFSET = 1000
+
+_WKB_HEADER_SIZE = 9
+"""バイトオーダー (1バイト)、型 (4バイト)、要素数 (4バイト)"""
+
+
+def _wkb_headers(wkb_type: int, counts: np.ndarray) -> np.ndarray:
+    """(バイトオーダー, 型, 要素数) のヘッダを要素数の配列の長さだけ並べる"""
+    headers = np.empty(len(counts), dtype=[("o", "u1"), ("t", "<u4"), ("n", "<u4")])
+    headers["o"] = 1  # little endian
+    headers["t"] = wkb_type
+    headers["n"] = counts
+    return headers.view(np.uint8).reshape(-1, _WKB_HEADER_SIZE)
+
+
+def _to_wkb_coords(coords: np.ndarray, as2d: bool) -> np.ndarray:
+    """(緯度, 経度, 高さ) の座標を、(経度, 緯度[, 高さ]) の little endian の float64 のバイト列にする"""
+    axes = [1, 0] if as2d else [1, 0, 2]
+    return np.ascontiguousarray(coords[:, axes], dtype="<f8").view(np.uint8).ravel()
+
+
+def _scatter_wkb(
+    size: int,
+    coord_bytes: np.ndarray,
+    chunks: list[tuple[np.ndarray, np.ndarray]],
+) -> bytes:
+    """WKB のバイト列を組み立てる
+
+    chunks は (書き込む位置の配列, 書き込むバイト列 (位置の数 x バイト数)) のリスト。
+    chunks で埋まらない残りの部分には、座標のバイト列が先頭から順に入る。
+    """
+    buf = np.empty(size, dtype=np.uint8)
+    is_coord = np.ones(size, dtype=bool)
+    for positions, values in chunks:
+        index = positions[:, np.newaxis] + np.arange(values.shape[1])
+        buf[index] = values
+        is_coord[index] = False
+    buf[is_coord] = coord_bytes
+    return buf.tobytes()
+
+
+def polygons_to_wkb(src_geom: PolygonCollection, as2d: bool) -> bytes:
+    """PolygonCollection を MultiPolygon(Z) の WKB にする"""
+    dim = 2 if as2d else 3
+    z_offset = 0 if as2d else _WKB_Z_OFFSET
+    ring_offsets = src_geom.ring_offsets
+    polygon_offsets = src_geom.polygon_offsets
+    num_polygons = len(polygon_offsets) - 1
+
+    # 各リング・各ポリゴンのヘッダの位置を求める
+    points_per_ring = np.diff(ring_offsets)
+    rings_per_polygon = np.diff(polygon_offsets)
+    ring_sizes = 4 + points_per_ring * (8 * dim)
+    polygon_index = np.repeat(np.arange(num_polygons), rings_per_polygon)
+    ring_starts = (
+        _WKB_HEADER_SIZE * (polygon_index + 2) + np.cumsum(ring_sizes) - ring_sizes
+    )
+    polygon_sizes = _WKB_HEADER_SIZE + np.bincount(
+        polygon_index, weights=ring_sizes, minlength=num_polygons
+    ).astype(np.int64)
+    polygon_starts = _WKB_HEADER_SIZE + np.cumsum(polygon_sizes) - polygon_sizes
+    size = _WKB_HEADER_SIZE + int(polygon_sizes.sum())
+
+    return _scatter_wkb(
+        size,
+        _to_wkb_coords(src_geom.coords, as2d),
+        [
+            (
+                np.zeros(1, dtype=np.int64),
+                _wkb_headers(_WKB_MULTIPOLYGON + z_offset, np.array([num_polygons])),
+            ),
+            (polygon_starts, _wkb_headers(_WKB_POLYGON + z_offset, rings_per_polygon)),
+            (
+                ring_starts,
+                points_per_ring.astype("<u4").view(np.uint8).reshape(-1, 4),
+            ),
+        ],
+    )
+
+
+def lines_to_wkb(src_geom: LineStringCollection, as2d: bool) -> bytes:
+    """LineStringCollection を MultiLineString(Z) の WKB にする"""
+    dim = 2 if as2d else 3
+    z_offset = 0 if as2d else _WKB_Z_OFFSET
+    num_lines = len(src_geom.lines)
+
+    points_per_line = np.array([len(line) for line in src_geom.lines], dtype=np.int64)
+    line_sizes = _WKB_HEADER_SIZE + points_per_line * (8 * dim)
+    line_starts = _WKB_HEADER_SIZE + np.cumsum(line_sizes) - line_sizes
+    size = _WKB_HEADER_SIZE + int(line_sizes.sum())
+    coords = (
+        np.concatenate(src_geom.lines) if num_lines else np.empty((0, 3), np.float64)
+    )
+
+    return _scatter_wkb(
+        size,
+        _to_wkb_coords(coords, as2d),
+        [
+            (
+                np.zeros(1, dtype=np.int64),
+                _wkb_headers(_WKB_MULTILINESTRING + z_offset, np.array([num_lines])),
+            ),
+            (line_starts, _wkb_headers(_WKB_LINESTRING + z_offset, points_per_line)),
+        ],
+    )
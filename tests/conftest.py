@@ -4,14 +4,24 @@ from pathlib import Path
 from typing import Iterable
 
 import pytest
-from qgis.core import QgsApplication
-from qgis.gui import QgsGui
 
 from plateau_plugin import classFactory
 
+try:
+    from qgis.core import QgsApplication
+    from qgis.gui import QgsGui
+except ImportError:
+    # QGIS がない環境では、QGIS を使わないテスト (パーサーなど) だけを実行する
+    QgsApplication = None
+    collect_ignore = ["test_plugin.py"]
+
 
 @pytest.fixture(autouse=True, scope="session")
 def qgis_app(tmp_path_factory) -> Iterable[QgsApplication]:
+    if QgsApplication is None:
+        yield None
+        return
+
     # profile directory
     profile_path = tmp_path_factory.mktemp("profile")
     os.environ["QGIS_CUSTOM_CONFIG_PATH"] = str(profile_path)
@@ -41,3 +51,11 @@ def provider(qgis_app: QgsApplication) -> Iterable[None]:
     yield None
 
     plugin.unload()
+
+
+@pytest.fixture(scope="session")
+def synthetic_dataset(tmp_path_factory) -> dict[str, Path]:
+    """ベンチマーク用の合成データ (小規模) を書き出して、データの種類 -> ファイルのパス を返す"""
+    from benchmarks.synthetic import write_dataset
+
+    return write_dataset(tmp_path_factory.mktemp("synthetic"), scale=9)
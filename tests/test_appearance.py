@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import pickle
+from pathlib import Path
+
+import lxml.etree as et
+import numpy as np
+import pytest
+
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+from plateau_plugin.plateau.parse.appearance import (
+    RingTextures,
+    _ElementRingTextures,
+    _map_ring_textures,
+    _MappedRingTextures,
+    lookup_material,
+    parse_appearances,
+    resolve_polygon_materials,
+    scan_appearances,
+)
+from plateau_plugin.plateau.parse.index import build_index
+from plateau_plugin.plateau.types import PolygonCollection
+from tests.utils import summarize
+
+
+@pytest.mark.parametrize("mode", ["streaming", "index"])
+def test_materials_resolved_without_document(
+    synthetic_dataset: dict[str, Path], mode: str
+):
+    filename = str(synthetic_dataset["bldg"])
+    settings = ParserSettings(load_apperance=True, load_semantic_parts=True)
+    dom = PlateauCityGmlParser(filename, settings)
+    assert dom.appearance is not None
+    assert dom.appearance.polygon_to_material is not None
+    cityobjs = list(dom.iter_cityobjs())
+
+    # 面 (MultiSurface) へのマテリアルの指定が、構成するポリゴンまで伝播している
+    materials = np.concatenate(
+        [
+            cityobj.geometry.materials
+            for _, cityobj in cityobjs
+            if isinstance(cityobj.geometry, PolygonCollection)
+        ]
+    )
+    assert (materials == 1).any()
+
+    if mode == "streaming":
+        parser = PlateauCityGmlParser(
+            filename,
+            ParserSettings(
+                load_apperance=True, load_semantic_parts=True, streaming=True
+            ),
+        )
+    else:
+        parser = PlateauCityGmlParser(filename, settings, index=build_index(filename))
+    assert parser.appearance is not None
+    assert parser.appearance.polygon_to_material is None
+    assert summarize(parser.iter_cityobjs()) == summarize(cityobjs)
+
+
+def test_material_index_zero_is_applied():
+    # 最初のマテリアル (番号 0) も「マテリアルなし」と区別して適用する
+    gml = "http://www.opengis.net/gml"
+    root = et.fromstring(
+        f'<Root xmlns:gml="{gml}">'
+        '<gml:MultiSurface gml:id="ms"><gml:surfaceMember>'
+        '<gml:Polygon gml:id="p0"/></gml:surfaceMember></gml:MultiSurface>'
+        '<gml:MultiSurface gml:id="outer"><gml:surfaceMember>'
+        '<gml:CompositeSurface gml:id="cs"><gml:surfaceMember>'
+        '<gml:Polygon gml:id="p1"/></gml:surfaceMember></gml:CompositeSurface>'
+        "</gml:surfaceMember></gml:MultiSurface>"
+        '<gml:MultiSurface gml:id="other"><gml:surfaceMember>'
+        '<gml:Polygon gml:id="p2"/></gml:surfaceMember></gml:MultiSurface>'
+        "</Root>"
+    )
+    target_to_material = {"ms": 0, "outer": 0, "p2": 0}
+    polygons = {p.get(f"{{{gml}}}id"): p for p in root.iter(f"{{{gml}}}Polygon")}
+    for poly_id in ("p0", "p1", "p2"):
+        assert lookup_material(polygons[poly_id], target_to_material) == 0
+    assert lookup_material(polygons["p0"], {}) is None
+
+    resolved = resolve_polygon_materials(root, target_to_material)
+    assert {poly_id: resolved.get(poly_id) for poly_id in polygons} == {
+        "p0": 0,
+        "p1": 0,
+        "p2": 0,
+    }
+
+
+def test_mapped_ring_textures_are_closed(synthetic_dataset: dict[str, Path]):
+    filename = str(synthetic_dataset["bldg"])
+    settings = ParserSettings(load_apperance=True, streaming=True)
+    parser = PlateauCityGmlParser(filename, settings)
+    assert parser.appearance is not None
+    ring_to_texture = parser.appearance.ring_to_texture
+    assert isinstance(ring_to_texture, _MappedRingTextures)
+
+    cityobjs = list(parser.iter_cityobjs())
+    assert any(
+        isinstance(cityobj.geometry, PolygonCollection)
+        and cityobj.geometry.uvs is not None
+        for _, cityobj in cityobjs
+    )
+    assert ring_to_texture._data is None
+
+    # 閉じた後に引かれた場合は開き直す
+    with ring_to_texture:
+        ring_id = next(iter(ring_to_texture))
+        (_, uv) = ring_to_texture[ring_id]
+        assert uv.shape[1] == 2
+    assert ring_to_texture._data is None
+
+
+def test_ring_textures_is_abstract():
+    with pytest.raises(TypeError):
+        RingTextures({}, np.zeros(0, dtype=np.int32))  # type: ignore
+
+
+def _decoded(ring_to_texture: RingTextures) -> dict[str, tuple[int, bytes]]:
+    return {
+        ring_id: (texture, uv.astype("<f4").tobytes())
+        for ring_id, (texture, uv) in ring_to_texture.items()
+    }
+
+
+def test_mapped_ring_textures_match_elements(synthetic_dataset: dict[str, Path]):
+    filename = str(synthetic_dataset["bldg"])
+    [dom] = parse_appearances(et.parse(filename).getroot())
+    [streamed] = scan_appearances(filename)
+    assert isinstance(dom.ring_to_texture, _ElementRingTextures)
+    assert isinstance(streamed.ring_to_texture, _MappedRingTextures)
+
+    expected = _decoded(dom.ring_to_texture)
+    assert expected
+    with streamed.ring_to_texture:
+        assert _decoded(streamed.ring_to_texture) == expected
+
+    # ワーカープロセスに渡せる (要素はテキストとして送る)
+    for ring_to_texture in (dom.ring_to_texture, streamed.ring_to_texture):
+        copied = pickle.loads(pickle.dumps(ring_to_texture))
+        assert type(copied) is type(ring_to_texture)
+        with copied:
+            assert _decoded(copied) == expected
+
+
+def test_map_ring_textures_falls_back_to_elements(synthetic_dataset: dict[str, Path]):
+    # ファイル中に対応する Appearance が見つからなければ要素から読む
+    filename = str(synthetic_dataset["bldg"])
+    root = et.parse(filename).getroot()
+    [app] = parse_appearances(root)
+    prefix = root.find(".//{*}Appearance").prefix
+    ring_to_texture = app.ring_to_texture
+    assert _map_ring_textures(filename, prefix, 1, ring_to_texture) is ring_to_texture
+
+
+def test_scan_appearances_skips_city_objects(
+    synthetic_dataset: dict[str, Path], tmp_path: Path
+):
+    # 都市オブジェクトの部分はパースしないので、そこが壊れていても Appearance は読める
+    src = synthetic_dataset["bldg"]
+    [expected] = parse_appearances(et.parse(str(src)).getroot())
+    data = src.read_bytes()
+    start = data.index(b"<bldg:Building ")
+    broken = tmp_path / src.name
+    broken.write_bytes(data[:start] + b"<bldg:Broken>" + data[start:])
+    with pytest.raises(et.XMLSyntaxError):
+        et.parse(str(broken))
+
+    [scanned] = scan_appearances(str(broken))
+    assert scanned.materials == expected.materials
+    assert scanned.textures == expected.textures
+    assert scanned.target_to_material == expected.target_to_material
+    with scanned.ring_to_texture:
+        assert _decoded(scanned.ring_to_texture) == _decoded(expected.ring_to_texture)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import re
+import shutil
+from pathlib import Path
+
+import pytest
+
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+
+_MEASURED_HEIGHT = re.compile(
+    r'<bldg:measuredHeight uom="m">[^<]*</bldg:measuredHeight>'
+)
+_USAGE = re.compile(r"<bldg:usage [^>]*>[^<]*</bldg:usage>")
+
+
+@pytest.fixture
+def bldg_dataset(synthetic_dataset: dict[str, Path], tmp_path: Path) -> Path:
+    # ファイルを書き換えるので、コードリストごと複製して使う
+    root = synthetic_dataset["bldg"].parents[2]
+    shutil.copytree(root / "codelists", tmp_path / "codelists")
+    dst = tmp_path / "udx" / "bldg" / synthetic_dataset["bldg"].name
+    dst.parent.mkdir(parents=True)
+    shutil.copy(synthetic_dataset["bldg"], dst)
+    return dst
+
+
+def _attributes(filename: Path) -> dict[str, list]:
+    """gml:id (リスク属性は親の gml:id) -> 属性の (名前, 値) のリスト"""
+    result: dict[str, list] = {}
+    for _, cityobj in PlateauCityGmlParser(
+        str(filename), ParserSettings()
+    ).iter_cityobjs():
+        key = (
+            cityobj.id
+            if cityobj.parent is None
+            else f"{cityobj.parent.id}/{cityobj.type}"
+        )
+        result[key] = list(cityobj.attributes.items())
+    return result
+
+
+def test_attribute_values(bldg_dataset: Path):
+    attributes = _attributes(bldg_dataset)
+    assert attributes["bldg_0"] == [
+        ("class", ["普通建物"]),
+        ("usage", ["住宅"]),
+        ("measuredHeight", 51.1),
+        ("storeysAboveGround", 17),
+        ("address", "日本 東京都千代田区"),
+        ("buildingID", "13101-bldg-0"),
+        ("prefecture", "東京都"),
+        ("city", "東京都千代田区"),
+    ]
+    assert attributes["bldg_0/uro:BuildingRiverFloodingRiskAttribute"] == [
+        ("description", "1"),
+        ("rank", "0.5m未満"),
+        ("depth", 0.78),
+        ("adminType", "都道府県"),
+        ("scale", "L1（計画規模）"),  # noqa: RUF001
+    ]
+
+
+def test_attribute_order_follows_definition(bldg_dataset: Path):
+    # 文書中の順番によらず、定義の順に出力する
+    expected = _attributes(bldg_dataset)
+    text = bldg_dataset.read_text(encoding="utf-8")
+    moved = []
+
+    def take(m: re.Match) -> str:
+        moved.append(m.group(0))
+        return ""
+
+    text = _MEASURED_HEIGHT.sub(take, text)
+    assert moved
+    heights = iter(moved)
+    text = re.sub(
+        r"(<bldg:Building gml:id=\"[^\"]*\">)",
+        lambda m: m.group(1) + next(heights),
+        text,
+    )
+    bldg_dataset.write_text(text, encoding="utf-8")
+    assert _attributes(bldg_dataset) == expected
+
+
+def test_missing_list_attribute_is_empty(bldg_dataset: Path):
+    expected = _attributes(bldg_dataset)["bldg_0"]
+    text = bldg_dataset.read_text(encoding="utf-8")
+    bldg_dataset.write_text(_USAGE.sub("", text), encoding="utf-8")
+    assert _attributes(bldg_dataset)["bldg_0"] == [
+        (name, [] if name == "usage" else value) for name, value in expected
+    ]
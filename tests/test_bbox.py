@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+from plateau_plugin.plateau.parse.index import build_index, is_geographic_srs
+from tests.utils import summarize
+
+
+def _parse(filename: str, settings: ParserSettings, use_index: bool = False):
+    index = build_index(filename) if use_index else None
+    return summarize(
+        PlateauCityGmlParser(filename, settings, index=index).iter_cityobjs()
+    )
+
+
+def _first_cityobj_bounds(filename: str) -> tuple[float, float, float, float]:
+    min_lon, min_lat, max_lon, max_lat = build_index(filename).bounds[0].tolist()
+    return (min_lon, min_lat, max_lon, max_lat)
+
+
+@pytest.mark.parametrize("feature_type", ["bldg", "tran"])
+@pytest.mark.parametrize("mode", ["dom", "streaming", "index"], ids=lambda mode: mode)
+def test_bbox_skips_outside_cityobjs(
+    synthetic_dataset: dict[str, Path], feature_type: str, mode: str
+):
+    filename = str(synthetic_dataset[feature_type])
+    bbox = _first_cityobj_bounds(filename)
+    index = build_index(filename)
+    inside = set(index.intersecting(bbox).tolist())
+    assert 0 < len(inside) < len(index)
+
+    expected = [
+        item for item in _parse(filename, ParserSettings()) if item[0] in inside
+    ]
+    settings = ParserSettings(bbox=bbox, streaming=mode == "streaming")
+    assert _parse(filename, settings, use_index=mode == "index") == expected
+
+
+@pytest.mark.parametrize("use_index", [False, True])
+def test_bbox_ignores_envelope_in_other_crs(
+    synthetic_dataset: dict[str, Path], tmp_path: Path, use_index: bool
+):
+    # 平面直角座標系の Envelope は経度・緯度と比較できないので、範囲が不明なものとして読む
+    text = synthetic_dataset["bldg"].read_text(encoding="utf-8")
+    filename = tmp_path / synthetic_dataset["bldg"].name
+    filename.write_text(text.replace("EPSG/0/6697", "EPSG/0/6677"), encoding="utf-8")
+
+    index = build_index(str(filename))
+    assert np.isnan(index.bounds).all()
+
+    far_away = (0.0, 0.0, 1.0, 1.0)
+    expected = _parse(str(filename), ParserSettings())
+    settings = ParserSettings(bbox=far_away)
+    assert _parse(str(filename), settings, use_index=use_index) == expected
+
+
+def test_is_geographic_srs():
+    assert is_geographic_srs(None)
+    assert is_geographic_srs("http://www.opengis.net/def/crs/EPSG/0/6697")
+    assert is_geographic_srs("urn:ogc:def:crs:EPSG::6668")
+    assert is_geographic_srs("EPSG:6697")
+    assert not is_geographic_srs("http://www.opengis.net/def/crs/EPSG/0/6677")
+    assert not is_geographic_srs("EPSG:66970")
@@ -0,0 +1,26 @@
+from pathlib import Path
+
+from benchmarks.suite import BenchmarkReport, compare_reports, run_benchmarks
+from benchmarks.synthetic import write_dataset
+
+
+def test_benchmark_report_roundtrip(tmp_path: Path):
+    files = write_dataset(tmp_path / "data", scale=4)
+    assert set(files) == {"bldg", "tran", "urf", "dem"}
+
+    report = run_benchmarks(
+        files, scale=4, repeat=1, names=["parse_bldg", "parse_tran_semantic_parts"]
+    )
+    assert [r.name for r in report.results] == [
+        "parse_bldg",
+        "parse_tran_semantic_parts",
+    ]
+    assert all(r.items > 0 and len(r.times) == 1 for r in report.results)
+
+    path = tmp_path / "result.json"
+    report.save(path)
+    loaded = BenchmarkReport.load(path)
+    assert loaded.results == report.results
+
+    comparisons = compare_reports(report, loaded)
+    assert [c.ratio for c in comparisons] == [1.0, 1.0]
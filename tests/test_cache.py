@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+from plateau_plugin.plateau.parse import cache as cache_module
+from plateau_plugin.plateau.parse.cache import ParseCache
+from plateau_plugin.plateau.types import PolygonCollection
+from tests.utils import summarize
+
+
+@pytest.fixture
+def bldg_file(synthetic_dataset: dict[str, Path], tmp_path: Path) -> str:
+    # 更新時刻を変えるテストがあるので複製して使う
+    dst = tmp_path / "udx" / "bldg" / synthetic_dataset["bldg"].name
+    dst.parent.mkdir(parents=True)
+    shutil.copy(synthetic_dataset["bldg"], dst)
+    return str(dst)
+
+
+def _parse(filename: str, settings: ParserSettings, cache: ParseCache | None):
+    return summarize(
+        PlateauCityGmlParser(filename, settings, cache=cache).iter_cityobjs()
+    )
+
+
+def test_cache_hit_replays_parse_result(bldg_file: str, tmp_path: Path):
+    cache = ParseCache(tmp_path / "cache")
+    settings = ParserSettings(load_semantic_parts=True, load_apperance=True)
+    expected = _parse(bldg_file, settings, None)
+
+    assert cache.load(bldg_file, settings) is None
+    assert _parse(bldg_file, settings, cache) == expected
+    assert len(cache.entries()) == 1
+
+    assert cache.load(bldg_file, settings) is not None
+    assert _parse(bldg_file, settings, cache) == expected
+
+
+def test_cached_arrays_are_writable(bldg_file: str, tmp_path: Path):
+    # キャッシュから読んだジオメトリも、パースした場合と同じく書き換えられる
+    cache = ParseCache(tmp_path / "cache")
+    settings = ParserSettings(load_apperance=True)
+    _parse(bldg_file, settings, cache)
+    geometries = [
+        cityobj.geometry
+        for _, cityobj in PlateauCityGmlParser(
+            bldg_file, settings, cache=cache
+        ).iter_cityobjs()
+        if isinstance(cityobj.geometry, PolygonCollection)
+    ]
+    assert geometries
+    assert any(geom.uvs is not None for geom in geometries)
+    for geom in geometries:
+        for array in (geom.coords, geom.ring_offsets, geom.materials, geom.uvs):
+            if array is not None:
+                assert array.flags.writeable
+
+
+def test_cache_miss_on_different_settings(bldg_file: str, tmp_path: Path):
+    cache = ParseCache(tmp_path / "cache")
+    _parse(bldg_file, ParserSettings(), cache)
+    assert cache.load(bldg_file, ParserSettings(streaming=True)) is not None
+    assert cache.load(bldg_file, ParserSettings(load_semantic_parts=True)) is None
+
+
+def test_cache_invalidated_by_mtime(bldg_file: str, tmp_path: Path):
+    cache = ParseCache(tmp_path / "cache")
+    settings = ParserSettings()
+    _parse(bldg_file, settings, cache)
+
+    stat = os.stat(bldg_file)
+    os.utime(bldg_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.load(bldg_file, settings) is None
+
+
+def test_cache_invalidated_by_definitions(
+    bldg_file: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    cache = ParseCache(tmp_path / "cache")
+    settings = ParserSettings()
+    _parse(bldg_file, settings, cache)
+
+    # プラグインの更新で Processor の定義が変わった場合
+    monkeypatch.setattr(cache_module, "_definitions_fingerprint", lambda: "changed")
+    assert cache.load(bldg_file, settings) is None
+
+
+def test_corrupted_cache_is_discarded(bldg_file: str, tmp_path: Path):
+    cache = ParseCache(tmp_path / "cache")
+    settings = ParserSettings()
+    _parse(bldg_file, settings, cache)
+
+    [(path, _, _)] = cache.entries()
+    data = bytearray(path.read_bytes())
+    data[40:48] = b"\xff" * 8
+    path.write_bytes(bytes(data))
+    assert cache.load(bldg_file, settings) is None
+    assert not path.exists()
+
+
+def test_lru_eviction(bldg_file: str, tmp_path: Path):
+    cache = ParseCache(tmp_path / "cache")
+    variants = [
+        ParserSettings(),
+        ParserSettings(load_semantic_parts=True),
+        ParserSettings(attributes_only=True),
+    ]
+    paths = []
+    for settings in variants:
+        before = {path for path, _, _ in cache.entries()}
+        _parse(bldg_file, settings, cache)
+        [path] = {path for path, _, _ in cache.entries()} - before
+        paths.append(path)
+    for i, path in enumerate(paths, start=1):
+        os.utime(path, (1000 * i, 1000 * i))
+
+    # 最も古いものを使うと、最後に使われた時刻が更新されて削除の対象から外れる
+    assert cache.load(bldg_file, variants[0]) is not None
+    sizes = {path: size for path, size, _ in cache.entries()}
+    assert cache.prune(max_size=sum(sizes.values()) - 1) == 1
+    assert cache.load(bldg_file, variants[0]) is not None
+    assert cache.load(bldg_file, variants[1]) is None
+    assert cache.load(bldg_file, variants[2]) is not None
+
+    assert cache.clear() == 2
+    assert cache.entries() == []
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path, PurePath
+
+import pytest
+
+from benchmarks.synthetic import write_dataset
+from plateau_plugin.plateau.catalog import (
+    DatasetCatalog,
+    feature_type_of,
+    mesh_code_bounds,
+    mesh_code_of,
+    scan_file,
+)
+
+
+@pytest.fixture
+def dataset_root(tmp_path: Path) -> Path:
+    # 目録のデータベースを配布データのフォルダに作り、ファイルも書き換えるので個別に用意する
+    root = tmp_path / "13100_tokyo_2022_citygml_1_op"
+    write_dataset(root, scale=9)
+    return root
+
+
+def test_mesh_code_and_feature_type():
+    assert mesh_code_of("53394611_bldg_6697_op.gml") == "53394611"
+    assert mesh_code_of("533946111_bldg_6697_2_op.gml") == "533946111"
+    assert mesh_code_of("5339_fld_6697_op.gml") == "5339"
+    assert mesh_code_of("udx.gml") is None
+
+    assert (
+        feature_type_of(PurePath("data/udx/bldg/53394611_bldg_6697_op.gml")) == "bldg"
+    )
+    assert feature_type_of(PurePath("data/udx/fld/natl/x/5339_fld.gml")) == "fld"
+    assert feature_type_of(PurePath("data/udx/bldg")) is None
+    assert feature_type_of(PurePath("data/bldg/53394611_bldg_6697_op.gml")) is None
+
+
+def test_mesh_code_bounds():
+    assert mesh_code_bounds("5339") == pytest.approx((139.0, 35 + 1 / 3, 140.0, 36.0))
+    assert mesh_code_bounds("53394611") == pytest.approx(
+        (139.7625, 35.675, 139.775, 35.683333)
+    )
+    # 2分の1メッシュ (北東)
+    min_lon, min_lat, max_lon, max_lat = mesh_code_bounds("533946114")
+    assert (min_lon, min_lat) == pytest.approx((139.76875, 35.679167))
+    assert (max_lon, max_lat) == pytest.approx(mesh_code_bounds("53394611")[2:])
+
+
+def test_scan_file(dataset_root: Path):
+    path = dataset_root / "udx" / "bldg" / "53394611_bldg_6697_op.gml"
+    entry = scan_file(str(path), "bldg")
+    assert entry.feature_type == "bldg"
+    assert entry.mesh_code == "53394611"
+    assert entry.feature_count == 9
+    assert entry.iur_version == "3.0"
+    assert entry.lods == (0, 1, 2)
+
+    # 都市オブジェクトの範囲はメッシュの範囲に収まる
+    assert entry.bounds is not None
+    min_lon, min_lat, max_lon, max_lat = mesh_code_bounds("53394611")
+    assert min_lon - 1e-9 <= entry.bounds[0] <= entry.bounds[2] <= max_lon + 1e-9
+    assert min_lat - 1e-9 <= entry.bounds[1] <= entry.bounds[3] <= max_lat + 1e-9
+
+
+def test_catalog_update_and_query(dataset_root: Path):
+    with DatasetCatalog(dataset_root) as catalog:
+        assert catalog.update() == 4
+        assert catalog.db_path.exists()
+        entries = list(catalog.query())
+        assert [e.feature_type for e in entries] == ["bldg", "dem", "tran", "urf"]
+        assert entries[0] == scan_file(str(entries[0].path), "bldg")
+
+        # 変更のないファイルは走査しない
+        assert catalog.update() == 0
+        bldg = entries[0].path
+        stat = bldg.stat()
+        os.utime(bldg, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert catalog.update() == 1
+
+        # 種類と範囲で絞り込む
+        assert [e.feature_type for e in catalog.query(feature_types=["tran"])] == [
+            "tran"
+        ]
+        assert list(catalog.query(bbox=(0.0, 0.0, 1.0, 1.0))) == []
+        assert len(list(catalog.query(bbox=entries[0].bounds))) == 4
+
+        # 無くなったファイルは目録から消える
+        (dataset_root / "udx" / "urf" / "53394611_urf_6697_op.gml").unlink()
+        assert catalog.update() == 0
+        assert [e.feature_type for e in catalog.query()] == ["bldg", "dem", "tran"]
+
+    # 目録は再び開いても残っている
+    with DatasetCatalog(dataset_root) as catalog:
+        assert len(list(catalog.query())) == 3
+
+
+def test_scan_lods_ignores_lod_attributes(tmp_path: Path):
+    path = tmp_path / "udx" / "bldg" / "53394611_bldg_6697_op.gml"
+    path.parent.mkdir(parents=True)
+    path.write_text(
+        '<core:CityModel xmlns:core="http://www.opengis.net/citygml/2.0"'
+        ' xmlns:gml="http://www.opengis.net/gml"'
+        ' xmlns:bldg="http://www.opengis.net/citygml/building/2.0"'
+        ' xmlns:uro="https://www.geospatial.jp/iur/uro/3.0">'
+        "<core:cityObjectMember><bldg:Building>"
+        "<uro:buildingDataQualityAttribute><uro:DataQualityAttribute>"
+        "<uro:lod1HeightType>2</uro:lod1HeightType>"
+        "</uro:DataQualityAttribute></uro:buildingDataQualityAttribute>"
+        "<bldg:lod2Solid/>"
+        "</bldg:Building></core:cityObjectMember></core:CityModel>",
+        encoding="utf-8",
+    )
+    assert scan_file(str(path), "bldg").lods == (2,)
+
+
+def test_scan_file_with_unknown_member_bounds(dataset_root: Path):
+    path = dataset_root / "udx" / "bldg" / "53394611_bldg_6697_op.gml"
+    known = scan_file(str(path), "bldg").bounds
+    assert known is not None
+
+    # 範囲の分からない (経度・緯度でない Envelope をもつ) メンバーがあれば、メッシュの範囲も含める
+    text = path.read_text(encoding="utf-8")
+    start = text.index("<bldg:Building ")
+    text = text[:start] + text[start:].replace("EPSG/0/6697", "EPSG/0/6677", 1)
+    path.write_text(text, encoding="utf-8")
+    bounds = scan_file(str(path), "bldg").bounds
+    mesh = mesh_code_bounds("53394611")
+    assert bounds == (
+        min(known[0], mesh[0]),
+        min(known[1], mesh[1]),
+        max(known[2], mesh[2]),
+        max(known[3], mesh[3]),
+    )
+
+    # メッシュコードも無ければ範囲は不明
+    renamed = path.with_name("bldg_6697_op.gml")
+    path.rename(renamed)
+    assert scan_file(str(renamed), "bldg").bounds is None
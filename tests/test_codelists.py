@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from plateau_plugin.plateau.codelists import (
+    PREDEFINED_CODELISTS,
+    CodelistStore,
+    PredefinedCodelists,
+)
+
+
+def test_predefined_codelists_decode_each_name():
+    whole = json.loads(PREDEFINED_CODELISTS.path.read_bytes())
+    registry = PredefinedCodelists(PREDEFINED_CODELISTS.path)
+    for name in ("Agreement_class", "Building_usage", "Common_localPublicAuthorities"):
+        codelist = registry.get(name)
+        assert dict(codelist) == whole[name]
+        # 同じ名前では同じ (変更できない) オブジェクトを共有する
+        assert registry.get(name) is codelist
+        with pytest.raises(TypeError):
+            codelist["x"] = "y"  # type: ignore
+    # 切り出してデコードできたので、全体はデコードしていない
+    assert registry._whole is None
+
+
+def test_predefined_codelists_fall_back_to_whole_json(tmp_path: Path):
+    path = tmp_path / "codelists.json"
+    path.write_text(json.dumps({"A": {"1": "one"}, "B": {"2": "two"}}))
+    registry = PredefinedCodelists(path)
+    assert dict(registry.get("B")) == {"2": "two"}
+    with pytest.raises(KeyError):
+        registry.get("C")
+
+
+def test_stores_share_predefined_codelists(tmp_path: Path):
+    first = CodelistStore(tmp_path / "a")
+    second = CodelistStore(tmp_path / "b")
+    assert first.get_predefined("Building_usage") is second.get_predefined(
+        "Building_usage"
+    )
+
+
+def test_lookup_reads_local_codelist(synthetic_dataset: dict[str, Path]):
+    store = CodelistStore(synthetic_dataset["bldg"].parent)
+    path = "../../codelists/Building_usage.xml"
+    assert store.lookup(None, path, "411") == "住宅"
+    assert store.lookup(None, path, "999") == "999"
+    # ファイルがないコードリストは事前定義のものだけを使う
+    missing = "../../codelists/Missing.xml"
+    assert store.lookup(None, missing, "1") == "1"
+    usage = PREDEFINED_CODELISTS.get("Building_usage")
+    code = next(iter(usage))
+    assert store.lookup("Building_usage", None, code) == usage[code]
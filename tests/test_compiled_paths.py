@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import pickle
+from pathlib import Path
+
+import lxml.etree as et
+import pytest
+
+from plateau_plugin.plateau.models import processors
+from plateau_plugin.plateau.models.base import _compile_path
+from plateau_plugin.plateau.namespaces import Namespace
+
+_IUR2 = {
+    "uro": "https://www.geospatial.jp/iur/uro/2.0",
+    "urf": "https://www.geospatial.jp/iur/urf/2.0",
+}
+
+
+def test_compile_path_shapes():
+    ns = Namespace.from_document_nsmap({})
+    uro = ns.nsmap["uro"]
+    gml = ns.nsmap["gml"]
+
+    path = _compile_path("./uro:buildingIDAttribute", ns)
+    assert path.child_tag == f"{{{uro}}}buildingIDAttribute"
+    assert path.geometry_key is None
+
+    path = _compile_path("./uro:buildingIDAttribute/uro:BuildingIDAttribute", ns)
+    assert path.child_tag is None
+
+    path = _compile_path(".//bldg:lod2MultiSurface//gml:Polygon", ns)
+    assert path.geometry_key == (
+        True,
+        f"{{{ns.nsmap['bldg']}}}lod2MultiSurface",
+        f"{{{gml}}}Polygon",
+    )
+    path = _compile_path("./bldg:lod1Solid//gml:Polygon", ns)
+    assert path.geometry_key == (
+        False,
+        f"{{{ns.nsmap['bldg']}}}lod1Solid",
+        f"{{{gml}}}Polygon",
+    )
+
+
+def test_compile_is_cached_per_iur_version():
+    processor = processors.get_processor_by_id("bldg:Building")
+    assert processor is not None
+    plan3 = processor.compile(Namespace.from_document_nsmap({}))
+    assert processor.compile(Namespace.from_document_nsmap({})) is plan3
+    plan2 = processor.compile(Namespace(_IUR2))
+    assert plan2 is not plan3
+    assert processor.compile(Namespace(_IUR2)) is plan2
+
+    # コンパイル済みの XPath は送らず、登録済みの Processor を参照し直す
+    assert pickle.loads(pickle.dumps(processor)) is processor
+
+
+def _cityobj_elements(filename: str):
+    doc = et.parse(filename)
+    ns = Namespace.from_document_nsmap(doc.getroot().nsmap)
+    for elem in doc.iter(et.Element):
+        if (processor := processors.get_processor_by_tag(elem.tag)) is not None:
+            yield ns, processor, elem
+
+
+@pytest.mark.parametrize("feature_type", ["bldg", "tran", "urf", "dem"])
+def test_compiled_paths_match_find(
+    synthetic_dataset: dict[str, Path], feature_type: str
+):
+    checked = 0
+    for ns, processor, elem in _cityobj_elements(str(synthetic_dataset[feature_type])):
+        plan = processor.compile(ns)
+        for group, compiled in zip(processor.attribute_groups, plan.attribute_groups):
+            if group.base_element is None:
+                base = elem
+            else:
+                assert compiled.base_element is not None
+                base = elem.find(group.base_element, ns.nsmap)
+                assert compiled.base_element.first(elem) is base
+                if base is None:
+                    continue
+
+            found = compiled.match(base)
+            for i, (attr, path) in enumerate(compiled.attributes):
+                expected = base.findall(attr.path, ns.nsmap)
+                assert path.xpath(base) == expected
+                assert found.get(i, []) == expected
+                checked += len(expected)
+
+        for path in (*plan.nested_attributes, *plan.semantic_parts):
+            assert path.xpath(elem) == elem.findall(path.path, ns.nsmap)
+        if plan.disaster_risk_children is not None:
+            path = plan.disaster_risk_children
+            assert path.xpath(elem) == elem.findall(path.path, ns.nsmap)
+    # 地形モデルには属性が無い
+    assert checked or feature_type == "dem"
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import lxml.etree as et
+import pytest
+
+from plateau_plugin.plateau.models import processors
+from plateau_plugin.plateau.models.base import _compile_path
+from plateau_plugin.plateau.namespaces import Namespace
+from plateau_plugin.plateau.parse.geometry import GeometryCollector
+
+
+@pytest.mark.parametrize("feature_type", ["bldg", "tran", "urf", "dem"])
+def test_collector_matches_xpath(synthetic_dataset: dict[str, Path], feature_type: str):
+    doc = et.parse(str(synthetic_dataset[feature_type]))
+    ns = Namespace.from_document_nsmap(doc.getroot().nsmap)
+    found = 0
+    for elem in doc.iter(et.Element):
+        if (processor := processors.get_processor_by_tag(elem.tag)) is None:
+            continue
+        plan = processor.compile(ns)
+        collector = GeometryCollector(elem, plan.geometry_tags)
+        assert plan.detect_lods(collector) == processor.detect_lods(elem, ns.nsmap)
+
+        for attr in (*plan.lod_list, plan.lod_n_paths):
+            if attr is None:
+                continue
+            for path in (
+                *attr.lod_detection,
+                *attr.collect_all,
+                *(attr.only_direct or ()),
+            ):
+                expected = path.xpath(elem)
+                assert collector.select(path) == expected
+                assert collector.exists(path) == bool(expected)
+                found += len(expected)
+    assert found
+
+
+def test_collector_direct_and_nested_properties():
+    ns = Namespace.from_document_nsmap({})
+    bldg = ns.nsmap["bldg"]
+    gml = ns.nsmap["gml"]
+    # 同名のプロパティ要素が入れ子になっていても、同じ要素を二重に返さない
+    elem = et.fromstring(
+        f'<bldg:Building xmlns:bldg="{bldg}" xmlns:gml="{gml}">'
+        "<bldg:lod2MultiSurface><gml:Polygon gml:id='a'/>"
+        "<bldg:lod2MultiSurface><gml:Polygon gml:id='b'/></bldg:lod2MultiSurface>"
+        "</bldg:lod2MultiSurface>"
+        "<bldg:boundedBy><bldg:lod2MultiSurface><gml:Polygon gml:id='c'/>"
+        "</bldg:lod2MultiSurface></bldg:boundedBy>"
+        "</bldg:Building>"
+    )
+    descendant = _compile_path(".//bldg:lod2MultiSurface//gml:Polygon", ns)
+    direct = _compile_path("./bldg:lod2MultiSurface//gml:Polygon", ns)
+    child = _compile_path("./bldg:lod2MultiSurface", ns)
+    missing = _compile_path("./bldg:lod1Solid", ns)
+    geometry_tags = {f"{{{bldg}}}lod2MultiSurface": (f"{{{gml}}}Polygon",)}
+
+    collector = GeometryCollector(elem, geometry_tags)
+    for path in (descendant, direct):
+        assert collector.select(path) == path.xpath(elem)
+    assert len(collector.select(descendant)) == 3
+    assert len(collector.select(direct)) == 2
+    assert collector.exists(child)
+    assert not collector.exists(missing)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+from plateau_plugin.plateau.parse.index import (
+    CityObjectIndex,
+    build_index,
+    load_or_build_index,
+    sidecar_path,
+)
+from plateau_plugin.plateau.parse.parallel import parse_files_in_parallel
+from tests.utils import summarize
+
+
+@pytest.fixture
+def bldg_file(synthetic_dataset: dict[str, Path], tmp_path: Path) -> str:
+    # 索引ファイルを隣に保存するので複製して使う
+    dst = tmp_path / synthetic_dataset["bldg"].name
+    shutil.copy(synthetic_dataset["bldg"], dst)
+    return str(dst)
+
+
+@pytest.mark.parametrize("feature_type", ["bldg", "tran", "urf", "dem"])
+def test_index_matches_dom(synthetic_dataset: dict[str, Path], feature_type: str):
+    filename = str(synthetic_dataset[feature_type])
+    settings = ParserSettings(load_semantic_parts=True)
+    expected = summarize(PlateauCityGmlParser(filename, settings).iter_cityobjs())
+    index = build_index(filename)
+    assert (
+        summarize(PlateauCityGmlParser(filename, settings, index=index).iter_cityobjs())
+        == expected
+    )
+
+
+def test_index_records_members(bldg_file: str):
+    index = build_index(bldg_file)
+    assert len(index) == 9
+    assert index.ids[0] == "bldg_0"
+    assert set(index.types) == {"bldg:Building"}
+    assert not np.isnan(index.bounds).any()
+    assert index.lookup("bldg_3") == 3
+    assert index.lookup("missing") is None
+
+
+def test_index_file_roundtrip_and_rebuild(bldg_file: str):
+    index = load_or_build_index(bldg_file)
+    path = sidecar_path(bldg_file)
+    assert path.exists()
+
+    loaded = CityObjectIndex.load(path)
+    assert loaded.ids == index.ids
+    assert np.array_equal(loaded.offsets, index.offsets)
+    assert np.array_equal(loaded.bounds, index.bounds)
+    assert loaded.is_current(bldg_file)
+
+    # 元ファイルが更新されたら索引を作り直す
+    stat = os.stat(bldg_file)
+    os.utime(bldg_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert not loaded.is_current(bldg_file)
+    assert load_or_build_index(bldg_file).is_current(bldg_file)
+    assert CityObjectIndex.load(path).is_current(bldg_file)
+
+
+def test_get_cityobjs_reads_only_one_member(bldg_file: str):
+    parser = PlateauCityGmlParser(
+        bldg_file, ParserSettings(), index=build_index(bldg_file)
+    )
+    expected = [
+        item
+        for item in summarize(
+            PlateauCityGmlParser(bldg_file, ParserSettings()).iter_cityobjs()
+        )
+        if item[0] == 4
+    ]
+    assert expected
+    assert summarize((4, obj) for obj in parser.get_cityobjs("bldg_4")) == expected
+    assert parser.get_cityobjs("missing") == []
+
+
+def test_parse_files_with_index(bldg_file: str):
+    bounds = build_index(bldg_file).bounds[2]
+    settings = ParserSettings(bbox=tuple(bounds.tolist()))
+    [(_, expected)] = parse_files_in_parallel([bldg_file], settings, max_workers=1)
+    [(_, cityobjs)] = parse_files_in_parallel(
+        [bldg_file], settings, max_workers=1, use_index=True
+    )
+    assert sidecar_path(bldg_file).exists()
+    assert expected
+    assert summarize(enumerate(cityobjs)) == summarize(enumerate(expected))
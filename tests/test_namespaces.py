@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import pytest
+
+from plateau_plugin.plateau import namespaces
+from plateau_plugin.plateau.models import base, processors
+from plateau_plugin.plateau.namespaces import BASE_NS, Namespace
+
+_URO2 = "https://www.geospatial.jp/iur/uro/2.0"
+
+
+@pytest.mark.parametrize("uro", [BASE_NS["uro3"], _URO2])
+def test_tag_name_roundtrip(uro: str):
+    ns = Namespace.from_document_nsmap({"uro": uro})
+    for prefixed in ("gml:Polygon", "bldg:Building", "uro:buildingIDAttribute"):
+        qualified = ns.to_qualified_name(prefixed)
+        assert qualified.startswith("{")
+        assert ns.to_prefixed_name(qualified) == prefixed
+        # 2回目はメモから引く
+        assert ns.to_qualified_name(prefixed) == qualified
+        assert ns.to_prefixed_name(qualified) == prefixed
+    assert ns.to_qualified_name("uro:Foo") == f"{{{uro}}}Foo"
+
+
+def test_memo_is_bounded(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(namespaces, "_NAME_MEMO_LIMIT", 8)
+    ns = Namespace({})
+    gml = BASE_NS["gml"]
+    for i in range(20):
+        name = f"gml:Element{i}"
+        assert ns.to_qualified_name(name) == f"{{{gml}}}Element{i}"
+        assert ns.to_prefixed_name(f"{{{gml}}}Element{i}") == name
+    assert len(ns._qualified_names) == 8
+    assert len(ns._prefixed_names) == 8
+
+
+def test_document_namespaces_are_shared():
+    # 同じ i-UR のバージョンの文書どうしで、タグ名の変換結果を共有する
+    ns3 = Namespace.from_document_nsmap({"uro": BASE_NS["uro3"]})
+    assert Namespace.from_document_nsmap({}) is ns3
+    assert Namespace.from_document_nsmap({"bldg": BASE_NS["bldg"]}) is ns3
+    ns2 = Namespace.from_document_nsmap({"uro": _URO2})
+    assert ns2 is not ns3
+    assert Namespace.from_document_nsmap({"uro": _URO2}) is ns2
+
+    # Processor の登録も同じインスタンスを使う
+    assert base._BASE_NAMESPACE is ns3
+    qualified = f"{{{BASE_NS['bldg']}}}Building"
+    assert ns3._qualified_names["bldg:Building"] == qualified
+
+
+def test_registry_uses_qualified_names():
+    # 登録時に接頭辞つきの名前と修飾名の両方で引けるようにしている
+    processor = processors.get_processor_by_tag("bldg:Building")
+    assert processor is not None
+    assert (
+        processors.get_processor_by_tag(f"{{{BASE_NS['bldg']}}}Building") is processor
+    )
+    risk = processors.get_processor_by_tag(
+        f"{{{_URO2}}}BuildingRiverFloodingRiskAttribute"
+    )
+    assert risk is not None
+    assert risk is processors.get_processor_by_tag(
+        f"{{{BASE_NS['uro3']}}}BuildingRiverFloodingRiskAttribute"
+    )
@@ -0,0 +1,97 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from plateau_plugin.algorithms.utils.processes import (
+    find_python_executable,
+    get_mp_context,
+)
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+from plateau_plugin.plateau.parse.cache import ParseCache
+from plateau_plugin.plateau.parse.parallel import parse_files_in_parallel
+from tests.utils import summarize, summarize_cityobj
+
+_ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_worker_imports_are_free_of_qt():
+    # ワーカープロセスが import するモジュールは QGIS や Qt を読み込まない
+    code = (
+        "import sys, plateau_plugin.plateau.parse.parallel; "
+        "print([m for m in sys.modules if m.startswith(('qgis', 'PyQt'))])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_find_python_executable():
+    exe = find_python_executable()
+    assert exe is not None
+    assert exe.exists()
+
+
+def test_parse_in_spawned_workers(synthetic_dataset: dict[str, Path]):
+    filename = str(synthetic_dataset["bldg"])
+    settings = ParserSettings(load_semantic_parts=True, load_apperance=True)
+    expected = summarize(PlateauCityGmlParser(filename, settings).iter_cityobjs())
+
+    parser = PlateauCityGmlParser(filename, settings)
+    cityobjs = parser.iter_cityobjs_parallel(
+        2, chunk_size=2, mp_context=get_mp_context()
+    )
+    assert summarize(cityobjs) == expected
+
+
+def test_parse_files_in_spawned_workers(synthetic_dataset: dict[str, Path]):
+    filenames = [str(synthetic_dataset[t]) for t in ("bldg", "tran", "urf")]
+    settings = ParserSettings()
+
+    results = dict(
+        parse_files_in_parallel(
+            filenames, settings, max_workers=2, mp_context=get_mp_context()
+        )
+    )
+    assert set(results) == set(filenames)
+    for filename in filenames:
+        expected = [
+            summarize_cityobj(cityobj)
+            for _, cityobj in PlateauCityGmlParser(filename, settings).iter_cityobjs()
+        ]
+        assert [summarize_cityobj(cityobj) for cityobj in results[filename]] == expected
+
+
+def test_parse_files_serially_in_order(synthetic_dataset: dict[str, Path]):
+    filenames = [str(synthetic_dataset[t]) for t in ("urf", "bldg", "tran")]
+    results = list(parse_files_in_parallel(filenames, ParserSettings(), max_workers=1))
+    assert [filename for filename, _ in results] == filenames
+    assert all(cityobjs for _, cityobjs in results)
+
+
+def test_parse_files_in_workers_share_cache(
+    synthetic_dataset: dict[str, Path], tmp_path: Path
+):
+    cache = ParseCache(tmp_path / "cache")
+    filenames = [str(synthetic_dataset[t]) for t in ("bldg", "tran")]
+    settings = ParserSettings()
+    first = dict(
+        parse_files_in_parallel(
+            filenames, settings, max_workers=2, mp_context=get_mp_context(), cache=cache
+        )
+    )
+    assert len(cache.entries()) == len(filenames)
+    for filename in filenames:
+        assert cache.load(filename, settings) is not None
+
+    second = dict(
+        parse_files_in_parallel(filenames, settings, max_workers=1, cache=cache)
+    )
+    for filename in filenames:
+        assert [summarize_cityobj(c) for c in second[filename]] == [
+            summarize_cityobj(c) for c in first[filename]
+        ]
@@ -1,8 +1,23 @@
-# from pathlib import Path
+import dataclasses
+from datetime import date
+from pathlib import Path
 
-from qgis.core import QgsApplication
+from qgis.core import (
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsField,
+    QgsFields,
+    QgsProcessingContext,
+    QgsProcessingFeedback,
+    QgsProject,
+)
+from qgis.PyQt.QtCore import QDate, QVariant
 from qgis.PyQt.QtGui import QIcon
 
+from plateau_plugin.algorithms.load_vector import _make_feature
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+
 
 def test_registered(qgis_app: QgsApplication, provider: str):
     registory = QgsApplication.processingRegistry()
@@ -19,6 +34,39 @@ def test_registered(qgis_app: QgsApplication, provider: str):
     assert isinstance(alg.shortHelpString(), str)
 
 
+def test_batch_loader_registered(qgis_app: QgsApplication, provider: str):
+    registory = QgsApplication.processingRegistry()
+    alg = registory.algorithmById("plateau_plugin:load_batch_as_vector")
+    assert alg is not None
+    assert isinstance(alg.displayName(), str)
+    assert isinstance(alg.shortHelpString(), str)
+
+
+def test_load_vector_in_batches(
+    qgis_app: QgsApplication, provider: str, synthetic_dataset: dict[str, Path]
+):
+    registory = QgsApplication.processingRegistry()
+    alg = registory.createAlgorithmById("plateau_plugin:load_as_vector")
+    context = QgsProcessingContext()
+    context.setProject(QgsProject.instance())
+    feedback = QgsProcessingFeedback()
+
+    # 地物の数より小さい単位でレイヤに追加する
+    (_, ok) = alg.run(
+        {
+            "INPUT": str(synthetic_dataset["bldg"]),
+            "APPEND_MODE": False,
+            "BATCH_SIZE": 4,
+        },
+        context,
+        feedback,
+    )
+    assert ok
+    layers = list(context.temporaryLayerStore().mapLayers().values())
+    assert layers
+    assert sum(layer.featureCount() for layer in layers) >= 9
+
+
 # def test_load_xml(qgis_app: QgsApplication, provider: str):
 #     import processing
 #
@@ -84,3 +132,31 @@ def test_registered(qgis_app: QgsApplication, provider: str):
 #     layer: QgsVectorLayer = result["OUTPUT"]
 #     assert layer.featureCount() == 27237
 #
+
+
+def test_make_feature_skips_missing_core_fields(
+    qgis_app: QgsApplication, synthetic_dataset: dict[str, Path]
+):
+    # 追記先の既存のレイヤに一部のフィールドしかなくても読み込める
+    filename = str(synthetic_dataset["bldg"])
+    cityobj = next(
+        cityobj
+        for _, cityobj in PlateauCityGmlParser(
+            filename, ParserSettings()
+        ).iter_cityobjs()
+        if cityobj.type == "bldg:Building"
+    )
+    cityobj = dataclasses.replace(cityobj, termination_date=date(2030, 1, 2))
+
+    fields = QgsFields()
+    fields.append(QgsField("id", QVariant.String))
+    fields.append(QgsField("terminationDate", QVariant.Date))
+    fields.append(QgsField("measuredHeight", QVariant.Double))
+    field_indices = {field.name(): i for i, field in enumerate(fields)}
+    crs = QgsCoordinateReferenceSystem("EPSG:6697")
+    transform = QgsCoordinateTransform(crs, crs, QgsProject.instance())
+
+    feature = _make_feature(cityobj, fields, field_indices, filename, False, transform)
+    assert feature.attribute("id") == cityobj.id
+    assert feature.attribute("terminationDate") == QDate(2030, 1, 2)
+    assert feature.attribute("measuredHeight") == cityobj.attributes["measuredHeight"]
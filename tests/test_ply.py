@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+
+import lxml.etree as et
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import dem_gml
+from plateau_plugin.plateau.namespaces import BASE_NS
+from plateau_plugin.ply import (
+    _PLY_HEADER_TEMPLATE,
+    _parse_triangles,
+    _VertexIndexer,
+    convert_citygml_relief_to_ply,
+)
+
+
+def _reference_ply(src_filename: str) -> bytes:
+    # 三角形を1つずつ辞書で番号付けする素朴な変換
+    nsmap = {"dem": BASE_NS["dem"], "gml": BASE_NS["gml"]}
+    doc = et.parse(src_filename)
+    vertex_ids: dict[tuple[float, float], int] = {}
+    verts = b""
+    faces = b""
+    n_faces = 0
+    for pos_list in doc.iterfind(".//dem:TINRelief//gml:Triangle//gml:posList", nsmap):
+        values = [float(v) for v in pos_list.text.split()]
+        indices = []
+        for i in range(3):
+            lat, lon, height = values[i * 3 : i * 3 + 3]
+            if (lon, lat) not in vertex_ids:
+                vertex_ids[(lon, lat)] = len(vertex_ids)
+                verts += struct.pack("<fff", lon, lat, height)
+            indices.append(vertex_ids[(lon, lat)])
+        faces += struct.pack("<BIII", 3, *indices)
+        n_faces += 1
+
+    header = _PLY_HEADER_TEMPLATE.format(n_verts=len(vertex_ids), n_faces=n_faces)
+    return header.encode("ascii") + verts + faces
+
+
+def test_convert_matches_reference(synthetic_dataset: dict[str, Path], tmp_path: Path):
+    src = str(synthetic_dataset["dem"])
+    dst = tmp_path / "relief.ply"
+    convert_citygml_relief_to_ply(src, str(dst))
+    expected = _reference_ply(src)
+    assert dst.read_bytes() == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100, 100_000])
+def test_convert_in_chunks(tmp_path: Path, chunk_size: int):
+    # 処理済みの三角形を解放する 1024 個を超える大きさにする
+    src = tmp_path / "relief.gml"
+    src.write_text(dem_gml(24), encoding="utf-8")
+    dst = tmp_path / "relief.ply"
+    convert_citygml_relief_to_ply(str(src), str(dst), chunk_size=chunk_size)
+    expected = _reference_ply(str(src))
+    assert b"element face 1152\n" in expected
+    assert dst.read_bytes() == expected
+
+
+def test_parse_triangles_vertex_counts():
+    tri3 = "0 1 2 3 4 5 6 7 8"
+    tri4 = "10 11 12 13 14 15 16 17 18 10 11 12"
+    expected3 = np.arange(9, dtype=np.float64).reshape(3, 3)
+    expected4 = expected3 + 10
+
+    assert np.array_equal(_parse_triangles([tri3, tri3]), [expected3, expected3])
+    assert np.array_equal(_parse_triangles([tri4, tri4]), [expected4, expected4])
+    # 3頂点と4頂点が混在する場合
+    assert np.array_equal(_parse_triangles([tri3, tri4]), [expected3, expected4])
+
+
+def test_vertex_indexer_shares_vertices_across_chunks():
+    # (緯度, 経度, 高さ)
+    tri_a = [[0, 0, 1], [0, 1, 2], [1, 0, 3]]
+    tri_b = [[1, 1, 4], [0, 1, 5], [1, 0, 6]]
+    tri_c = [[1, 1, 7], [2, 2, 8], [0, 0, 9]]
+    indexer = _VertexIndexer()
+
+    points, indices = indexer.add(np.array([tri_a, tri_b], dtype=np.float64))
+    assert indices.tolist() == [[0, 1, 2], [3, 1, 2]]
+    # 頂点は (経度, 緯度, 高さ) で、同じ水平位置には最初の高さを使う
+    assert points.tolist() == [[0, 0, 1], [1, 0, 2], [0, 1, 3], [1, 1, 4]]
+
+    points, indices = indexer.add(np.array([tri_c], dtype=np.float64))
+    assert indices.tolist() == [[3, 4, 0]]
+    assert points.tolist() == [[2, 2, 8]]
+    assert indexer.num_vertices == 5
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from plateau_plugin.plateau.models import processors
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+from tests.utils import summarize
+
+
+def _parse(filename: str, **kwargs) -> list[tuple]:
+    settings = ParserSettings(load_semantic_parts=True, **kwargs)
+    return summarize(PlateauCityGmlParser(filename, settings).iter_cityobjs())
+
+
+def _processor_id(item: tuple) -> str:
+    return item[1][8]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize(
+    ("feature_type", "include", "exclude"),
+    [
+        ("bldg", None, ("uro:RiverFloodingRisk",)),
+        ("bldg", ("bldg:Building",), ()),
+        # 子孫にだけ現れる種類を指定した場合も、親をたどって読む
+        ("bldg", ("uro:RiverFloodingRisk",), ()),
+        ("tran", ("tran:TrafficArea",), ()),
+    ],
+)
+def test_processor_selection(
+    synthetic_dataset: dict[str, Path],
+    streaming: bool,
+    feature_type: str,
+    include: tuple[str, ...] | None,
+    exclude: tuple[str, ...],
+):
+    filename = str(synthetic_dataset[feature_type])
+    everything = _parse(filename)
+    selected = set(include or map(_processor_id, everything)).difference(exclude)
+    expected = [item for item in everything if _processor_id(item) in selected]
+    assert expected
+
+    result = _parse(
+        filename,
+        include_processors=include,
+        exclude_processors=exclude,
+        streaming=streaming,
+    )
+    assert result == expected
+
+
+def test_excluded_processor_skips_descendants(synthetic_dataset: dict[str, Path]):
+    filename = str(synthetic_dataset["bldg"])
+    assert _parse(filename, exclude_processors=("bldg:Building",)) == []
+    assert (
+        _parse(
+            filename,
+            include_processors=("uro:RiverFloodingRisk",),
+            exclude_processors=("bldg:Building",),
+        )
+        == []
+    )
+
+
+def test_reachable_processor_ids():
+    reachable = processors.get_reachable_processor_ids("bldg:Building")
+    assert "bldg:Building" not in reachable
+    assert {"bldg:_BoundarySurface", "uro:RiverFloodingRisk"} <= reachable
+    assert "tran:Road" not in reachable
+    assert processors.get_reachable_processor_ids("bldg:Building") is reachable
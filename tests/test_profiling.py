@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+from plateau_plugin.plateau.profiling import NULL_PROFILER, NullProfiler, Profiler
+from plateau_plugin.plateau.types import PolygonCollection
+from tests.utils import summarize
+
+
+def test_profiler_stages_and_counters(tmp_path: Path):
+    profiler = Profiler()
+    with profiler.stage("parse"):
+        pass
+    profiler.add_time("parse", 1.5)
+    profiler.add_time("geometry", 0.25, calls=3)
+    profiler.count("features", "bldg:Building")
+    profiler.count("features", "bldg:Building", 2)
+    profiler.count("features", "tran:Road")
+    assert list(profiler.timed_iter("read", iter("abc"))) == ["a", "b", "c"]
+
+    result = profiler.to_dict()
+    assert result["elapsed"] > 0
+    stages = result["stages"]
+    assert stages["parse"]["calls"] == 2
+    assert stages["parse"]["seconds"] >= 1.5
+    assert stages["geometry"] == {"seconds": 0.25, "calls": 3}
+    # 最後の StopIteration は回数に数えない
+    assert stages["read"]["calls"] == 3
+    assert result["counters"] == {"features": {"bldg:Building": 3, "tran:Road": 1}}
+
+    path = tmp_path / "profile.json"
+    profiler.save_json(path)
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved["stages"]["geometry"] == {"seconds": 0.25, "calls": 3}
+    assert saved["counters"] == result["counters"]
+
+    lines = profiler.format_lines()
+    assert lines[0].startswith("全体: ")
+    # 所要時間の長い段階、件数の多いキーから順に並べる
+    assert lines[1].startswith("  parse: ")
+    assert lines[2].startswith("  geometry: 0.250 秒")
+    assert lines.index("features:") < lines.index("  bldg:Building: 3")
+    assert lines.index("  bldg:Building: 3") < lines.index("  tran:Road: 1")
+
+
+def test_null_profiler_records_nothing():
+    assert isinstance(NULL_PROFILER, NullProfiler)
+    assert not NULL_PROFILER.enabled
+    with NULL_PROFILER.stage("parse"):
+        pass
+    NULL_PROFILER.add_time("parse", 1.0)
+    NULL_PROFILER.count("features", "bldg:Building")
+    items = [1, 2, 3]
+    assert list(NULL_PROFILER.timed_iter("read", items)) == items
+    result = NULL_PROFILER.to_dict()
+    assert result["stages"] == {}
+    assert result["counters"] == {}
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_parser_reports_stages(synthetic_dataset: dict[str, Path], streaming: bool):
+    filename = str(synthetic_dataset["bldg"])
+    settings = ParserSettings(
+        load_apperance=True, load_semantic_parts=True, streaming=streaming
+    )
+    expected = summarize(PlateauCityGmlParser(filename, settings).iter_cityobjs())
+
+    profiler = Profiler()
+    cityobjs = list(
+        PlateauCityGmlParser(filename, settings, profiler=profiler).iter_cityobjs()
+    )
+    # 計測しても結果は変わらない
+    assert summarize(cityobjs) == expected
+
+    result = profiler.to_dict()
+    assert {
+        "xml_parse",
+        "appearance",
+        "attributes",
+        "geometry",
+        "codelist_load",
+    } <= result["stages"].keys()
+    assert result["counters"]["codelist"]["lookups"] > 0
+
+    polygons = [
+        cityobj.geometry
+        for _, cityobj in cityobjs
+        if isinstance(cityobj.geometry, PolygonCollection)
+    ]
+    geometry = result["counters"]["geometry"]
+    assert geometry["polygons"] == sum(g.num_polygons for g in polygons)
+    assert geometry["vertices"] == sum(len(g.coords) for g in polygons)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+from plateau_plugin.plateau.parse.index import build_index, load_or_build_index
+from plateau_plugin.plateau.parse.parallel import parse_files_in_parallel
+from plateau_plugin.plateau.sources import (
+    join_source,
+    list_zip_members,
+    make_zip_source,
+    source_parent,
+    source_stat,
+    split_zip_source,
+)
+from plateau_plugin.ply import convert_citygml_relief_to_ply
+from tests.utils import summarize
+
+
+@pytest.fixture(scope="module")
+def dataset_zip(
+    synthetic_dataset: dict[str, Path], tmp_path_factory: pytest.TempPathFactory
+) -> str:
+    # 配布データと同じく、udx/ と codelists/ を含むフォルダを zip にする
+    root = synthetic_dataset["bldg"].parents[2]
+    archive = tmp_path_factory.mktemp("zip") / "dataset.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(root.rglob("*")):
+            if path.is_file() and path.suffix in (".gml", ".xml"):
+                zf.write(path, path.relative_to(root).as_posix())
+    return str(archive)
+
+
+def _member_source(archive: str, path: Path) -> str:
+    return make_zip_source(archive, path.relative_to(path.parents[2]).as_posix())
+
+
+def test_zip_source_paths():
+    source = make_zip_source("/data/x.zip", "/udx/bldg/a.gml")
+    assert source == "zip:///data/x.zip!/udx/bldg/a.gml"
+    assert split_zip_source(source) == ("/data/x.zip", "udx/bldg/a.gml")
+    assert split_zip_source("/data/udx/bldg/a.gml") is None
+    with pytest.raises(ValueError, match="missing"):
+        split_zip_source("zip:///data/x.zip")
+
+    assert source_parent(source) == "zip:///data/x.zip!/udx/bldg"
+    assert (
+        join_source(source_parent(source), "../../codelists/Building_usage.xml")
+        == "zip:///data/x.zip!/codelists/Building_usage.xml"
+    )
+
+
+def test_list_zip_members(dataset_zip: str, synthetic_dataset: dict[str, Path]):
+    members = list_zip_members(dataset_zip)
+    assert "codelists/Building_usage.xml" in members
+    for path in synthetic_dataset.values():
+        assert split_zip_source(_member_source(dataset_zip, path))[1] in members
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("feature_type", ["bldg", "tran", "urf", "dem"])
+def test_parse_zip_member_matches_file(
+    dataset_zip: str,
+    synthetic_dataset: dict[str, Path],
+    feature_type: str,
+    streaming: bool,
+):
+    path = synthetic_dataset[feature_type]
+    settings = ParserSettings(
+        load_semantic_parts=True, load_apperance=True, streaming=streaming
+    )
+    expected = summarize(PlateauCityGmlParser(str(path), settings).iter_cityobjs())
+    source = _member_source(dataset_zip, path)
+    assert summarize(PlateauCityGmlParser(source, settings).iter_cityobjs()) == expected
+
+
+def test_zip_member_codelists(dataset_zip: str, synthetic_dataset: dict[str, Path]):
+    # コードリストもアーカイブ内から読む
+    source = _member_source(dataset_zip, synthetic_dataset["bldg"])
+    usages = {
+        tuple(cityobj.attributes["usage"])
+        for _, cityobj in PlateauCityGmlParser(source, ParserSettings()).iter_cityobjs()
+        if cityobj.type == "bldg:Building"
+    }
+    assert ("住宅",) in usages
+
+
+def test_zip_member_index_and_stat(
+    dataset_zip: str, synthetic_dataset: dict[str, Path]
+):
+    path = synthetic_dataset["bldg"]
+    source = _member_source(dataset_zip, path)
+    expected = build_index(str(path))
+    index = load_or_build_index(source)
+    assert index.ids == expected.ids
+    assert (index.bounds == expected.bounds).all()
+
+    # アーカイブ内のファイルの索引は保存しない
+    assert not list(Path(dataset_zip).parent.rglob("*.plidx"))
+
+    identity, size, _ = source_stat(source)
+    assert identity.startswith("zip://")
+    assert size == path.stat().st_size
+
+
+def test_parse_zip_members_in_parallel(
+    dataset_zip: str, synthetic_dataset: dict[str, Path]
+):
+    paths = [synthetic_dataset[t] for t in ("bldg", "tran")]
+    sources = [_member_source(dataset_zip, path) for path in paths]
+    settings = ParserSettings()
+    results = list(parse_files_in_parallel(sources, settings, max_workers=1))
+    assert [source for source, _ in results] == sources
+    for path, (_, cityobjs) in zip(paths, results):
+        expected = list(PlateauCityGmlParser(str(path), settings).iter_cityobjs())
+        assert summarize(enumerate(cityobjs)) == summarize(
+            enumerate(cityobj for _, cityobj in expected)
+        )
+
+
+def test_convert_zip_member_to_ply(
+    dataset_zip: str, synthetic_dataset: dict[str, Path], tmp_path: Path
+):
+    path = synthetic_dataset["dem"]
+    convert_citygml_relief_to_ply(str(path), str(tmp_path / "file.ply"))
+    source = _member_source(dataset_zip, path)
+    convert_citygml_relief_to_ply(source, str(tmp_path / "zip.ply"))
+    assert (tmp_path / "zip.ply").read_bytes() == (tmp_path / "file.ply").read_bytes()
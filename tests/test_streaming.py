@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+from tests.utils import summarize
+
+_VARIANTS = [
+    {},
+    {"load_semantic_parts": True},
+    {"only_first_found_lod": True, "lowest_lod_first": True},
+    {"load_apperance": True, "load_semantic_parts": True},
+]
+
+
+@pytest.mark.parametrize("variant", _VARIANTS, ids=repr)
+@pytest.mark.parametrize("feature_type", ["bldg", "tran", "urf", "dem"])
+def test_streaming_matches_dom(
+    synthetic_dataset: dict[str, Path], feature_type: str, variant: dict
+):
+    filename = str(synthetic_dataset[feature_type])
+    dom = PlateauCityGmlParser(filename, ParserSettings(**variant))
+    streaming = PlateauCityGmlParser(
+        filename, ParserSettings(streaming=True, **variant)
+    )
+    expected = summarize(dom.iter_cityobjs())
+    assert expected
+    assert summarize(streaming.iter_cityobjs()) == expected
+
+
+def test_streaming_releases_processed_members(synthetic_dataset: dict[str, Path]):
+    # 読み終えたトップレベルの要素は木から取り除かれ、先頭の要素を保持し続けない
+    filename = str(synthetic_dataset["bldg"])
+    parser = PlateauCityGmlParser(filename, ParserSettings(streaming=True))
+    elements = [elem for _, elem in parser._iter_toplevel_elements()]
+    assert len(elements) == 9
+    assert all(elem.getparent() is None for elem in elements)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import lxml.etree as et
+import pytest
+
+from plateau_plugin.plateau.namespaces import BASE_NS
+from plateau_plugin.plateau.parse import (
+    ParserSettings,
+    PlateauCityGmlParser,
+    iter_attribute_rows,
+)
+from plateau_plugin.plateau.parse.index import read_without_geometry
+from tests.utils import summarize
+
+
+@pytest.mark.parametrize("feature_type", ["bldg", "tran", "urf", "dem"])
+def test_attributes_only_matches_streaming(
+    synthetic_dataset: dict[str, Path], feature_type: str
+):
+    # 文書全体を読む場合だけジオメトリを取り除いてからパースするので、ストリーミングと比べる
+    filename = str(synthetic_dataset[feature_type])
+    settings = ParserSettings(attributes_only=True, load_semantic_parts=True)
+    result = summarize(PlateauCityGmlParser(filename, settings).iter_cityobjs())
+    streaming = ParserSettings(
+        attributes_only=True, load_semantic_parts=True, streaming=True
+    )
+    assert result
+    assert result == summarize(
+        PlateauCityGmlParser(filename, streaming).iter_cityobjs()
+    )
+    assert all(item[1][-1] is None for item in result)
+
+
+def test_read_without_geometry(synthetic_dataset: dict[str, Path]):
+    root = et.fromstring(read_without_geometry(str(synthetic_dataset["bldg"])))
+    nsmap = {"gml": BASE_NS["gml"], "app": BASE_NS["app"], "bldg": BASE_NS["bldg"]}
+    assert root.find(".//gml:posList", nsmap) is None
+    assert root.find(".//app:appearanceMember", nsmap) is None
+    assert root.find(".//gml:Envelope", nsmap) is not None
+    assert len(root.findall(".//bldg:Building", nsmap)) == 9
+
+
+def test_iter_attribute_rows(synthetic_dataset: dict[str, Path]):
+    filename = str(synthetic_dataset["bldg"])
+    rows = list(iter_attribute_rows(filename))
+    cityobjs = [
+        cityobj
+        for _, cityobj in PlateauCityGmlParser(
+            filename, ParserSettings(only_first_found_lod=True)
+        ).iter_cityobjs()
+    ]
+    assert [row["id"] for row in rows] == [cityobj.id for cityobj in cityobjs]
+    for row, cityobj in zip(rows, cityobjs):
+        assert row["type"] == cityobj.type
+        assert row["parent"] == (cityobj.parent.id if cityobj.parent else None)
+        for name, value in cityobj.attributes.items():
+            assert row[name] == value
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from plateau_plugin.plateau.parse import ParserSettings, PlateauCityGmlParser
+from plateau_plugin.plateau.parse.geometry import _pack_rings, _pack_uvs
+from plateau_plugin.plateau.types import PolygonCollection
+
+
+def _square(x: float, size: float = 1.0) -> np.ndarray:
+    return np.array(
+        [[x, 0, 0], [x + size, 0, 0], [x + size, size, 0], [x, size, 0], [x, 0, 0]],
+        dtype=np.float64,
+    )
+
+
+def test_pack_rings_into_offsets():
+    rings = [_square(0, 4), _square(1), _square(10)]
+    coords, ring_offsets, polygon_offsets = _pack_rings(rings, [2, 1])
+    assert coords.shape == (15, 3)
+    assert ring_offsets.tolist() == [0, 5, 10, 15]
+    assert polygon_offsets.tolist() == [0, 2, 3]
+
+    geom = PolygonCollection(
+        coords=coords,
+        ring_offsets=ring_offsets,
+        polygon_offsets=polygon_offsets,
+        materials=None,
+        textures=None,
+        uvs=None,
+    )
+    assert geom.num_polygons == 2
+    first = list(geom.iter_rings(0))
+    assert len(first) == 2
+    assert np.array_equal(first[1], rings[1])
+    # リングは座標バッファのビューとして返す
+    assert first[0].base is coords
+    assert [len(p) for p in geom.polygons] == [2, 1]
+    assert list(geom.iter_ring_uvs(0)) == []
+
+
+def test_parsed_polygons_share_one_buffer(synthetic_dataset: dict[str, Path]):
+    filename = str(synthetic_dataset["bldg"])
+    for _, cityobj in PlateauCityGmlParser(filename, ParserSettings()).iter_cityobjs():
+        geom = cityobj.geometry
+        if not isinstance(geom, PolygonCollection):
+            continue
+        assert geom.coords.dtype == np.float64
+        assert geom.coords.shape[1] == 3
+        assert geom.ring_offsets[0] == 0
+        assert geom.ring_offsets[-1] == len(geom.coords)
+        assert geom.polygon_offsets[-1] == len(geom.ring_offsets) - 1
+        for i in range(geom.num_polygons):
+            for ring in geom.iter_rings(i):
+                # 閉じたリング
+                assert np.array_equal(ring[0], ring[-1])
+
+
+def test_pack_uvs_shares_ring_offsets():
+    ring_offsets = np.array([0, 5, 8, 12])
+    uv_a = np.arange(10, dtype=np.float64).reshape(5, 2)
+    uv_c = np.ones((4, 2), dtype=np.float32)
+
+    assert _pack_uvs([None, None, None], ring_offsets) is None
+
+    packed = _pack_uvs([uv_a, np.zeros((3, 2)), uv_c], ring_offsets)
+    assert packed is not None
+    assert packed.dtype == np.float32
+    assert packed.shape == (12, 2)
+
+    # テクスチャ座標のないリングの部分は NaN
+    packed = _pack_uvs([uv_a, None, uv_c], ring_offsets)
+    assert packed is not None
+    assert packed.dtype == np.float32
+    assert np.array_equal(packed[0:5], uv_a)
+    assert np.isnan(packed[5:8]).all()
+    assert np.array_equal(packed[8:12], uv_c)
+
+
+def test_parsed_appearance_buffers(synthetic_dataset: dict[str, Path]):
+    filename = str(synthetic_dataset["bldg"])
+    settings = ParserSettings(load_apperance=True, load_semantic_parts=True)
+    textured = 0
+    for _, cityobj in PlateauCityGmlParser(filename, settings).iter_cityobjs():
+        geom = cityobj.geometry
+        if not isinstance(geom, PolygonCollection):
+            continue
+        assert geom.materials is not None
+        assert geom.textures is not None
+        assert geom.materials.dtype == np.int32
+        assert geom.textures.dtype == np.int32
+        assert geom.materials.shape == geom.textures.shape == (geom.num_polygons,)
+        assert (geom.materials >= -1).all()
+        if geom.uvs is None:
+            assert (geom.textures == -1).all()
+            continue
+
+        assert geom.uvs.dtype == np.float32
+        assert geom.uvs.shape == (len(geom.coords), 2)
+        for i, texture in enumerate(geom.textures):
+            outer_uv = next(geom.iter_ring_uvs(i))
+            # リングのテクスチャ座標は uvs のビュー
+            assert outer_uv.base is geom.uvs
+            if texture >= 0:
+                assert not np.isnan(outer_uv).any()
+                textured += 1
+            else:
+                assert np.isnan(outer_uv).all()
+    assert textured
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import struct
+
+import numpy as np
+import pytest
+
+from plateau_plugin.plateau.parse.geometry import _pack_rings
+from plateau_plugin.plateau.types import LineStringCollection, PolygonCollection
+from plateau_plugin.wkb import lines_to_wkb, polygons_to_wkb
+
+
+def _header(wkb_type: int, count: int) -> bytes:
+    return struct.pack("<BII", 1, wkb_type, count)
+
+
+def _points(points: np.ndarray, as2d: bool) -> bytes:
+    # (緯度, 経度, 高さ) -> (経度, 緯度[, 高さ])
+    out = b""
+    for lat, lon, height in points:
+        out += (
+            struct.pack("<dd", lon, lat)
+            if as2d
+            else struct.pack("<ddd", lon, lat, height)
+        )
+    return out
+
+
+def _reference_multipolygon(polygons: list[list[np.ndarray]], as2d: bool) -> bytes:
+    z = 0 if as2d else 1000
+    out = _header(6 + z, len(polygons))
+    for rings in polygons:
+        out += _header(3 + z, len(rings))
+        for ring in rings:
+            out += struct.pack("<I", len(ring)) + _points(ring, as2d)
+    return out
+
+
+def _reference_multilinestring(lines: list[np.ndarray], as2d: bool) -> bytes:
+    z = 0 if as2d else 1000
+    out = _header(5 + z, len(lines))
+    for line in lines:
+        out += _header(2 + z, len(line)) + _points(line, as2d)
+    return out
+
+
+def _random_ring(rng: np.random.Generator, n: int) -> np.ndarray:
+    ring = rng.uniform([35.0, 139.0, 0.0], [36.0, 140.0, 100.0], size=(n, 3))
+    return np.vstack([ring, ring[:1]])
+
+
+@pytest.mark.parametrize("as2d", [False, True])
+def test_polygons_to_wkb(as2d: bool):
+    rng = np.random.default_rng(0)
+    polygons = [
+        [_random_ring(rng, 4)],
+        [_random_ring(rng, 5), _random_ring(rng, 3), _random_ring(rng, 3)],
+        [_random_ring(rng, 3)],
+    ]
+    rings = [ring for polygon in polygons for ring in polygon]
+    coords, ring_offsets, polygon_offsets = _pack_rings(
+        rings, [len(polygon) for polygon in polygons]
+    )
+    geom = PolygonCollection(
+        coords=coords,
+        ring_offsets=ring_offsets,
+        polygon_offsets=polygon_offsets,
+        materials=None,
+        textures=None,
+        uvs=None,
+    )
+    assert polygons_to_wkb(geom, as2d) == _reference_multipolygon(polygons, as2d)
+
+
+@pytest.mark.parametrize("as2d", [False, True])
+def test_lines_to_wkb(as2d: bool):
+    rng = np.random.default_rng(1)
+    lines = [rng.uniform(size=(n, 3)) for n in (2, 5, 3)]
+    geom = LineStringCollection(lines=lines)
+    assert lines_to_wkb(geom, as2d) == _reference_multilinestring(lines, as2d)
+
+
+def test_empty_lines_to_wkb():
+    geom = LineStringCollection(lines=[])
+    assert lines_to_wkb(geom, False) == _reference_multilinestring([], False)
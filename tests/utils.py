@@ -0,0 +1,55 @@
+"""テストで使う補助関数"""
+
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+from plateau_plugin.plateau.types import (
+    CityObject,
+    LineStringCollection,
+    PolygonCollection,
+)
+
+
+def _array(a) -> Any:
+    return None if a is None else (a.dtype.str, a.shape, a.tobytes())
+
+
+def summarize_geometry(geometry) -> Any:
+    """ジオメトリを、配列の中身まで比較できる値にする"""
+    if geometry is None:
+        return None
+    if isinstance(geometry, PolygonCollection):
+        return (
+            _array(geometry.coords),
+            geometry.ring_offsets.tolist(),
+            geometry.polygon_offsets.tolist(),
+            _array(geometry.materials),
+            _array(geometry.textures),
+            _array(geometry.uvs),
+        )
+    if isinstance(geometry, LineStringCollection):
+        return [_array(line) for line in geometry.lines]
+    return _array(geometry.points)
+
+
+def summarize_cityobj(cityobj: CityObject) -> tuple:
+    """都市オブジェクトを、パースの方法による違いがないかを比較できる値にする"""
+    return (
+        cityobj.type,
+        cityobj.id,
+        cityobj.name,
+        cityobj.description,
+        cityobj.creation_date,
+        cityobj.termination_date,
+        cityobj.lod,
+        repr(sorted(cityobj.attributes.items())),
+        cityobj.processor.id,
+        cityobj.parent.id if cityobj.parent else None,
+        summarize_geometry(cityobj.geometry),
+    )
+
+
+def summarize(cityobjs: Iterable[tuple[int, CityObject]]) -> list[tuple]:
+    """iter_cityobjs などの結果を、トップレベルの順番とともに比較できる値のリストにする"""
+    return [(index, summarize_cityobj(cityobj)) for index, cityobj in cityobjs]